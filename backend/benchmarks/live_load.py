@@ -0,0 +1,192 @@
+"""
+Load test for the live engine: a simulated in-play feed and many WebSocket clients.
+
+Starts the API under uvicorn in a subprocess, tailing a feed file that this
+script appends events to (or, with --source http, posting them to
+/live/events). Clients are spread evenly over the matches and record the
+delay between an event being written and the update that carries it
+arriving (event_ts is echoed back). Reports delivery latency, message
+throughput and how many updates were coalesced per client.
+
+Usage (from the backend directory; needs the `websockets` package):
+    python -m benchmarks.live_load
+    python -m benchmarks.live_load --clients 5000 --matches 50 --rate 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import orjson
+import websockets
+
+from src.live_engine import MATCH_MINUTES
+
+
+TEAMS = ['Arsenal', 'Aston Villa', 'Brighton', 'Burnley', 'Chelsea', 'Crystal Palace', 'Everton', 'Fulham',
+         'Leeds', 'Leicester', 'Liverpool', 'Man City', 'Man United', 'Newcastle', 'Sheffield United',
+         'Southampton', 'Tottenham', 'West Brom', 'West Ham', 'Wolves']
+STATISTIC_CODES = ['shots-total', 'shots-on-target', 'corners', 'dangerous-attacks', 'possession']
+
+
+def feed_events(n_matches, rate, duration, seed=0):
+    """Kickoffs for every match, then `rate` random in-play events per second, each stamped when due"""
+    rng = np.random.default_rng(seed)
+    for fixture_id in range(n_matches):
+        home, away = rng.choice(len(TEAMS), 2, replace=False)
+        yield 0.0, {"fixture_id": fixture_id, "type": "kickoff",
+                    "home_team": TEAMS[home], "away_team": TEAMS[away]}
+
+    counters = np.zeros((n_matches, 2, len(STATISTIC_CODES)), dtype=int)
+    total = int(rate * duration)
+    for i in range(total):
+        fixture_id = int(rng.integers(n_matches))
+        minute = int(MATCH_MINUTES * i / total)
+        side = int(rng.integers(2))
+        participant = ("home", "away")[side]
+        kind = rng.choice(["minute", "statistic", "xg", "goal"], p=[0.3, 0.5, 0.17, 0.03])
+        event = {"fixture_id": fixture_id, "type": str(kind), "minute": minute}
+        if kind == "statistic":
+            code = int(rng.integers(len(STATISTIC_CODES)))
+            counters[fixture_id, side, code] += 1
+            event.update(participant=participant, code=STATISTIC_CODES[code], value=int(counters[fixture_id, side, code]))
+        elif kind == "xg":
+            event.update(participant=participant, value=round(float(rng.exponential(0.1)), 3))
+        elif kind == "goal":
+            event.update(participant=participant)
+        yield i / rate, event
+
+
+async def run_feed(args, base_url, feed_path, written):
+    start = time.perf_counter()
+    http = httpx.AsyncClient(base_url=base_url) if args.source == "http" else None
+    with open(feed_path, "ab") as feed:
+        for due, event in feed_events(args.matches, args.rate, args.duration):
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event["ts"] = time.time()
+            if http:
+                (await http.post("/live/events", json={"events": [event]})).raise_for_status()
+            else:
+                feed.write(orjson.dumps(event) + b"\n")
+                feed.flush()
+            written[event["fixture_id"]] = written.get(event["fixture_id"], 0) + 1
+    if http:
+        await http.aclose()
+
+
+async def client(url, latencies, counts, index, ready):
+    ws = await websockets.connect(url, max_queue=None)
+    ready.set()
+    try:
+        async for message in ws:
+            update = orjson.loads(message)
+            counts[index] += 1
+            if update.get("event_ts"):
+                latencies.append(time.time() - update["event_ts"])
+    finally:
+        await ws.close()
+
+
+def live_message_counters(base_url):
+    text = httpx.get(f"{base_url}/metrics").text
+    counters = {}
+    for line in text.splitlines():
+        if line.startswith("copascore_live_messages_total"):
+            result = line.split('result="')[1].split('"')[0]
+            counters[result] = float(line.rsplit(" ", 1)[1])
+    return counters
+
+
+async def main_async(args, base_url, feed_path):
+    ws_base = base_url.replace("http://", "ws://")
+    latencies = []
+    counts = np.zeros(args.clients, dtype=int)
+    tasks = []
+
+    # Connect in waves so the listen backlog is not flooded
+    start = time.perf_counter()
+    for wave in range(0, args.clients, args.connect_batch):
+        readies = []
+        for index in range(wave, min(wave + args.connect_batch, args.clients)):
+            ready = asyncio.Event()
+            readies.append(ready)
+            url = f"{ws_base}/live/ws/{index % args.matches}"
+            tasks.append(asyncio.create_task(client(url, latencies, counts, index, ready)))
+        await asyncio.gather(*(r.wait() for r in readies))
+    connect_s = time.perf_counter() - start
+
+    written = {}
+    before = live_message_counters(base_url)
+    feed_start = time.perf_counter()
+    await run_feed(args, base_url, feed_path, written)
+    # Let the last flush reach everyone
+    await asyncio.sleep(1.0)
+    elapsed = time.perf_counter() - feed_start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    after = live_message_counters(base_url)
+
+    events = sum(written.values())
+    received = int(counts.sum())
+    lat = np.array(latencies) * 1000
+    print(f"{args.clients} clients over {args.matches} matches, connected in {connect_s:.2f}s "
+          f"(source: {args.source})")
+    print(f"events written           {events} ({events / args.duration:.0f}/s)")
+    print(f"updates received         {received} ({received / elapsed:.0f}/s)")
+    print(f"updates per client       min {counts.min()}  mean {counts.mean():.1f}  max {counts.max()}")
+    print(f"events per match         {events / args.matches:.1f}  (updates per client / events per match: "
+          f"{counts.mean() / (events / args.matches):.2f})")
+    if len(lat):
+        print(f"delivery latency ms      p50 {np.percentile(lat, 50):.1f}  p95 {np.percentile(lat, 95):.1f}  "
+              f"p99 {np.percentile(lat, 99):.1f}  max {lat.max():.1f}")
+    sent = after.get("sent", 0) - before.get("sent", 0)
+    coalesced = after.get("coalesced", 0) - before.get("coalesced", 0)
+    print(f"server sent / coalesced  {sent:.0f} / {coalesced:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--matches", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=200, help="Feed events per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of feed")
+    parser.add_argument("--source", choices=["file", "http"], default="file")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connect-batch", type=int, default=200)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    feed_path = os.path.join(tempfile.mkdtemp(prefix="copascore_live_"), "feed.jsonl")
+    open(feed_path, "w").close()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.main:app", "--port", str(args.port),
+         "--log-level", "warning"],
+        env={**os.environ, "COPASCORE_LIVE_FEED": feed_path},
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(300):
+            try:
+                httpx.get(f"{base_url}/live/matches").raise_for_status()
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("Server did not start")
+        asyncio.run(main_async(args, base_url, feed_path))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Match page load latency: the frontend's five-request fan-out vs one /match-preview call.
+
+Runs the API in-process through FastAPI's TestClient, so timings cover
+routing, validation, engine work and JSON encoding but not the network.
+
+Usage (from the backend directory):
+    python -m benchmarks.match_preview_latency --repeat 200
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+
+
+HOME, AWAY = "Arsenal", "Chelsea"
+ODDS = {"b365h": 2.1, "b365d": 3.4, "b365a": 3.5}
+
+
+def fan_out_requests(client):
+    return [
+        lambda: client.post("/predict", json={"home_team": HOME, "away_team": AWAY, **ODDS}),
+        lambda: client.post("/stats", json={"home_team": HOME, "away_team": AWAY}),
+        lambda: client.get("/fifa/search", params={"team": HOME}),
+        lambda: client.get("/fifa/search", params={"team": AWAY}),
+        lambda: client.get(f"/team-form/{HOME}"),
+    ]
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        calls = fan_out_requests(client)
+        pool = ThreadPoolExecutor(max_workers=len(calls))
+
+        def sequential():
+            for call in calls:
+                call()
+
+        def parallel():
+            # Like a browser issuing all page requests at once
+            list(pool.map(lambda call: call(), calls))
+
+        def composite():
+            response = client.post("/match-preview", json={"home_team": HOME, "away_team": AWAY, **ODDS})
+            response.raise_for_status()
+
+        # Warm up every route before timing
+        sequential()
+        composite()
+
+        results = {
+            "fan_out_sequential": time_calls(sequential, args.repeat),
+            "fan_out_parallel": time_calls(parallel, args.repeat),
+            "match_preview": time_calls(composite, args.repeat),
+        }
+        pool.shutdown()
+
+    for name, stats in results.items():
+        print(f"{name:20s} mean {stats['mean_ms']:8.3f} ms  p50 {stats['p50_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
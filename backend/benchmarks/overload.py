@@ -0,0 +1,146 @@
+"""
+Overload test: latency of a cheap route while the API is flooded with simulations.
+
+Starts the API under uvicorn in a subprocess and probes /teams at a fixed
+rate in three phases: idle, under a flood of /simulate/stream requests from many
+clients (each with its own X-API-Key, so per-client rate limits alone do
+not stop it), and the same flood with admission control switched off
+(COPASCORE_ADMISSION=off, in a second server). Reports probe p50/p95/p99
+per phase, what happened to the flood requests, and the admission counters
+from /metrics.
+
+Usage (from the backend directory):
+    python -m benchmarks.overload
+    python -m benchmarks.overload --flood-clients 64 --simulations 20000 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+
+def start_server(port, admission, flood_clients):
+    env = dict(os.environ)
+    # Flood clients share an address, so their keys must be configured to be rate-limited separately
+    env["COPASCORE_API_KEYS"] = ",".join(f"flood-{i}" for i in range(flood_clients))
+    if not admission:
+        env["COPASCORE_ADMISSION"] = "off"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(f"{base_url}/teams").raise_for_status()
+            return server, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start")
+
+
+async def probe(http, rate, duration):
+    """GET /teams every 1/rate seconds; a probe is only sent once the previous one has answered"""
+    latencies, statuses = [], Counter()
+    start = time.perf_counter()
+    n = 0
+    while time.perf_counter() - start < duration:
+        due = start + n / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        t = time.perf_counter()
+        try:
+            r = await http.get("/teams")
+            statuses[r.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+        latencies.append(time.perf_counter() - t)
+        n += 1
+    return np.array(latencies) * 1000, statuses
+
+
+async def flood_client(http, index, simulations, stop, outcomes):
+    headers = {"X-API-Key": f"flood-{index}"}
+    while not stop.is_set():
+        try:
+            r = await http.get("/simulate/stream", params={"simulations": simulations}, headers=headers)
+            outcomes[r.status_code] += 1
+            if r.status_code in (429, 503):
+                await asyncio.sleep(float(r.headers.get("Retry-After", 1)))
+        except httpx.HTTPError:
+            outcomes["error"] += 1
+
+
+async def run_phase(base_url, args, flood):
+    limits = httpx.Limits(max_connections=args.flood_clients + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as http:
+        stop = asyncio.Event()
+        outcomes = Counter()
+        flooders = [asyncio.create_task(flood_client(http, i, args.simulations, stop, outcomes))
+                    for i in range(args.flood_clients if flood else 0)]
+        if flooders:
+            # Let the flood build up before measuring
+            await asyncio.sleep(args.warmup)
+        latencies, statuses = await probe(http, args.probe_rate, args.duration)
+        stop.set()
+        # In-flight simulations are not waited for
+        for task in flooders:
+            task.cancel()
+        await asyncio.gather(*flooders, return_exceptions=True)
+    return latencies, statuses, outcomes
+
+
+def admission_counters(base_url):
+    counters = {}
+    for line in httpx.get(f"{base_url}/metrics").text.splitlines():
+        if line.startswith("copascore_admission_total"):
+            labels = line.split("{")[1].split("}")[0]
+            parts = dict(item.replace('"', '').split("=") for item in labels.split(","))
+            key = f"{parts['cost_class']}/{parts['result']}"
+            counters[key] = float(line.rsplit(" ", 1)[1])
+    return counters
+
+
+def report(name, latencies, statuses, outcomes):
+    print(f"{name:<24} p50 {np.percentile(latencies, 50):7.1f}  p95 {np.percentile(latencies, 95):7.1f}  "
+          f"p99 {np.percentile(latencies, 99):7.1f}  max {latencies.max():7.1f} ms  "
+          f"probes {dict(statuses)}  flood {dict(outcomes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flood-clients", type=int, default=32)
+    parser.add_argument("--simulations", type=int, default=10000)
+    parser.add_argument("--probe-rate", type=float, default=20, help="/teams probes per second")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of probing per phase")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f"/teams probed at {args.probe_rate:.0f}/s for {args.duration:.0f}s per phase; flood: "
+          f"{args.flood_clients} clients looping GET /simulate/stream with {args.simulations} simulations")
+    for admission in (True, False):
+        server, base_url = start_server(args.port, admission, args.flood_clients)
+        try:
+            label = "admission on" if admission else "admission off"
+            if admission:
+                report("idle", *asyncio.run(run_phase(base_url, args, flood=False)))
+            report(f"flood, {label}", *asyncio.run(run_phase(base_url, args, flood=True)))
+            if admission:
+                print("admission decisions     ", admission_counters(base_url))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
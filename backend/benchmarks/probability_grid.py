@@ -0,0 +1,66 @@
+"""
+Probability grid resolution sweep: accuracy, memory and build time per grid, and lookup vs model latency.
+
+Builds the /predict grid of the default model at each resolution (buckets
+per B365 H/D/A axis) and reports its size, how long the one scoring pass
+took, and its error against the exact model on the historical odds and on
+the same odds moved by a few percent. Then times one lookup against one
+predict_proba call on the same fixture.
+
+Usage (from the backend directory):
+    python -m benchmarks.probability_grid
+    python -m benchmarks.probability_grid --resolutions 16,8,16 32,16,32 48,24,48
+"""
+
+import argparse
+import time
+
+import joblib
+import pandas as pd
+
+from src.probability_grid import FixtureProbabilityGrid
+
+
+HOME, AWAY = "Arsenal", "Chelsea"
+ODDS = (2.1, 3.4, 3.5)
+
+
+def time_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", nargs="+", default=["8,4,8", "16,8,16", "24,12,24", "32,16,32"],
+                        help="Buckets per B365 H/D/A axis, e.g. 24,12,24")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    model = joblib.load("data/xgb_model.joblib")
+    le_team = joblib.load("data/le_team.joblib")
+    home, away = le_team.transform([HOME, AWAY])
+
+    print(f"{'resolution':>12s} {'cells':>10s} {'memory':>9s} {'build':>8s}   "
+          f"{'historical mae / p99 / same fav':>32s}   {'jittered mae / p99 / same fav':>30s}")
+    grid = None
+    for resolution in args.resolutions:
+        grid = FixtureProbabilityGrid(model, le_team, resolution=resolution.split(","))
+        grid.refresh()
+        info = grid.describe()
+        accuracy = " ".join(
+            f"{a['mean_abs_error']:8.4f} / {a['p99_abs_error']:.3f} / {a['same_favourite']:.3f}"
+            for a in (info['accuracy']['historical'], info['accuracy']['jittered'])
+        )
+        print(f"{resolution:>12s} {info['cells']:10d} {info['memory_mb']:7.1f}MB {info['build_seconds']:7.1f}s   {accuracy}")
+
+    frame = pd.DataFrame({'HomeTeam_Code': [home], 'AwayTeam_Code': [away],
+                          'B365H': [ODDS[0]], 'B365D': [ODDS[1]], 'B365A': [ODDS[2]]})
+    print(f"grid lookup       {time_call(lambda: grid.lookup(home, away, ODDS), args.repeat):9.1f} us")
+    print(f"predict_proba     {time_call(lambda: model.predict_proba(frame), args.repeat // 10):9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Bytes on the wire and serialization CPU for the large player-list endpoints.
+
+Compares the default FastAPI path (jsonable_encoder + stdlib json) with the
+orjson path, with and without field projection, gzip and ETag revalidation.
+
+Usage (from the backend directory):
+    python -m benchmarks.serialization --repeat 200
+"""
+
+import argparse
+import json
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.api.responses import ORJSON_OPTIONS
+
+
+FIELDS = "short_name,overall,player_positions,nationality_name,club_name,value_euro"
+
+
+def cpu_ms(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        from src.api import main as api
+
+        players = api.fifa_player_engine.get_top_players(limit=200)
+        payload = {"players": players, "count": len(players)}
+
+        print("Serialization CPU for /fifa/top-players?limit=200 payload")
+        print(f"  jsonable_encoder + json.dumps  {cpu_ms(lambda: json.dumps(jsonable_encoder(payload)).encode(), args.repeat):8.3f} ms")
+        print(f"  orjson                         {cpu_ms(lambda: orjson.dumps(payload, option=ORJSON_OPTIONS), args.repeat):8.3f} ms")
+
+        print("\nBytes on the wire")
+        cases = [
+            ("/fifa/top-players?limit=200", {"Accept-Encoding": "identity"}),
+            ("/fifa/top-players?limit=200", {"Accept-Encoding": "gzip"}),
+            (f"/fifa/top-players?limit=200&fields={FIELDS}", {"Accept-Encoding": "identity"}),
+            (f"/fifa/top-players?limit=200&fields={FIELDS}", {"Accept-Encoding": "gzip"}),
+            ("/fifa/search?max_results=200", {"Accept-Encoding": "gzip"}),
+        ]
+        for url, headers in cases:
+            response = client.get(url, headers=headers)
+            wire = response.num_bytes_downloaded
+            encoding = response.headers.get("content-encoding", "identity")
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                client.get(url, headers=headers)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"  {url:70s} {encoding:8s} {wire:8d} B  {elapsed:7.3f} ms/request")
+
+            revalidate = client.get(url, headers={**headers, "If-None-Match": response.headers["etag"]})
+            print(f"  {'  ... with If-None-Match':70s} {'':8s} {revalidate.num_bytes_downloaded:8d} B  status {revalidate.status_code}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+In-memory pandas engines vs the SQLite store, at multiples of today's data.
+
+Scale 1 is the shipped data: one season of matches, 200 FIFA players and
+one team file. Each (backend, scale) pair runs in a fresh subprocess, so the
+reported resident memory belongs to that backend alone.
+
+Usage (from the backend directory):
+    python -m benchmarks.storage
+    python -m benchmarks.storage --scales 10 100 1000 --repeat 200
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import DATA_DIR, generate_fifa_players, generate_matches, generate_team_files
+
+
+BASE_FIFA_ROWS = 200
+
+
+def datasets(scale):
+    return {
+        "matches": generate_matches(seasons=scale),
+        "fifa": generate_fifa_players(rows=BASE_FIFA_ROWS * scale),
+        "teams": generate_team_files(count=scale)
+    }
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    # VmHWM resets on exec; ru_maxrss would carry over the parent's high-water mark
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def time_queries(queries, repeat):
+    results = {}
+    for name, fn in queries.items():
+        fn()
+        samples = np.empty(repeat)
+        for i in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples[i] = time.perf_counter() - start
+        results[name] = float(np.percentile(samples, 50) * 1000)
+    return results
+
+
+def worker(backend, scale, repeat):
+    data = datasets(scale)
+    team_files = sorted(os.path.join(data["teams"], f) for f in os.listdir(data["teams"]))
+
+    from src.fifa_player_engine import FIFAPlayerEngine
+    from src.sql_engines import SQLFIFAPlayerEngine, SQLStatsEngine, SQLTeamStatsEngine
+    from src.sqlite_store import SQLiteStore
+    from src.stats_engine import StatsEngine
+    from src.team_stats_engine import TeamStatsEngine
+
+    before = rss_mb()
+    start = time.perf_counter()
+    if backend == "pandas":
+        stats = StatsEngine(data_path=data["matches"])
+        fifa = FIFAPlayerEngine()
+        fifa.load_fifa_data(data["fifa"])
+        teams = TeamStatsEngine()
+        for path in team_files:
+            teams.load_team_data(path)
+    else:
+        store = SQLiteStore(os.path.join(DATA_DIR, f"store_{scale}.db"))
+        stats = SQLStatsEngine(store)
+        fifa = SQLFIFAPlayerEngine(store)
+        teams = SQLTeamStatsEngine(store)
+    load_s = time.perf_counter() - start
+    loaded = rss_mb()
+
+    card_name = fifa.search_players(query="Messi", max_results=1, fields=["short_name"])[0]["short_name"]
+    queries = {
+        "get_team_stats": lambda: stats.get_team_stats("Arsenal"),
+        "get_average_odds": lambda: stats.get_average_odds("Arsenal", "Chelsea"),
+        "search_name": lambda: fifa.search_players(query="messi"),
+        "search_position_rating": lambda: fifa.search_players(position="ST", min_rating=85),
+        "search_club": lambda: fifa.search_players(team="Club 001"),
+        "top_players_100": lambda: fifa.get_top_players(limit=100),
+        "top_players_club": lambda: fifa.get_top_players(limit=5, team="Club 001"),
+        "player_card": lambda: fifa.get_player_card(card_name),
+        "recent_form": lambda: teams.get_recent_form("Club 000"),
+        "average_stats": lambda: teams.get_average_stats("Club 000")
+    }
+    latencies = time_queries(queries, repeat)
+
+    return {
+        "backend": backend,
+        "scale": scale,
+        "load_s": round(load_s, 3),
+        "rss_loaded_mb": round(loaded - before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "p50_ms": latencies
+    }
+
+
+def build_store(scale):
+    """Import the scaled files into a fresh database, timing the one-shot import"""
+    from src.sqlite_store import SQLiteStore
+
+    data = datasets(scale)
+    path = os.path.join(DATA_DIR, f"store_{scale}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    start = time.perf_counter()
+    store = SQLiteStore(path)
+    store.import_all([data["matches"]], data["fifa"], [data["teams"]])
+    store.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    store.close()
+    return time.perf_counter() - start, os.path.getsize(path) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "SCALE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker[0], int(args.worker[1]), args.repeat)))
+        return
+
+    for scale in args.scales:
+        datasets(scale)
+        import_s, size_mb = build_store(scale)
+        print(f"\n== {scale}x: {380 * scale} matches, {BASE_FIFA_ROWS * scale} players, {scale} team files "
+              f"(SQLite import {import_s:.2f}s, {size_mb:.1f} MB on disk)")
+
+        runs = {}
+        for backend in ("pandas", "sqlite"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.storage", "--worker", backend, str(scale), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs[backend] = json.loads(out.strip().splitlines()[-1])
+
+        pandas_run, sqlite_run = runs["pandas"], runs["sqlite"]
+        print(f"{'':26s} {'pandas':>10s} {'sqlite':>10s}")
+        print(f"{'startup s':26s} {pandas_run['load_s']:10.3f} {sqlite_run['load_s']:10.3f}")
+        print(f"{'RSS after startup MB':26s} {pandas_run['rss_loaded_mb']:10.1f} {sqlite_run['rss_loaded_mb']:10.1f}")
+        print(f"{'peak RSS MB':26s} {pandas_run['peak_rss_mb']:10.1f} {sqlite_run['peak_rss_mb']:10.1f}")
+        for name in pandas_run["p50_ms"]:
+            print(f"{name + ' p50 ms':26s} {pandas_run['p50_ms'][name]:10.3f} {sqlite_run['p50_ms'][name]:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Benchmark suite for the engines and the API.
+
+Runs engine-level calls (StatsEngine, LeagueSimulator, FIFAPlayerEngine,
+TeamStatsEngine) and in-process ASGI endpoint calls against the synthetic
+datasets from benchmarks.synthetic. For each case it records latency
+(mean/p50/p95), throughput and peak traced memory. Every run is appended to
+a JSON history, and the p50 of each case is compared with the previous run.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --filter fifa --fifa-rows 18000 --repeat 50
+    python -m benchmarks.suite --filter api --no-memory
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import generate_fifa_players, generate_matches, generate_player_files, generate_team_files
+
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "results", "history.json")
+
+
+class Case:
+    """One benchmark: setup() runs once untimed and returns the callable to time"""
+
+    def __init__(self, name, setup, repeat=None, memory=True):
+        self.name = name
+        self.setup = setup
+        self.repeat = repeat
+        self.memory = memory
+
+
+def measure(fn, repeat, memory=True, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+
+    result = {
+        "repeat": repeat,
+        "mean_ms": float(samples.mean() * 1000),
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p95_ms": float(np.percentile(samples, 95) * 1000),
+        "min_ms": float(samples.min() * 1000),
+        "ops_per_sec": float(1.0 / samples.mean()) if samples.mean() > 0 else None
+    }
+
+    if memory:
+        # Separate traced call; tracing slows Python code, so it is kept out of the timings
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mb"] = round(peak / 2**20, 3)
+    return result
+
+
+def engine_cases(matches_path, fifa_paths, teams_dir, players_dir):
+    from src.fifa_player_engine import FIFAPlayerEngine
+    from src.league_simulator import LeagueSimulator
+    from src.real_player_engine import RealPlayerEngine
+    from src.squad_optimizer import SquadOptimizer
+    from src.squad_strength import SquadStrength, TeamEntities
+    from src.stats_engine import StatsEngine
+    from src.team_stats_engine import TeamStatsEngine
+    from src.what_if import ConditionalSimulator
+
+    cases = []
+
+    # StatsEngine over many seasons
+    def stats():
+        return StatsEngine(data_path=matches_path)
+    cases.append(Case("stats.load", lambda: (lambda: stats()), repeat=5))
+    cases.append(Case("stats.get_team_stats", lambda: (lambda e=stats(): e.get_team_stats("Arsenal"))))
+    cases.append(Case("stats.get_comparison", lambda: (lambda e=stats(): e.get_comparison("Arsenal", "Chelsea"))))
+    cases.append(Case("stats.get_team_stats_last10", lambda: (lambda e=stats(): e.get_team_stats("Arsenal", last=10))))
+    cases.append(Case("stats.get_team_stats_decade_home",
+                      lambda: (lambda e=stats(): e.get_team_stats("Arsenal", "2000-07-01", "2010-06-30", venue="home"))))
+
+    # LeagueSimulator with odds averaged over the same history
+    def simulator():
+        return LeagueSimulator(data_path=matches_path)
+    cases.append(Case("league.init", lambda: (lambda: simulator()), repeat=5))
+    cases.append(Case("league.simulate_season", lambda: (lambda s=simulator(): s.simulate_season())))
+    cases.append(Case("league.simulate_many_10k", lambda: (lambda s=simulator(): s.simulate_many(10000)), repeat=10))
+
+    def what_if():
+        conditional = ConditionalSimulator(LeagueSimulator(), as_of="2021-02-01", n_simulations=10000)
+        return lambda: conditional.what_if([("Arsenal", "Chelsea", "A")])
+    cases.append(Case("what_if.build_10k", lambda: (lambda s=LeagueSimulator(): ConditionalSimulator(
+        s, as_of="2021-02-01", n_simulations=10000)), repeat=5))
+    cases.append(Case("what_if.one_override_10k", what_if))
+
+    # FIFAPlayerEngine at each size
+    for rows, path in fifa_paths.items():
+        def fifa(path=path):
+            engine = FIFAPlayerEngine()
+            engine.load_fifa_data(path)
+            return engine
+
+        def similar(path=path):
+            engine = fifa(path)
+            name = engine.df['short_name'].iloc[0]
+            return lambda: engine.find_similar_players([name], k=10)
+
+        def optimize(path=path):
+            optimizer = SquadOptimizer(fifa(path))
+            return lambda: optimizer.optimize("4-3-3", budget=300_000_000, max_per_nationality=3)
+
+        def squad_strength(path=path):
+            engine = fifa(path)
+            clubs = engine.df['club_name'].dropna().unique().tolist()
+            return SquadStrength(engine, TeamEntities.build(clubs[:20], {'fifa': clubs}))
+
+        def squad_refresh_one_club(path=path):
+            strength = squad_strength(path)
+            strength._ensure_current()
+            df = strength.fifa_engine.df
+            # Reloads alternate between two frames that differ in one club's ratings
+            changed = df.copy()
+            changed.loc[changed['club_name'] == changed['club_name'].iloc[0], 'overall'] += 1
+            frames = itertools.cycle([changed, df])
+
+            def refresh():
+                strength.fifa_engine.df = next(frames)
+                strength._ensure_current()
+            return refresh
+
+        def squad_vector(path=path):
+            strength = squad_strength(path)
+            clubs = list(strength.entities.lookup)[:100]
+            strength._ensure_current()
+            return lambda: [strength.vector(club) for club in clubs]
+
+        prefix = f"fifa[{rows}]"
+        cases.append(Case(f"{prefix}.load", lambda fifa=fifa: (lambda: fifa()), repeat=3))
+        cases.append(Case(f"{prefix}.search_players",
+                          lambda fifa=fifa: (lambda e=fifa(): e.search_players(query="a", max_results=50))))
+        cases.append(Case(f"{prefix}.search_players_filtered",
+                          lambda fifa=fifa: (lambda e=fifa(): e.search_players(position="ST", min_rating=75, max_results=50))))
+        cases.append(Case(f"{prefix}.get_top_players", lambda fifa=fifa: (lambda e=fifa(): e.get_top_players(limit=100))))
+        cases.append(Case(f"{prefix}.find_similar_players", similar))
+        cases.append(Case(f"{prefix}.aggregate_club",
+                          lambda fifa=fifa: (lambda e=fifa(): e.aggregate("club", stats=("count", "mean", "p90")))))
+        cases.append(Case(f"{prefix}.optimize_squad", optimize, repeat=5))
+        cases.append(Case(f"{prefix}.squad_strength_build",
+                          lambda squad_strength=squad_strength: (
+                              lambda s=squad_strength(): SquadStrength(s.fifa_engine, s.entities)._ensure_current()),
+                          repeat=3))
+        cases.append(Case(f"{prefix}.squad_strength_refresh_one_club", squad_refresh_one_club, repeat=5))
+        cases.append(Case(f"{prefix}.squad_strength_vector_x100", squad_vector))
+
+    # TeamStatsEngine over hundreds of team files
+    team_files = sorted(os.path.join(teams_dir, f) for f in os.listdir(teams_dir) if f.endswith(".json"))
+
+    def team_stats():
+        engine = TeamStatsEngine()
+        for path in team_files:
+            engine.load_team_data(path)
+        return engine
+
+    def all_forms():
+        engine = team_stats()
+        names = list(engine.teams_data)
+        return lambda: [engine.get_recent_form(name) for name in names]
+
+    cases.append(Case(f"team_stats[{len(team_files)}].load", lambda: (lambda: team_stats()), repeat=3))
+    cases.append(Case(f"team_stats[{len(team_files)}].recent_form_all", all_forms))
+    cases.append(Case(f"team_stats[{len(team_files)}].get_team_comparison",
+                      lambda: (lambda e=team_stats(): e.get_team_comparison("Club 000", "Club 001"))))
+
+    # RealPlayerEngine over thousands of SportMonks player files
+    n_players = len(os.listdir(players_dir))
+
+    def real_players():
+        engine = RealPlayerEngine()
+        engine.load_directory(players_dir)
+        return engine
+
+    def all_squads():
+        engine = real_players()
+        team_ids = list(engine.team_players)
+        return lambda: [engine.get_team_players(team_id) for team_id in team_ids]
+
+    prefix = f"real_players[{n_players}]"
+    cases.append(Case(f"{prefix}.load_directory", lambda: (lambda: real_players()), repeat=3))
+    cases.append(Case(f"{prefix}.get_team_players", lambda: (lambda e=real_players(): e.get_team_players("Club 000"))))
+    cases.append(Case(f"{prefix}.get_team_players_position",
+                      lambda: (lambda e=real_players(): e.get_team_players("C000", position="Attacker"))))
+    cases.append(Case(f"{prefix}.get_team_players_all", all_squads))
+    cases.append(Case(f"{prefix}.get_player_card",
+                      lambda: (lambda e=real_players(): e.get_player_card("Club 000", "Player 04321"))))
+    return cases
+
+
+def api_cases(matches_path, fifa_path, teams_dir, players_dir):
+    """Endpoint calls through the ASGI app, with the engines swapped to the synthetic data"""
+    from fastapi.testclient import TestClient
+
+    # Rate limits and deadlines would turn repeated timed calls into 429s
+    os.environ.setdefault("COPASCORE_ADMISSION", "off")
+    from src.api import main as api
+    from src.api.main import app
+    from src.fifa_player_engine import FIFAPlayerEngine
+    from src.league_simulator import LeagueSimulator
+    from src.real_player_engine import RealPlayerEngine
+    from src.squad_optimizer import SquadOptimizer
+    from src.stats_engine import StatsEngine
+    from src.team_stats_engine import TeamStatsEngine
+
+    state = {}
+
+    def client():
+        if "client" not in state:
+            c = TestClient(app)
+            c.__enter__()
+            api.stats_engine = StatsEngine(data_path=matches_path)
+            api.league_simulator = LeagueSimulator(data_path=matches_path)
+            api.fifa_player_engine = FIFAPlayerEngine()
+            api.fifa_player_engine.load_fifa_data(fifa_path)
+            api.squad_optimizer = SquadOptimizer(api.fifa_player_engine)
+            api.team_stats_engine = TeamStatsEngine()
+            for name in sorted(os.listdir(teams_dir)):
+                api.team_stats_engine.load_team_data(os.path.join(teams_dir, name))
+            api.player_engine = RealPlayerEngine()
+            api.player_engine.load_directory(players_dir)
+            state["client"] = c
+        return state["client"]
+
+    def get(url, **kwargs):
+        def setup():
+            c = client()
+            return lambda: c.get(url, **kwargs).raise_for_status()
+        return setup
+
+    def post(url, body):
+        def setup():
+            c = client()
+            return lambda: c.post(url, json=body).raise_for_status()
+        return setup
+
+    fixture = {"home_team": "Arsenal", "away_team": "Chelsea"}
+    return [
+        Case("api.predict", post("/predict", {**fixture, "b365h": 2.1, "b365d": 3.4, "b365a": 3.5})),
+        Case("api.stats", post("/stats", fixture)),
+        Case("api.stats_window", get("/stats/Arsenal?from=2000-07-01&to=2010-06-30&last=20&venue=away")),
+        Case("api.match_preview", post("/match-preview", fixture)),
+        Case("api.simulate", get("/simulate")),
+        Case("api.simulate_what_if", post("/simulate/what-if", {
+            "as_of": "2021-02-01", "overrides": [{**fixture, "result": "A"}]})),
+        Case("api.fifa_search", get("/fifa/search?query=a&max_results=50")),
+        Case("api.fifa_top_players_200", get("/fifa/top-players?limit=200", headers={"Accept-Encoding": "gzip"})),
+        Case("api.fifa_aggregate_club", get("/fifa/aggregate?group_by=club&stats=count,mean,p90")),
+        Case("api.team_form", get("/team-form/Club 000")),
+        Case("api.players_team", get("/players/Club 000")),
+        Case("api.player_card", post("/player-card", {"team": "Club 000", "player": "Player 04321"})),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seasons", type=int, default=50)
+    parser.add_argument("--fifa-rows", type=int, nargs="+", default=[18000, 200000])
+    parser.add_argument("--teams", type=int, default=300)
+    parser.add_argument("--players", type=int, default=6000)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced peak-memory pass")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    matches_path = generate_matches(args.seasons)
+    fifa_paths = {rows: generate_fifa_players(rows) for rows in args.fifa_rows}
+    teams_dir = generate_team_files(args.teams)
+    players_dir = generate_player_files(args.players, args.teams)
+
+    cases = engine_cases(matches_path, fifa_paths, teams_dir, players_dir)
+    cases += api_cases(matches_path, fifa_paths[min(fifa_paths)], teams_dir, players_dir)
+    cases = [case for case in cases if args.filter in case.name]
+
+    history = load_history(args.history)
+    previous = history[-1]["results"] if history else {}
+
+    results = {}
+    print(f"{'case':44s} {'p50 ms':>10s} {'p95 ms':>10s} {'ops/s':>10s} {'peak MB':>9s} {'vs last':>8s}")
+    for case in cases:
+        fn = case.setup()
+        result = measure(fn, case.repeat or args.repeat, memory=case.memory and not args.no_memory)
+        results[case.name] = result
+
+        change = ""
+        if case.name in previous:
+            change = f"{(result['p50_ms'] / previous[case.name]['p50_ms'] - 1) * 100:+.0f}%"
+        peak = f"{result['peak_mb']:9.2f}" if "peak_mb" in result else f"{'-':>9s}"
+        print(f"{case.name:44s} {result['p50_ms']:10.3f} {result['p95_ms']:10.3f} "
+              f"{result['ops_per_sec']:10.1f} {peak} {change:>8s}")
+
+    if args.no_save or not results:
+        return
+    history.append({
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {"seasons": args.seasons, "fifa_rows": args.fifa_rows, "teams": args.teams,
+                   "players": args.players, "repeat": args.repeat},
+        "results": results
+    })
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+    print(f"\nSaved run {len(history)} to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Synthetic data generators for the benchmark suite.
+
+Each generator scales one of the real files in data/ while keeping its
+schema, so the engines load the output unchanged:
+- match_data.csv to many seasons (same 20 teams, so the saved encoders apply)
+- fifa_players.csv to tens or hundreds of thousands of players
+- SportMonks team JSON to hundreds of clubs
+- SportMonks player JSON to thousands of players spread over those clubs
+
+Outputs are cached under benchmarks/.data/ keyed by their parameters.
+
+Usage (from the backend directory):
+    python -m benchmarks.synthetic --seasons 50 --fifa-rows 18000 200000 --teams 300 --players 6000
+"""
+
+import argparse
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+
+# Result columns reshuffled between fixtures each season; odds stay with their fixture
+RESULT_COLUMNS = ['FTHG', 'FTAG', 'FTR', 'HTHG', 'HTAG', 'HTR', 'Referee', 'HS', 'AS', 'HST', 'AST',
+                  'HF', 'AF', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR']
+FIFA_NOISE_COLUMNS = ['overall_rating', 'potential', 'crossing', 'finishing', 'heading_accuracy', 'short_passing',
+                      'volleys', 'dribbling', 'curve', 'freekick_accuracy', 'long_passing', 'ball_control',
+                      'acceleration', 'sprint_speed', 'agility', 'reactions', 'balance', 'shot_power', 'jumping',
+                      'stamina', 'strength', 'long_shots', 'aggression', 'interceptions', 'positioning', 'vision',
+                      'penalties', 'composure', 'marking', 'standing_tackle', 'sliding_tackle']
+
+
+def _cached(name, build):
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        build(tmp)
+        os.replace(tmp, path)
+    return path
+
+
+def generate_matches(seasons=50, source="data/match_data.csv", seed=0):
+    """match_data.csv repeated over earlier seasons with results reshuffled per season"""
+    def build(path):
+        base = pd.read_csv(source)
+        dates = pd.to_datetime(base['Date'], dayfirst=True)
+        rng = np.random.default_rng(seed)
+        frames = []
+        for k in range(seasons - 1, -1, -1):
+            season = base.copy()
+            season['Date'] = (dates - pd.DateOffset(years=k)).dt.strftime('%d/%m/%Y')
+            if k:
+                order = rng.permutation(len(base))
+                season[RESULT_COLUMNS] = base[RESULT_COLUMNS].iloc[order].to_numpy()
+            frames.append(season)
+        pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+
+    return _cached(f"matches_{seasons}_seasons_{seed}.csv", build)
+
+
+def generate_fifa_players(rows=18000, source="data/fifa_players.csv", n_clubs=700, seed=0):
+    """Bootstrapped fifa_players.csv with jittered attributes, ages and values over n_clubs teams"""
+    def build(path):
+        base = pd.read_csv(source)
+        rng = np.random.default_rng(seed)
+        df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+        df['name'] = df['name'] + ' ' + pd.Series(np.arange(rows)).astype(str)
+        df['full_name'] = df['name']
+
+        for col in FIFA_NOISE_COLUMNS:
+            df[col] = np.clip(df[col].to_numpy() + rng.normal(0, 4, rows), 1, 99).round().astype(int)
+        df['age'] = rng.integers(16, 40, rows)
+        scale = rng.lognormal(0, 0.5, rows)
+        for col in ['value_euro', 'wage_euro', 'release_clause_euro']:
+            df[col] = (df[col].to_numpy() * scale).round(-3)
+
+        # The engine reads national_team as the player's club
+        clubs = np.array([f"Club {i:03d}" for i in range(n_clubs)], dtype=object)
+        df['national_team'] = clubs[rng.integers(0, n_clubs, rows)]
+        df.to_csv(path, index=False)
+
+    return _cached(f"fifa_{rows}_{n_clubs}_{seed}.csv", build)
+
+
+def generate_team_files(count=300, source="data/liverpool_team.json", seed=0):
+    """Directory of SportMonks team files cloned from one team, with new ids, names, scores and stats"""
+    directory = os.path.join(DATA_DIR, f"teams_{count}_{seed}")
+    if os.path.isdir(directory):
+        return directory
+
+    with open(source, 'r') as f:
+        template = json.load(f)
+    template_id = template['id']
+    rng = np.random.default_rng(seed)
+    tmp = directory + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+
+    for i in range(count):
+        team = copy.deepcopy(template)
+        team_id = 100000 + i
+        team['id'] = team_id
+        team['name'] = f"Club {i:03d}"
+        team['short_code'] = f"C{i:03d}"
+        for match in team.get('latest', []):
+            for entry in match.get('scores', []) + match.get('statistics', []) + match.get('xgfixture', []):
+                if entry.get('participant_id') == template_id:
+                    entry['participant_id'] = team_id
+            for score in match.get('scores', []):
+                score['score']['goals'] = int(rng.poisson(1.4))
+            for stat in match.get('statistics', []) + match.get('xgfixture', []):
+                value = stat.get('data', {}).get('value')
+                if isinstance(value, (int, float)):
+                    jittered = value * rng.uniform(0.7, 1.3)
+                    stat['data']['value'] = round(jittered, 4) if isinstance(value, float) else int(round(jittered))
+        with open(os.path.join(tmp, f"club_{i:03d}.json"), 'w') as f:
+            json.dump(team, f)
+
+    os.replace(tmp, directory)
+    return directory
+
+
+def generate_player_files(count=6000, n_teams=300, source="data/alexander_isak.json", seed=0):
+    """
+    Directory of SportMonks player files cloned from one player: a club among
+    n_teams (named like generate_team_files' clubs), sometimes a national team,
+    and 1-10 seasons of statistics with the occasional mid-season transfer
+    """
+    directory = os.path.join(DATA_DIR, f"players_{count}_{n_teams}_{seed}")
+    if os.path.isdir(directory):
+        return directory
+
+    with open(source, 'r') as f:
+        template = json.load(f)
+    template_stats = template['statistics'][0]['details']
+    rng = np.random.default_rng(seed)
+    tmp = directory + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+
+    for i in range(count):
+        player = copy.deepcopy(template)
+        player['id'] = 200000 + i
+        player['name'] = f"Player {i:05d}"
+        player['common_name'] = f"P. {i:05d}"
+        player['position_id'] = int(rng.choice([24, 25, 26, 27], p=[0.1, 0.35, 0.35, 0.2]))
+
+        club = int(rng.integers(n_teams))
+        player['teams'] = [{"team_id": 100000 + club, "jersey_number": int(rng.integers(1, 100)),
+                            "team": {"id": 100000 + club, "name": f"Club {club:03d}", "short_code": f"C{club:03d}"}}]
+        if rng.random() < 0.2:
+            nation = int(rng.integers(50))
+            player['teams'].append({"team_id": 90000 + nation, "jersey_number": int(rng.integers(1, 24)),
+                                    "team": {"id": 90000 + nation, "name": f"Nation {nation:02d}",
+                                             "short_code": f"N{nation:02d}"}})
+
+        statistics = []
+        first_season = 20000 + int(rng.integers(0, 10)) * 100
+        for season in range(int(rng.integers(1, 11))):
+            spells = 2 if rng.random() < 0.1 else 1
+            for _ in range(spells):
+                details = copy.deepcopy(template_stats)
+                for detail in details:
+                    for key, value in detail['value'].items():
+                        scaled = value * rng.uniform(0.2, 1.2) / spells
+                        detail['value'][key] = round(scaled, 2) if isinstance(value, float) else int(round(scaled))
+                statistics.append({"season_id": first_season + season * 100,
+                                   "team_id": 100000 + int(rng.integers(n_teams)),
+                                   "has_values": True, "details": details})
+        player['statistics'] = statistics
+        with open(os.path.join(tmp, f"player_{i:05d}.json"), 'w') as f:
+            json.dump(player, f)
+
+    os.replace(tmp, directory)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seasons", type=int, default=50)
+    parser.add_argument("--fifa-rows", type=int, nargs="+", default=[18000, 200000])
+    parser.add_argument("--teams", type=int, default=300)
+    parser.add_argument("--players", type=int, default=6000)
+    args = parser.parse_args()
+
+    print(generate_matches(args.seasons))
+    for rows in args.fifa_rows:
+        print(generate_fifa_players(rows))
+    print(generate_team_files(args.teams))
+    print(generate_player_files(args.players, args.teams))
+
+
+if __name__ == "__main__":
+    main()
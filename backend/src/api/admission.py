@@ -0,0 +1,266 @@
+"""
+Admission control
+Routes are grouped into cost classes. Each class has a token bucket per
+client, a cap on requests running at once (with a short queue, beyond
+which requests are shed with 503) and a deadline after which the client
+gets 503 and the work is cancelled. Cheap routes have no concurrency cap,
+so a flood of expensive requests can never take all the worker threads.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from src.deadlines import Deadline, reset_deadline, set_deadline
+from src.metrics import ADMISSION_DECISIONS
+
+
+class CostClass:
+    """
+    rate, burst: token bucket per client (requests per second, bucket size); rate=None disables it
+    deadline: seconds before a request that has not started responding gets 503
+    max_concurrent, max_queue: requests running at once, and waiting for a slot; the rest are shed
+    """
+
+    def __init__(self, name, rate=None, burst=None, deadline=None, max_concurrent=None, max_queue=0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.deadline = deadline
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters = deque()
+
+
+COST_CLASSES = {
+    'cheap': CostClass('cheap', rate=50, burst=100, deadline=2),
+    'standard': CostClass('standard', rate=10, burst=30, deadline=10, max_concurrent=16, max_queue=64),
+    'expensive': CostClass('expensive', rate=1, burst=5, deadline=30, max_concurrent=2, max_queue=8),
+}
+
+# Route templates; anything not listed is standard
+ROUTE_CLASSES = {
+    '/teams': 'cheap',
+    '/leagues': 'cheap',
+    '/metrics': 'cheap',
+    '/stats': 'cheap',
+    '/stats/{team}': 'cheap',
+    '/live/matches': 'cheap',
+    '/live/matches/{fixture_id}': 'cheap',
+    '/fifa/player/{player_name}': 'cheap',
+    '/fifa/stats': 'cheap',
+    '/fifa/top-players': 'cheap',
+    '/players/{team}': 'cheap',
+    '/team-form/{team}': 'cheap',
+    '/team-stats/{team}': 'cheap',
+    '/team-info/{team}': 'cheap',
+    '/squad-strength/{team}': 'cheap',
+    '/jobs/{job_id}': 'cheap',
+    '/predict/grid': 'cheap',
+    '/simulate': 'expensive',
+    '/simulate/stream': 'expensive',
+    '/backtest': 'expensive',
+    '/value-bets/backtest': 'expensive',
+    '/fifa/optimize-squad': 'expensive',
+    '/fifa/search/export': 'expensive',
+    '/predict/batch/stream': 'expensive',
+    '/predict/scoreline': 'expensive',
+}
+DEFAULT_CLASS = 'standard'
+
+CLIENT_HEADER = b'x-api-key'
+# Comma-separated X-API-Key values that get their own buckets; any other key is ignored
+API_KEYS_ENV = 'COPASCORE_API_KEYS'
+MAX_TRACKED_CLIENTS = 100_000
+MAX_CACHED_PATHS = 10_000
+
+
+class TokenBuckets:
+    """One bucket per (client, cost class), refilled lazily on use; the least recently seen are dropped"""
+
+    def __init__(self, max_entries=MAX_TRACKED_CLIENTS):
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+
+    def take(self, client, cost, now=None):
+        """0 if a token was taken, else the seconds until one is available"""
+        if cost.rate is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        key = (client, cost.name)
+        tokens, last = self.buckets.pop(key, (cost.burst, now))
+        tokens = min(cost.burst, tokens + (now - last) * cost.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / cost.rate
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_entries:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; all bookkeeping happens on the event loop, so it needs no locks"""
+
+    def __init__(self, app, router, classes=None, route_classes=None, api_keys=None):
+        self.app = app
+        self.router = router
+        self.classes = COST_CLASSES if classes is None else classes
+        self.route_classes = ROUTE_CLASSES if route_classes is None else route_classes
+        if api_keys is None:
+            api_keys = os.environ.get(API_KEYS_ENV, '').split(',')
+        self.api_keys = frozenset(key.strip().encode('latin-1') for key in api_keys if key.strip())
+        self.buckets = TokenBuckets()
+        self._path_classes = {}
+
+    def cost_class(self, scope):
+        path = scope['path']
+        name = self._path_classes.get(path)
+        if name is None:
+            name = DEFAULT_CLASS
+            # Routing has not happened yet, so match the path against the route templates here
+            for route in self.router.routes:
+                match, _ = route.matches(scope)
+                if match != Match.NONE and hasattr(route, 'path'):
+                    name = self.route_classes.get(route.path, DEFAULT_CLASS)
+                    if match == Match.FULL:
+                        break
+            if len(self._path_classes) >= MAX_CACHED_PATHS:
+                self._path_classes.clear()
+            self._path_classes[path] = name
+        return self.classes[name]
+
+    def client_id(self, scope):
+        """
+        A configured API key, else the client address. The header is chosen by
+        the caller, so an unknown key never gets a bucket of its own: changing
+        it would reset the rate limit, and each address adds at most one
+        bucket per class to the tracked clients.
+        """
+        for name, value in scope.get('headers', ()):
+            if name == CLIENT_HEADER and value in self.api_keys:
+                return 'key:' + value.decode('latin-1')
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    async def _acquire(self, cost, deadline):
+        """True once a slot is held, False if the queue is full, None if the deadline passed while queued"""
+        if cost.max_concurrent is None or cost.active < cost.max_concurrent:
+            cost.active += 1
+            return True
+        if len(cost.waiters) >= cost.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        cost.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=deadline.remaining())
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the deadline passed
+                return True
+            waiter.cancel()
+            return None
+        except asyncio.CancelledError:
+            # Client went away while queued; pass on a slot it may already have been given
+            if waiter.done() and not waiter.cancelled():
+                self._release(cost)
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in cost.waiters:
+                cost.waiters.remove(waiter)
+
+    @staticmethod
+    def _release(cost):
+        if cost.max_concurrent is None:
+            cost.active -= 1
+            return
+        # Hand the slot straight to the next live waiter, in arrival order
+        while cost.waiters:
+            waiter = cost.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        cost.active -= 1
+
+    async def _reject(self, scope, receive, send, cost, result, status, detail, retry_after):
+        ADMISSION_DECISIONS.labels(cost.name, result).inc()
+        response = JSONResponse({"detail": detail}, status_code=status,
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        cost = self.cost_class(scope)
+        wait = self.buckets.take(self.client_id(scope), cost)
+        if wait:
+            await self._reject(scope, receive, send, cost, 'rate_limited', 429, "Rate limit exceeded", wait)
+            return
+
+        deadline = Deadline(cost.deadline)
+        admitted = await self._acquire(cost, deadline)
+        if admitted is False:
+            await self._reject(scope, receive, send, cost, 'shed', 503, "Server busy, try again shortly", 1)
+            return
+        if admitted is None:
+            await self._reject(scope, receive, send, cost, 'deadline', 503, "Request deadline exceeded", 1)
+            return
+        ADMISSION_DECISIONS.labels(cost.name, 'admitted').inc()
+
+        started = False
+        expired = False
+
+        async def guarded_send(message):
+            nonlocal started
+            if expired:
+                # The client already has its 503; output from the abandoned work is dropped
+                return
+            if message['type'] == 'http.response.start':
+                # The deadline still holds: a stream checks it between writes and ends itself
+                started = True
+            await send(message)
+
+        # The task copies the context, deadline included, into the endpoint and its threadpool calls
+        token = set_deadline(deadline)
+        try:
+            task = asyncio.ensure_future(self.app(scope, receive, guarded_send))
+        finally:
+            reset_deadline(token)
+
+        def finished(task):
+            # The slot is freed when the work really stops, not when the client is answered
+            self._release(cost)
+            if not task.cancelled():
+                # Retrieve it so abandoned tasks do not log "exception was never retrieved"
+                task.exception()
+
+        task.add_done_callback(finished)
+
+        try:
+            done, _ = await asyncio.wait({task}, timeout=deadline.remaining())
+            if task not in done and started:
+                await task
+                return
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if task in done:
+            task.result()
+            return
+
+        # Sync endpoints keep running in their thread until their next check_deadline()
+        expired = True
+        task.cancel()
+        await self._reject(scope, receive, send, cost, 'deadline', 503, "Request deadline exceeded", 1)
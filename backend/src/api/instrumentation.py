@@ -0,0 +1,133 @@
+"""
+Request instrumentation
+Per-route latency middleware and an on-demand cProfile dump per request
+"""
+
+import cProfile
+import contextvars
+import functools
+import inspect
+import os
+import secrets
+import threading
+import time
+
+from fastapi.routing import APIRoute
+
+from src.metrics import REQUEST_LATENCY
+
+
+# Profiling is only honoured when ADMIN_TOKEN is set and sent back in X-Profile
+ADMIN_TOKEN_ENV = 'ADMIN_TOKEN'
+PROFILE_HEADER = b'x-profile'
+PROFILE_DIR = 'data/profiles'
+
+# Holds a dict for requests that asked to be profiled; the route wrapper fills in the dump path
+_profile_request = contextvars.ContextVar('profile_request', default=None)
+# cProfile hooks one thread at a time and concurrent async handlers share the loop thread
+_profiler_lock = threading.Lock()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task hop) that records each
+    request's latency, including streamed bodies, under its route template
+    so /fifa/player/{player_name} stays one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.admin_token = os.environ.get(ADMIN_TOKEN_ENV)
+
+    def _wants_profile(self, scope):
+        if not self.admin_token:
+            return False
+        for name, value in scope.get('headers', ()):
+            if name == PROFILE_HEADER:
+                return secrets.compare_digest(value.decode('latin-1'), self.admin_token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        profile = {} if self._wants_profile(scope) else None
+        token = _profile_request.set(profile)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if profile and profile.get('path'):
+                    message.setdefault('headers', [])
+                    message['headers'] = list(message['headers']) + [(b'x-profile-path', profile['path'].encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile_request.reset(token)
+            route = scope.get('route')
+            REQUEST_LATENCY.labels(
+                scope['method'],
+                route.path if route is not None else 'unmatched',
+                str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def _dump(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{os.getpid()}-{threading.get_ident()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def profiled(endpoint):
+    """Run the endpoint under cProfile when the current request asked for it"""
+    name = endpoint.__name__
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profile = _profile_request.get()
+            if profile is None or not _profiler_lock.acquire(blocking=False):
+                return await endpoint(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    profile['path'] = _dump(profiler, name)
+            finally:
+                _profiler_lock.release()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            # Sync endpoints run in the threadpool, which copies the request's context
+            profile = _profile_request.get()
+            if profile is None or not _profiler_lock.acquire(blocking=False):
+                return endpoint(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    profile['path'] = _dump(profiler, name)
+            finally:
+                _profiler_lock.release()
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint can be profiled per request; set as the router's route_class"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
@@ -1,5 +1,10 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
 import joblib
 import pandas as pd
 import xgboost as xgb
@@ -8,12 +13,35 @@ import numpy as np
 from fastapi.middleware.cors import CORSMiddleware
 from src.stats_engine import StatsEngine
 from src.league_simulator import LeagueSimulator
+from src.goals_model import GoalsModel
+from src.partitions import PartitionCatalog
+from src.live_engine import LiveEngine, LiveHub, tail_events
+from src.what_if import WhatIfCache
+from src.jobs import JobKind, JobQueue, QueueFull
 from src.copa_bot import ScoreBot
 from src.real_player_engine import RealPlayerEngine
 from src.team_stats_engine import TeamStatsEngine
 from src.fifa_player_engine import FIFAPlayerEngine
+from src.api.admission import AdmissionMiddleware
+from src.api.instrumentation import MetricsMiddleware, ProfiledRoute
+from src.api.responses import fast_json_response, ndjson_lines, parse_fields, sse_events
+from src.value_bet_engine import ValueBetEngine
+from src.backtester import Backtester
+from src.squad_optimizer import SquadOptimizer
+from src.squad_strength import SQUAD_COLUMNS, squad_strength_for
+from src.probability_grid import DEFAULT_RESOLUTION, FixtureProbabilityGrid
+from src.train_model import FEATURES, train_model
+from src.sqlite_store import SQLiteStore
+from src.sql_engines import SQLFIFAPlayerEngine, SQLStatsEngine, SQLTeamStatsEngine
+from src.metrics import REGISTRY, stage_timer
 
 app = FastAPI()
+# Endpoints can be profiled per request (X-Profile header carrying ADMIN_TOKEN)
+app.router.route_class = ProfiledRoute
+
+# Per-client rate limits, concurrency caps and deadlines by route cost class (COPASCORE_ADMISSION=off disables)
+if os.environ.get("COPASCORE_ADMISSION", "on") != "off":
+    app.add_middleware(AdmissionMiddleware, router=app.router)
 
 # Enable CORS
 app.add_middleware(
@@ -23,22 +51,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route latency histograms, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Largest fixture batch accepted by /predict/scoreline
+MAX_SCORELINE_FIXTURES = 10000
+# Largest page of players/groups/bets a single request returns; use offset for more
+MAX_PAGE_SIZE = 200
+# Most seasons a /simulate/what-if baseline or a /simulate/stream run may draw; more is a background job
+MAX_WHAT_IF_SIMULATIONS = 50000
+# Simulations in one background job; runs longer than a /simulate/stream allows go here
+MAX_JOB_SIMULATIONS = 1_000_000
 
 # Global variables for model and engines
 model = None
 le_team = None
+# Default encoder's codes by team name; a dict lookup instead of LabelEncoder.transform on the /predict path
+team_codes = {}
 le_target = None
 stats_engine = None
 league_simulator = None
+goals_model = None
+partition_catalog = None
+live_hub = None
+live_tasks = []
+# Conditional simulations of the remaining fixtures, reused by every what-if on the same season and cut-off
+what_if_cache = WhatIfCache()
 score_bot = None
 player_engine = None
 team_stats_engine = None
 fifa_player_engine = None
+value_bet_engine = None
+# Match data loaded and encoded once, shared by /backtest and backtest jobs
+backtester = None
+squad_optimizer = None
+# Per-team squad vectors from the FIFA ratings, and a model trained with them (`python -m src.train_model --squad-features`)
+squad_strength = None
+squad_model = None
+# Default-model probabilities for every pair over a grid of odds, rebuilt in the background after the model loads
+probability_grid = None
+sqlite_store = None
 explainer = None
+job_queue = None
 
 @app.on_event("startup")
 async def load_artifacts():
-    global model, le_team, le_target, stats_engine, league_simulator, score_bot, player_engine, team_stats_engine, fifa_player_engine, explainer
+    global model, le_team, team_codes, le_target, stats_engine, league_simulator, goals_model, partition_catalog, live_hub, score_bot, player_engine, team_stats_engine, fifa_player_engine, value_bet_engine, backtester, squad_optimizer, squad_strength, squad_model, probability_grid, sqlite_store, explainer, job_queue
     
     print("Loading artifacts...")
     try:
@@ -46,6 +104,7 @@ async def load_artifacts():
         print("Model loaded.")
         
         le_team = joblib.load("data/le_team.joblib")
+        team_codes = {team: code for code, team in enumerate(le_team.classes_)}
         print("Team encoder loaded.")
         
         le_target = joblib.load("data/le_target.joblib")
@@ -59,54 +118,168 @@ async def load_artifacts():
             explainer = None
             print("SHAP explainer not found.")
         
-        stats_engine = StatsEngine()
+        # Optional SQLite backend, built with `python -m src.sqlite_store`
+        db_path = os.environ.get("COPASCORE_DB")
+        if db_path:
+            sqlite_store = SQLiteStore(db_path)
+            print(f"Using SQLite store at {db_path}.")
+
+        stats_engine = SQLStatsEngine(sqlite_store) if sqlite_store else StatsEngine()
         print("Stats engine initialized.")
         
         league_simulator = LeagueSimulator()
         print("League simulator initialized.")
+
+        goals_model = GoalsModel().fit()
+        print(f"Goals model fitted on {goals_model.fit_info['matches']} matches.")
+
+        # Other leagues/seasons are loaded on first request and evicted under this budget
+        partition_catalog = PartitionCatalog(
+            default_artifacts=(model, le_team, le_target),
+            budget_mb=float(os.environ.get("COPASCORE_PARTITION_BUDGET_MB", 256))
+        )
+        print(f"Partition catalog found {len(partition_catalog.paths)} league seasons.")
+
+        live_hub = LiveHub(LiveEngine(goals_model))
+        print("Live engine initialized.")
     
         score_bot = ScoreBot()
         print("ScoreBot initialized.")
         
-        # Initialize RealPlayerEngine with Alexander Isak data
+        # Initialize RealPlayerEngine with Alexander Isak data, plus any league squads in data/players/
         player_engine = RealPlayerEngine()
-        try:
-            player_engine.load_api_data("data/alexander_isak.json")
-            print("Real player data loaded successfully!")
-        except Exception as e:
-            print(f"Could not load real player data: {e}")
-        print("Player engine initialized.")
+        player_engine.load_api_data("data/alexander_isak.json")
+        players_dir = os.environ.get("COPASCORE_PLAYERS_DIR", "data/players")
+        if os.path.isdir(players_dir):
+            player_engine.load_directory(players_dir)
+        print(f"Player engine initialized with {player_engine.get_player_count()} players "
+              f"in {len(player_engine.teams)} teams.")
         
         # Initialize TeamStatsEngine with Liverpool data
-        team_stats_engine = TeamStatsEngine()
-        try:
-            team_stats_engine.load_team_data("data/liverpool_team.json")
-            print("Team statistics engine loaded with Liverpool data!")
-        except Exception as e:
-            print(f"Could not load team data: {e}")
+        if sqlite_store:
+            # Team files and players were imported into the database
+            team_stats_engine = SQLTeamStatsEngine(sqlite_store)
+        else:
+            team_stats_engine = TeamStatsEngine()
+            try:
+                team_stats_engine.load_team_data("data/liverpool_team.json")
+                print("Team statistics engine loaded with Liverpool data!")
+            except Exception as e:
+                print(f"Could not load team data: {e}")
         print("Team stats engine initialized.")
         
         # Initialize FIFAPlayerEngine with all 17,956 players
-        fifa_player_engine = FIFAPlayerEngine()
-        try:
-            fifa_player_engine.load_fifa_data("data/fifa_players.csv")
-            print(f"FIFA player engine loaded with {fifa_player_engine.get_player_count()} players!")
-        except Exception as e:
-            print(f"Could not load FIFA data: {e}")
+        if sqlite_store:
+            fifa_player_engine = SQLFIFAPlayerEngine(sqlite_store)
+            print(f"FIFA player engine using SQLite with {fifa_player_engine.get_player_count()} players!")
+        else:
+            fifa_player_engine = FIFAPlayerEngine()
+            try:
+                fifa_player_engine.load_fifa_data("data/fifa_players.csv")
+                print(f"FIFA player engine loaded with {fifa_player_engine.get_player_count()} players!")
+            except Exception as e:
+                print(f"Could not load FIFA data: {e}")
         print("FIFA player engine initialized.")
+
+        squad_optimizer = SquadOptimizer(fifa_player_engine)
+        print("Squad optimizer initialized.")
+
+        # Team names from the model, FIFA clubs and SportMonks mapped onto each other (cached in data/)
+        squad_strength = squad_strength_for(fifa_player_engine, le_team.classes_, {
+            'sportmonks': [team['name'] for team in player_engine.teams.values() if team['name']]
+        })
+        print(f"Squad strength computed for {len(squad_strength.vectors)} teams; "
+              f"names matched per source: {squad_strength.entities.summary()}")
+        try:
+            squad_model = joblib.load("data/xgb_model_squad.joblib")
+            print("Squad-feature model loaded.")
+        except FileNotFoundError:
+            squad_model = None
+
+        # Opt-in: grid probabilities only approximate the model's. "on" (24,12,24) or e.g. "32,16,32" =
+        # buckets per B365 H/D/A axis; only /predict and /match-preview on the default model read it
+        resolution = os.environ.get("COPASCORE_GRID_RESOLUTION", "off")
+        if resolution == "on":
+            resolution = ",".join(map(str, DEFAULT_RESOLUTION))
+        if resolution != "off" and (squad_model is None or squad_strength is None):
+            probability_grid = FixtureProbabilityGrid(model, le_team, resolution=resolution.split(","))
+            # Until it is built /predict scores with the model
+            probability_grid.start_refresh()
+            print(f"Probability grid {resolution} building in the background.")
+
+        value_bet_engine = ValueBetEngine(model, le_team, le_target)
+        print("Value bet engine initialized.")
+
+        backtester = Backtester()
+        print(f"Backtester loaded {len(backtester.load_data())} matches.")
+
+        # Started last: jobs queued before a restart resume straight away and need the engines above
+        job_queue = JobQueue(
+            JOB_KINDS,
+            directory=os.environ.get("COPASCORE_JOBS_DIR", "data/jobs"),
+            workers=int(os.environ.get("COPASCORE_JOB_WORKERS", 2)),
+            ttl=float(os.environ.get("COPASCORE_JOB_TTL", 3600))
+        )
+        print(f"Job queue started: {job_queue.counts()}.")
     except Exception as e:
         print(f"Error loading artifacts: {e}")
 
+@app.on_event("startup")
+async def start_live_feed():
+    # Update fan-out, plus the feed file when COPASCORE_LIVE_FEED names one (JSON lines, tailed)
+    if live_hub is None:
+        return
+    live_tasks.append(asyncio.create_task(live_hub.run()))
+    feed_path = os.environ.get("COPASCORE_LIVE_FEED")
+    if feed_path:
+        live_tasks.append(asyncio.create_task(live_hub.consume(tail_events(feed_path))))
+        print(f"Tailing live events from {feed_path}.")
+
+@app.on_event("shutdown")
+async def stop_live_feed():
+    for task in live_tasks:
+        task.cancel()
+    await asyncio.gather(*live_tasks, return_exceptions=True)
+    live_tasks.clear()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    # Running jobs stop at their next progress report and are queued again for the next start
+    if job_queue is not None:
+        await run_in_threadpool(job_queue.shutdown)
+
 class MatchRequest(BaseModel):
     home_team: str
     away_team: str
     b365h: float
     b365d: float
     b365a: float
+    # League (Div code, e.g. E1) and season (e.g. 2019-2020); omitted means the default data
+    league: Optional[str] = None
+    season: Optional[str] = None
 
 class StatsRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     home_team: str
     away_team: str
+    league: Optional[str] = None
+    season: Optional[str] = None
+    # Window: matches from/to these dates (inclusive), then only the last N; venue all, home, away
+    # or split (home team's home matches vs away team's away matches)
+    from_date: Optional[str] = Field(None, alias="from")
+    to_date: Optional[str] = Field(None, alias="to")
+    last: Optional[int] = None
+    venue: str = "all"
+
+class MatchPreviewRequest(BaseModel):
+    home_team: str
+    away_team: str
+    # Odds are optional; the teams' average B365 prices are used when omitted
+    b365h: Optional[float] = None
+    b365d: Optional[float] = None
+    b365a: Optional[float] = None
+    top_players: int = 5
 
 class ChatRequest(BaseModel):
     message: str
@@ -115,72 +288,425 @@ class PlayerRequest(BaseModel):
     team: str
     player: str
 
+class ValueBetRequest(BaseModel):
+    # Each fixture holds HomeTeam, AwayTeam and any odds columns (B365H, PSD, MaxA, ...)
+    fixtures: List[Dict[str, Any]]
+    min_edge: float = 0.02
+    kelly_multiplier: float = 0.25
+    bankroll: Optional[float] = None
+    bookmakers: Optional[List[str]] = None
+    max_results: int = 100
+
+class BatchPredictionRequest(BaseModel):
+    # Each fixture holds HomeTeam, AwayTeam, B365H, B365D and B365A
+    fixtures: List[Dict[str, Any]]
+    chunk_size: int = 1000
+
+class ScorelineRequest(BaseModel):
+    # Each fixture holds home_team and away_team
+    fixtures: List[Dict[str, str]]
+    include_matrix: bool = True
+    ou_lines: Optional[List[float]] = None
+    ah_lines: Optional[List[float]] = None
+
+class ResultOverride(BaseModel):
+    home_team: str
+    away_team: str
+    result: str  # H, D or A
+
+class WhatIfRequest(BaseModel):
+    # Matches on or before as_of keep their real result (all results in the data when omitted)
+    as_of: Optional[str] = None
+    overrides: List[ResultOverride] = []
+    simulations: int = 10000
+    seed: int = 0
+    league: Optional[str] = None
+    season: Optional[str] = None
+
+class JobRequest(BaseModel):
+    # simulation, retrain, backtest or bulk_prediction; params are that kind's (see JOB_KINDS)
+    kind: str
+    params: Dict[str, Any] = {}
+
+class LiveEventsRequest(BaseModel):
+    # Feed events, e.g. {"fixture_id": 1, "type": "goal", "participant": "home", "minute": 23}
+    events: List[Dict[str, Any]]
+
+class SimilarPlayersRequest(BaseModel):
+    players: List[str]
+    k: int = 10
+    metric: str = "cosine"
+    weights: Optional[Dict[str, float]] = None
+    position: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    max_value: Optional[float] = None
+
+class OptimizeSquadRequest(BaseModel):
+    formation: str = "4-3-3"
+    squad_size: int = 11
+    budget: Optional[float] = None
+    wage_cap: Optional[float] = None
+    max_per_nationality: Optional[int] = None
+    max_per_club: Optional[int] = None
+
+def page_bounds(size, offset):
+    """Page size capped at MAX_PAGE_SIZE; 400 for negative values"""
+    if size < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="Page size must be positive and offset non-negative")
+    return min(size, MAX_PAGE_SIZE), offset
+
+def paginate(rows, key, page_size, offset):
+    """Body for a page fetched with one extra row, which only signals that more follow"""
+    page = rows[:page_size]
+    return {
+        key: page,
+        "count": len(page),
+        "offset": offset,
+        "next_offset": offset + page_size if len(rows) > page_size else None
+    }
+
+def get_partition(league, season):
+    """The league/season partition, loading it if needed; 404 when there is no such data"""
+    try:
+        return partition_catalog.get(league, season)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+def simulator_for(league, season):
+    """The default simulator, or the partition's; 400 when the model does not know its teams"""
+    if league is None and season is None:
+        return league_simulator
+    partition = get_partition(league, season)
+    try:
+        return partition.league_simulator
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/teams")
-def get_teams():
-    return {"teams": list(le_team.classes_)}
+def get_teams(league: Optional[str] = None, season: Optional[str] = None):
+    if league is None and season is None:
+        return {"teams": list(le_team.classes_)}
+    partition = get_partition(league, season)
+    return {"league": partition.league, "season": partition.season, "teams": partition.teams}
+
+@app.get("/leagues")
+def get_leagues():
+    """Every league/season on disk, which are in memory, and the memory budget"""
+    return {
+        "partitions": partition_catalog.list_partitions(),
+        "memory_mb": round(partition_catalog.memory_bytes() / 2**20, 3),
+        "budget_mb": partition_catalog.budget_bytes / 2**20,
+        "evictions": partition_catalog.evictions
+    }
+
+def predict_from_codes(home_code, away_code, b365h, b365d, b365a, artifacts=None):
+    """Model probabilities and SHAP values for already-encoded teams"""
+    # A partition's (model, le_team, le_target); the default model otherwise, trained with squad features if there is one
+    if artifacts:
+        predictor, encoder, target_encoder = artifacts
+    else:
+        predictor = squad_model if squad_model is not None and squad_strength is not None else model
+        encoder, target_encoder = le_team, le_target
+    squad = None
+    if squad_strength is not None:
+        squad = {side: squad_strength.vector(encoder.classes_[code])
+                 for side, code in (("home", home_code), ("away", away_code))}
+
+    # Precomputed for the default model when the grid is enabled and the odds are inside it; not with SHAP,
+    # which explains the model's own prediction
+    probs = None
+    if probability_grid is not None and predictor is model and not explainer:
+        with stage_timer('predict_match', 'grid_lookup'):
+            probs = probability_grid.lookup(home_code, away_code, (b365h, b365d, b365a))
+    # Grid values can differ from the model's by up to the error /predict/grid reports
+    approximate = probs is not None
+
+    # Create dataframe for prediction (only needed by the model itself)
+    input_data = None
+    if probs is None:
+        with stage_timer('predict_match', 'build_frame'):
+            input_data = pd.DataFrame({
+                'HomeTeam_Code': [home_code],
+                'AwayTeam_Code': [away_code],
+                'B365H': [b365h],
+                'B365D': [b365d],
+                'B365A': [b365a]
+            })
+            if squad_strength is not None and SQUAD_COLUMNS[0] in getattr(predictor, 'feature_names_in_', ()):
+                for column, value in squad_strength.features(encoder.classes_, home_code, away_code).items():
+                    input_data[column] = [value]
+    
+    # Predict probabilities
+    if probs is None:
+        with stage_timer('predict_match', 'predict_proba'):
+            probs = predictor.predict_proba(input_data)[0]
+    
+    # Map probabilities to classes
+    classes = target_encoder.classes_
+    result = {class_name: float(prob) for class_name, prob in zip(classes, probs)}
+    
+    # SHAP values
+    shap_explanation = []
+    # The explainer was built for the default model only
+    if explainer and predictor is model:
+        try:
+            with stage_timer('predict_match', 'shap'):
+                shap_values = explainer.shap_values(input_data)
+            # Format SHAP values for frontend (simplified)
+            # shap_values is a list of arrays for each class. We'll take the max prob class explanation
+            max_prob_idx = np.argmax(probs)
+            shap_explanation = shap_values[max_prob_idx][0].tolist() if isinstance(shap_values, list) else shap_values[0].tolist()
+        except Exception as e:
+            print(f"SHAP error: {e}")
+    
+    return {
+        "probabilities": result,
+        "shap_values": shap_explanation,
+        "feature_names": input_data.columns.tolist() if input_data is not None else FEATURES,
+        "squad_strength": squad,
+        "approximate": approximate
+    }
 
 @app.post("/predict")
 def predict_match(request: MatchRequest):
+    artifacts = None
+    if request.league is not None or request.season is not None:
+        partition = get_partition(request.league, request.season)
+        missing = [t for t in (request.home_team, request.away_team) if t not in partition.teams]
+        if missing:
+            raise HTTPException(status_code=400,
+                                detail=f"{', '.join(missing)} not in {partition.league} {partition.season}")
+        artifacts = partition.artifacts
+    encoder = artifacts[1] if artifacts else le_team
     try:
         # Encode teams
-        home_code = le_team.transform([request.home_team])[0]
-        away_code = le_team.transform([request.away_team])[0]
-        
-        # Create dataframe for prediction
-        input_data = pd.DataFrame({
-            'HomeTeam_Code': [home_code],
-            'AwayTeam_Code': [away_code],
-            'B365H': [request.b365h],
-            'B365D': [request.b365d],
-            'B365A': [request.b365a]
-        })
-        
-        # Predict probabilities
-        probs = model.predict_proba(input_data)[0]
-        
-        # Map probabilities to classes
-        classes = le_target.classes_
-        result = {class_name: float(prob) for class_name, prob in zip(classes, probs)}
+        with stage_timer('predict_match', 'encode_teams'):
+            if artifacts:
+                home_code = encoder.transform([request.home_team])[0]
+                away_code = encoder.transform([request.away_team])[0]
+            else:
+                for team in (request.home_team, request.away_team):
+                    if team not in team_codes:
+                        raise ValueError(f"Unknown team {team}")
+                home_code, away_code = team_codes[request.home_team], team_codes[request.away_team]
         
-        # SHAP values
-        shap_explanation = []
-        if explainer:
-            try:
-                shap_values = explainer.shap_values(input_data)
-                # Format SHAP values for frontend (simplified)
-                # shap_values is a list of arrays for each class. We'll take the max prob class explanation
-                max_prob_idx = np.argmax(probs)
-                shap_explanation = shap_values[max_prob_idx][0].tolist() if isinstance(shap_values, list) else shap_values[0].tolist()
-            except Exception as e:
-                print(f"SHAP error: {e}")
-        
-        return {
-            "probabilities": result,
-            "shap_values": shap_explanation,
-            "feature_names": input_data.columns.tolist()
-        }
+        return predict_from_codes(home_code, away_code, request.b365h, request.b365d, request.b365a, artifacts)
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/predict/grid")
+def get_probability_grid():
+    """Resolution, odds bounds, memory, build time and accuracy against the exact model of the /predict grid"""
+    if probability_grid is None:
+        raise HTTPException(status_code=404, detail="Probability grid is disabled (COPASCORE_GRID_RESOLUTION)")
+    return probability_grid.describe()
+
+@app.post("/predict/scoreline")
+def predict_scoreline(request: Request, body: ScorelineRequest):
+    """Dixon-Coles scoreline matrices with over/under, BTTS and Asian-handicap prices for a batch of fixtures"""
+    if len(body.fixtures) > MAX_SCORELINE_FIXTURES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SCORELINE_FIXTURES} fixtures per request")
+    for line in body.ah_lines or []:
+        if (line * 4) % 1 != 0:
+            raise HTTPException(status_code=400, detail=f"Asian handicap lines must be multiples of 0.25, got {line}")
+    for line in body.ou_lines or []:
+        if not (line >= 0 and (line * 4) % 1 == 0):
+            raise HTTPException(status_code=400,
+                                detail=f"Over/under lines must be non-negative multiples of 0.25, got {line}")
+    try:
+        fixtures = [(f["home_team"], f["away_team"]) for f in body.fixtures]
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Fixture is missing {e}")
+    try:
+        with stage_timer('predict_scoreline', 'markets'):
+            results = goals_model.predict(fixtures, body.include_matrix, body.ou_lines, body.ah_lines)
+        return fast_json_response(request, {"predictions": results, "count": len(results)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def top_players_of(team, limit):
+    """A model team's best FIFA players, through the clubs the entity table maps onto it"""
+    if squad_strength is None:
+        return fifa_player_engine.get_top_players(limit, team)
+    return fifa_player_engine.get_top_players(limit, clubs=squad_strength.entities.names(team, 'fifa'))
+
+@app.post("/match-preview")
+async def get_match_preview(request: MatchPreviewRequest):
+    """Prediction, stats, form and both squads' top players for one fixture in a single call"""
+    try:
+        # Encode both teams once and share the codes with every engine call
+        home_code, away_code = le_team.transform([request.home_team, request.away_team])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    odds = {"b365h": request.b365h, "b365d": request.b365d, "b365a": request.b365a}
+    if None in odds.values():
+        average_odds = stats_engine.get_average_odds(request.home_team, request.away_team)
+        if not average_odds:
+            raise HTTPException(status_code=400, detail="Odds not provided and no historical odds for these teams")
+        odds = {k: v if v is not None else average_odds[k] for k, v in odds.items()}
+
+    top_players = min(request.top_players, MAX_PAGE_SIZE)
+    try:
+        # Independent engine calls run concurrently on the threadpool
+        prediction, stats, form, home_players, away_players = await asyncio.gather(
+            run_in_threadpool(predict_from_codes, home_code, away_code, odds["b365h"], odds["b365d"], odds["b365a"]),
+            run_in_threadpool(stats_engine.get_comparison, request.home_team, request.away_team),
+            run_in_threadpool(team_stats_engine.get_team_comparison, request.home_team, request.away_team),
+            run_in_threadpool(top_players_of, request.home_team, top_players),
+            run_in_threadpool(top_players_of, request.away_team, top_players)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "home_team": request.home_team,
+        "away_team": request.away_team,
+        "odds": odds,
+        "prediction": prediction,
+        "stats": stats,
+        "form": form,
+        "top_players": {
+            "home": home_players,
+            "away": away_players
+        }
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of request, stage and cache metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def stats_engine_for(league=None, season=None):
+    if league is None and season is None:
+        return stats_engine
+    return get_partition(league, season).stats_engine
+
 @app.post("/stats")
 def get_match_stats(request: StatsRequest):
+    engine = stats_engine_for(request.league, request.season)
     try:
-        stats = stats_engine.get_comparison(request.home_team, request.away_team)
-        if not stats:
-            raise HTTPException(status_code=404, detail="Stats not found for one or both teams")
-        return stats
+        stats = engine.get_comparison(request.home_team, request.away_team, request.from_date, request.to_date,
+                                      request.last, request.venue)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not stats:
+        raise HTTPException(status_code=404, detail="Stats not found for one or both teams")
+    return stats
+
+@app.get("/stats/{team}")
+def get_team_window_stats(team: str, from_date: Optional[str] = Query(None, alias="from"),
+                          to_date: Optional[str] = Query(None, alias="to"), last: Optional[int] = None,
+                          venue: str = "all", league: Optional[str] = None, season: Optional[str] = None):
+    """One team's per-match averages over a date range and/or its last N matches, optionally home or away only"""
+    engine = stats_engine_for(league, season)
+    try:
+        stats = engine.get_team_stats(team, from_date, to_date, last, venue)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not stats:
+        raise HTTPException(status_code=404, detail="No matches for this team in the window")
+    return {"team": team, **stats}
 
 @app.get("/simulate")
-def simulate_season():
+def simulate_season(request: Request, league: Optional[str] = None, season: Optional[str] = None):
+    simulator = simulator_for(league, season)
     try:
-        table = league_simulator.simulate_season()
-        return {"table": table}
+        table = simulator.simulate_season()
+        return fast_json_response(request, {"table": table})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/simulate/stream")
+def simulate_season_stream(simulations: int = 10000, batch_size: int = 1000, seed: Optional[int] = None,
+                           league: Optional[str] = None, season: Optional[str] = None):
+    """Server-Sent Events: a progress event with running standings after each batch, then done"""
+    if not 1 <= simulations <= MAX_WHAT_IF_SIMULATIONS:
+        raise HTTPException(status_code=400, detail=f"simulations must be between 1 and {MAX_WHAT_IF_SIMULATIONS}; "
+                                                    f"submit a 'simulation' job to POST /jobs for up to {MAX_JOB_SIMULATIONS}")
+    if not 1 <= batch_size <= simulations:
+        raise HTTPException(status_code=400, detail="batch_size must be between 1 and simulations")
+    batches = simulator_for(league, season).simulate_batches(simulations, batch_size, seed)
+    return StreamingResponse(
+        sse_events(batches),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/simulate/what-if")
+def simulate_what_if(request: Request, body: WhatIfRequest):
+    """Title / top-4 / relegation odds from the remaining fixtures, with some results fixed by the caller"""
+    if not 1 <= body.simulations <= MAX_WHAT_IF_SIMULATIONS:
+        raise HTTPException(status_code=400, detail=f"simulations must be between 1 and {MAX_WHAT_IF_SIMULATIONS}")
+    simulator = simulator_for(body.league, body.season)
+    try:
+        conditional = what_if_cache.get(simulator, body.as_of, body.simulations, body.seed)
+        standings = conditional.what_if([(o.home_team, o.away_team, o.result) for o in body.overrides])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return fast_json_response(request, {
+        "as_of": body.as_of,
+        "played_fixtures": int((conditional.outcomes >= 0).sum()),
+        "remaining_fixtures": int(len(conditional.remaining)),
+        "simulations": body.simulations,
+        "overrides": len(body.overrides),
+        "standings": standings
+    })
+
+def check_batch(fixtures, chunk_size):
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    required = {"HomeTeam", "AwayTeam", "B365H", "B365D", "B365A"}
+    for i, fixture in enumerate(fixtures):
+        if not isinstance(fixture, dict):
+            raise ValueError(f"Fixture {i} is not an object")
+        missing = required - fixture.keys()
+        if missing:
+            raise ValueError(f"Fixture {i} is missing {', '.join(sorted(missing))}")
+
+@app.post("/predict/batch/stream")
+def predict_batch_stream(request: BatchPredictionRequest):
+    """NDJSON: one prediction per line, scored chunk by chunk as the response is written"""
+    # Validate up front; once streaming starts the status code can no longer change
+    try:
+        check_batch(request.fixtures, request.chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunks = value_bet_engine.iter_predictions(request.fixtures, chunk_size=request.chunk_size)
+    return StreamingResponse(ndjson_lines(chunks), media_type="application/x-ndjson")
+
+@app.post("/live/events")
+async def ingest_live_events(request: LiveEventsRequest):
+    """Local event source standing in for the feed; applied in order on the event loop, all or none"""
+    try:
+        live_hub.ingest_many(request.events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": len(request.events)}
+
+@app.get("/live/matches")
+async def get_live_matches():
+    matches = [state.snapshot() for state in live_hub.engine.matches.values()]
+    for match in matches:
+        match["subscribers"] = live_hub.subscriber_count(match["fixture_id"])
+    return {"matches": matches, "subscribers": live_hub.subscriber_count()}
+
+@app.get("/live/matches/{fixture_id}")
+async def get_live_match(fixture_id: int):
+    state = live_hub.engine.matches.get(fixture_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No live match {fixture_id}")
+    return state.snapshot()
+
+@app.websocket("/live/ws/{fixture_id}")
+async def live_match_updates(websocket: WebSocket, fixture_id: int):
+    """Current state on connect, then an update whenever the match changes (at most one per flush interval)"""
+    await live_hub.serve(websocket, fixture_id)
+
 @app.post("/chat")
 def chat_with_ai(request: ChatRequest):
     try:
@@ -291,22 +817,25 @@ How can I assist you today?"""
     }
 
 @app.get("/players/{team}")
-def get_team_players(team: str):
+def get_team_players(request: Request, team: str, position: Optional[str] = None):
+    """Team by name, short code or SportMonks id; position by id or name (e.g. Attacker)"""
     try:
-        players = player_engine.get_team_players(team)
-        return {"players": players}
+        players = player_engine.get_team_players(team, position=position)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown position {position}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return fast_json_response(request, {"players": players})
 
 @app.post("/player-card")
 def get_player_card(request: PlayerRequest):
     try:
         card = player_engine.get_player_card(request.team, request.player)
-        if not card:
-            raise HTTPException(status_code=404, detail="Player not found")
-        return card
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not card:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return card
 
 @app.get("/team-form/{team}")
 def get_team_form(team: str, matches: int = 5):
@@ -341,30 +870,71 @@ def get_team_information(team: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/squad-strength/{team}")
+def get_squad_strength(team: str):
+    """Best-XI, line and depth ratings of a team's squad, from any source's name for it"""
+    vector = squad_strength.vector(team) if squad_strength else None
+    if vector is None:
+        raise HTTPException(status_code=404, detail="No squad ratings for this team")
+    return {"team": team, "model_team": squad_strength.entities.resolve(team), "squad_strength": vector}
+
 # FIFA Player Endpoints
 @app.get("/fifa/search")
 def search_fifa_players(
+    request: Request,
     query: str = "",
     team: str = None,
     position: str = None,
     nationality: str = None,
     min_rating: int = 0,
-    max_results: int = 50
+    max_results: int = 50,
+    fields: str = None,
+    offset: int = 0
 ):
-    """Search FIFA players with filters"""
+    """Search FIFA players with filters; fields=short_name,overall limits the returned columns"""
+    page_size, offset = page_bounds(max_results, offset)
     try:
+        # One extra row tells whether there is a next page
         results = fifa_player_engine.search_players(
             query=query,
             team=team,
             position=position,
             nationality=nationality,
             min_rating=min_rating,
-            max_results=max_results
+            max_results=page_size + 1,
+            fields=parse_fields(fields),
+            offset=offset
         )
-        return {"players": results, "count": len(results)}
+        return fast_json_response(request, paginate(results, "players", page_size, offset))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/fifa/search/export")
+def export_fifa_players(
+    query: str = "",
+    team: str = None,
+    position: str = None,
+    nationality: str = None,
+    min_rating: int = 0,
+    limit: Optional[int] = None,
+    fields: str = None
+):
+    """NDJSON export of every player matching the /fifa/search filters, one player per line"""
+    chunks = fifa_player_engine.iter_players(
+        query=query,
+        team=team,
+        position=position,
+        nationality=nationality,
+        min_rating=min_rating,
+        limit=limit,
+        fields=parse_fields(fields)
+    )
+    return StreamingResponse(
+        ndjson_lines(chunks),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=fifa_players.ndjson"}
+    )
+
 @app.get("/fifa/player/{player_name}")
 def get_fifa_player_card(player_name: str):
     """Get detailed FIFA player card"""
@@ -376,12 +946,103 @@ def get_fifa_player_card(player_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/fifa/similar/{player_name}")
+def get_similar_fifa_players(
+    player_name: str,
+    k: int = 10,
+    metric: str = "cosine",
+    position: str = None,
+    min_age: int = None,
+    max_age: int = None,
+    max_value: float = None
+):
+    """Get the k most similar FIFA players by attribute profile"""
+    try:
+        results = fifa_player_engine.find_similar_players(
+            [player_name], k=min(k, MAX_PAGE_SIZE), metric=metric, position=position,
+            min_age=min_age, max_age=max_age, max_value=max_value
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    players = results[0]
+    if players is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return {"player": player_name, "similar": players, "count": len(players)}
+
+@app.post("/fifa/similar")
+def get_similar_fifa_players_batch(request: SimilarPlayersRequest):
+    """Similar players for each player in a list (e.g. a whole squad) in one call"""
+    try:
+        results = fifa_player_engine.find_similar_players(
+            request.players, k=min(request.k, MAX_PAGE_SIZE), metric=request.metric, weights=request.weights,
+            position=request.position, min_age=request.min_age, max_age=request.max_age,
+            max_value=request.max_value
+        )
+        # A list in request order, so a name asked for twice is answered twice
+        return {
+            "results": [{"player": name, "similar": players} for name, players in zip(request.players, results)],
+            "not_found": [name for name, players in zip(request.players, results) if players is None]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/fifa/optimize-squad")
+def optimize_fifa_squad(request: OptimizeSquadRequest):
+    """Best XI or 23-man squad for a formation under budget, wage and nationality/club limits"""
+    try:
+        squad = squad_optimizer.optimize(
+            formation=request.formation,
+            squad_size=request.squad_size,
+            budget=request.budget,
+            wage_cap=request.wage_cap,
+            max_per_nationality=request.max_per_nationality,
+            max_per_club=request.max_per_club
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not squad:
+        raise HTTPException(status_code=404, detail="No player data loaded")
+    return squad
+
 @app.get("/fifa/top-players")
-def get_top_fifa_players(limit: int = 100):
-    """Get top rated FIFA players"""
+def get_top_fifa_players(request: Request, limit: int = 100, fields: str = None, offset: int = 0):
+    """Get top rated FIFA players; fields=short_name,overall limits the returned columns"""
+    page_size, offset = page_bounds(limit, offset)
+    try:
+        players = fifa_player_engine.get_top_players(limit=page_size + 1, fields=parse_fields(fields), offset=offset)
+        return fast_json_response(request, paginate(players, "players", page_size, offset))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/fifa/aggregate")
+def aggregate_fifa_players(
+    group_by: str = "nationality",
+    metric: str = "overall",
+    stats: str = "count,mean",
+    sort_by: str = None,
+    ascending: bool = False,
+    limit: int = 50,
+    min_count: int = 1
+):
+    """Group-by summaries (count, sum, mean, min, max, median, pNN) over FIFA players"""
     try:
-        players = fifa_player_engine.get_top_players(limit=limit)
-        return {"players": players, "count": len(players)}
+        return fifa_player_engine.aggregate(
+            group_by=group_by,
+            metric=metric,
+            stats=[s.strip() for s in stats.split(',') if s.strip()],
+            sort_by=sort_by,
+            ascending=ascending,
+            limit=min(limit, MAX_PAGE_SIZE),
+            min_count=min_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -398,6 +1059,149 @@ def get_fifa_database_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Value Bet Endpoints
+@app.post("/value-bets")
+def find_value_bets(request: ValueBetRequest):
+    """Rank value bets across a batch of fixtures"""
+    try:
+        return value_bet_engine.find_value_bets(
+            request.fixtures,
+            min_edge=request.min_edge,
+            kelly_multiplier=request.kelly_multiplier,
+            bankroll=request.bankroll,
+            bookmakers=request.bookmakers,
+            max_results=min(request.max_results, MAX_PAGE_SIZE)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/value-bets/backtest")
+def backtest_value_bets(
+    bookmaker: str = "B365",
+    closing: bool = False,
+    min_edge: float = 0.02,
+    staking: str = "flat",
+    kelly_multiplier: float = 0.25,
+    bankroll: float = 1000.0
+):
+    """Replay the value-bet strategy over the historical match data"""
+    try:
+        return value_bet_engine.backtest(
+            bookmaker=bookmaker,
+            closing=closing,
+            min_edge=min_edge,
+            staking=staking,
+            kelly_multiplier=kelly_multiplier,
+            bankroll=bankroll
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/backtest")
+def run_backtest(
+    min_train_matches: int = 190,
+    window_matches: int = 38,
+    rolling: bool = False,
+    retrain: bool = True,
+    bookmaker: str = "B365",
+    closing: bool = True,
+    min_edge: float = 0.02
+):
+    """Walk-forward evaluation of the model and value-bet P&L"""
+    try:
+        return backtester.run(
+            min_train_matches=min_train_matches,
+            window_matches=window_matches,
+            rolling=rolling,
+            retrain=retrain,
+            bookmaker=bookmaker,
+            closing=closing,
+            min_edge=min_edge
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Background jobs: run(params, progress, output_prefix) per kind, with every accepted parameter's default
+
+def check_simulation_job(params):
+    if not 1 <= params["simulations"] <= MAX_JOB_SIMULATIONS:
+        raise ValueError(f"simulations must be between 1 and {MAX_JOB_SIMULATIONS}")
+    if params["batch_size"] < 1:
+        raise ValueError("batch_size must be positive")
+    # Unknown leagues/seasons are rejected at submit time rather than as a failed job
+    simulator_for(params["league"], params["season"])
+
+def run_simulation_job(params, progress, output_prefix):
+    simulator = simulator_for(params["league"], params["season"])
+    for update in simulator.simulate_batches(params["simulations"], params["batch_size"], params["seed"]):
+        progress(update["simulations"] / update["total_simulations"], f"{update['simulations']} simulations")
+    return update
+
+def check_backtest_job(params):
+    source = ValueBetEngine.CLOSING_BOOKMAKERS if params["closing"] else ValueBetEngine.BOOKMAKERS
+    if params["bookmaker"] not in source:
+        raise ValueError(f"Unknown bookmaker: {params['bookmaker']}")
+    if params["min_train_matches"] < 1 or params["window_matches"] < 1:
+        raise ValueError("min_train_matches and window_matches must be positive")
+
+def run_backtest_job(params, progress, output_prefix):
+    return backtester.run(**params, progress=progress)
+
+def run_retrain_job(params, progress, output_prefix):
+    """Trains on data/processed_data.csv; the model file is kept with the result (copy it before the TTL to serve it)"""
+    progress(0.0, "training")
+    return train_model(params["squad_features"], output=f"{output_prefix}.joblib")
+
+def run_bulk_prediction_job(params, progress, output_prefix):
+    fixtures = params["fixtures"]
+    predictions = []
+    for chunk in value_bet_engine.iter_predictions(fixtures, chunk_size=params["chunk_size"]):
+        predictions.extend(chunk)
+        progress(len(predictions) / len(fixtures), f"{len(predictions)}/{len(fixtures)} fixtures")
+    return {"predictions": predictions, "count": len(predictions)}
+
+JOB_KINDS = {
+    "simulation": JobKind(
+        run_simulation_job,
+        {"simulations": 100000, "batch_size": 10000, "seed": None, "league": None, "season": None},
+        check_simulation_job
+    ),
+    "retrain": JobKind(run_retrain_job, {"squad_features": False}),
+    "backtest": JobKind(
+        run_backtest_job,
+        {"min_train_matches": 190, "window_matches": 38, "rolling": False, "retrain": True,
+         "bookmaker": "B365", "closing": True, "min_edge": 0.02},
+        check_backtest_job
+    ),
+    "bulk_prediction": JobKind(
+        run_bulk_prediction_job,
+        {"fixtures": [], "chunk_size": 1000},
+        lambda params: check_batch(params["fixtures"], params["chunk_size"])
+    ),
+}
+
+@app.post("/jobs", status_code=202)
+def submit_job(body: JobRequest):
+    """Queue a background job; an identical queued, running or unexpired finished job is returned instead"""
+    try:
+        job, deduplicated = job_queue.submit(body.kind, body.params)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {"job": job, "deduplicated": deduplicated}
+
+@app.get("/jobs/{job_id}")
+def get_job(request: Request, job_id: str):
+    """Status, progress and timings of a job, with its result once it has succeeded"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such job (it may have expired)")
+    return fast_json_response(request, job)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,108 @@
+"""
+Fast JSON responses for large payloads
+orjson encoding, ETag / If-None-Match revalidation and gzip/brotli compression
+"""
+
+import gzip
+import hashlib
+
+import orjson
+from fastapi import Request, Response
+
+from src.deadlines import DeadlineExceeded
+from src.metrics import record_cache, stage_timer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this are sent uncompressed; compression would not pay off
+COMPRESSION_THRESHOLD = 1024
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def parse_fields(fields):
+    """'short_name,overall' -> ['short_name', 'overall']; None means every field"""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def _pick_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def fast_json_response(request: Request, content, status_code=200):
+    """
+    Encode content with orjson (NumPy-aware, no jsonable_encoder walk), answer
+    304 when the client already holds the same body, and compress bodies above
+    COMPRESSION_THRESHOLD with brotli or gzip per Accept-Encoding.
+    """
+    with stage_timer('response', 'serialize'):
+        body = orjson.dumps(content, option=ORJSON_OPTIONS)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        matched = _etag_matches(if_none_match, etag)
+        record_cache('etag', matched)
+        if matched:
+            return Response(status_code=304, headers=headers)
+
+    if len(body) >= COMPRESSION_THRESHOLD:
+        encoding = _pick_encoding(request.headers.get('accept-encoding'))
+        with stage_timer('response', 'compress'):
+            if encoding == 'br':
+                body = brotli.compress(body, quality=4)
+                headers['Content-Encoding'] = 'br'
+            elif encoding == 'gzip':
+                body = gzip.compress(body, compresslevel=5)
+                headers['Content-Encoding'] = 'gzip'
+
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
+
+
+def ndjson_lines(chunks):
+    """Encode an iterator of record lists as newline-delimited JSON, one write per chunk"""
+    for records in chunks:
+        if records:
+            yield b''.join(orjson.dumps(r, option=ORJSON_OPTIONS) + b'\n' for r in records)
+
+
+def _sse(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + orjson.dumps(data, option=ORJSON_OPTIONS) + b'\n\n'
+
+
+def sse_events(events, event='progress', final_event='done'):
+    """
+    Encode an iterator of dicts as Server-Sent Events; the last one is tagged final_event.
+    If the request deadline stops the iterator, the stream ends with an 'error' event instead.
+    """
+    previous = None
+    try:
+        for item in events:
+            if previous is not None:
+                yield _sse(event, previous)
+            previous = item
+    except DeadlineExceeded as e:
+        if previous is not None:
+            yield _sse(event, previous)
+        yield _sse('error', {"detail": str(e)})
+        return
+    if previous is not None:
+        yield _sse(final_event, previous)
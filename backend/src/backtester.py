@@ -0,0 +1,282 @@
+"""
+Walk-Forward Backtester
+Evaluates the match prediction model and a value-betting strategy over time
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+from src.deadlines import check_deadline
+from src.metrics import record_cache
+from src.value_bet_engine import ValueBetEngine
+
+
+FEATURES = ['HomeTeam_Code', 'AwayTeam_Code', 'B365H', 'B365D', 'B365A']
+# LabelEncoder order of FTR, matching le_target.joblib
+TARGET_CLASSES = ['A', 'D', 'H']
+
+
+def _window_key(train, test, params):
+    """Hash everything a window result depends on, so edits elsewhere don't invalidate it"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    for frame in (train, test):
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:24]
+
+
+def _score_window(train, test, params):
+    """
+    Fit (or load) a model for one window and score its test matches.
+    Runs in a worker process, so it only receives plain DataFrames and dicts.
+    """
+    if params['retrain']:
+        model = xgb.XGBClassifier(eval_metric='mlogloss', n_jobs=1, random_state=42)
+        model.fit(train[FEATURES], train['FTR_Code'])
+    else:
+        model = joblib.load(params['model_path'])
+
+    # Columns come out in TARGET_CLASSES order; reorder to H/D/A
+    probs = model.predict_proba(test[FEATURES])
+    probs = probs[:, [TARGET_CLASSES.index(o) for o in ValueBetEngine.OUTCOMES]]
+
+    odds = ValueBetEngine.odds_matrix(test, {params['bookmaker']: params['odds_columns']})[:, 0, :]
+    return {
+        'start_date': str(test['Date'].min().date()),
+        'end_date': str(test['Date'].max().date()),
+        'train_matches': int(len(train)),
+        'probs': probs,
+        'outcomes': test['FTR'].map({o: i for i, o in enumerate(ValueBetEngine.OUTCOMES)}).to_numpy(),
+        'odds': odds
+    }
+
+
+class Backtester:
+    """
+    Walk-forward evaluation over match_data.csv style files:
+    - Splits matches by date into consecutive test windows
+    - Retrains on everything before each window (or reuses the saved model)
+    - Scores windows in parallel across a process pool
+    - Caches each window's predictions so reruns only recompute changed windows
+
+    The saved model is scored with its own team encoder, and only on matches
+    outside its training data (training_data_path), or the scores would be
+    in-sample.
+    """
+
+    def __init__(self, data_path="data/match_data.csv", cache_dir="data/backtest_cache",
+                 model_path="data/xgb_model.joblib", le_team_path="data/le_team.joblib",
+                 training_data_path="data/processed_data.csv"):
+        self.data_path = data_path
+        self.cache_dir = cache_dir
+        self.model_path = model_path
+        self.le_team_path = le_team_path
+        self.training_data_path = training_data_path
+        self.df = None
+
+    def load_data(self):
+        df = pd.read_csv(self.data_path)
+        df['Date'] = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+        for col in ['B365H', 'B365D', 'B365A']:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df = df.dropna(subset=['Date', 'HomeTeam', 'AwayTeam', 'FTR', 'B365H', 'B365D', 'B365A'])
+        df = df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+        # One encoder over every team in the file so multi-season data stays consistent
+        le_team = LabelEncoder().fit(pd.concat([df['HomeTeam'], df['AwayTeam']]).unique())
+        df = df.assign(
+            HomeTeam_Code=le_team.transform(df['HomeTeam']),
+            AwayTeam_Code=le_team.transform(df['AwayTeam']),
+            FTR_Code=df['FTR'].map({c: i for i, c in enumerate(TARGET_CLASSES)})
+        )
+        self.df = df
+        return df
+
+    def saved_model_frame(self, tested):
+        """
+        The data encoded with the saved model's team encoder, for scoring it
+        without retraining. ValueError if a team is unknown to that encoder,
+        or if any tested row (a slice of self.df) is in its training data.
+        """
+        le_team = joblib.load(self.le_team_path)
+        unknown = sorted(set(self.df['HomeTeam']).union(self.df['AwayTeam']) - set(le_team.classes_))
+        if unknown:
+            raise ValueError(f"Teams unknown to the saved model: {', '.join(unknown)}")
+        if os.path.exists(self.training_data_path):
+            keys = ['HomeTeam', 'AwayTeam', 'B365H', 'B365D', 'B365A']
+            trained = pd.read_csv(self.training_data_path, usecols=keys).drop_duplicates()
+            overlap = len(tested[keys].merge(trained, on=keys))
+            if overlap:
+                raise ValueError(f"{overlap} of the {len(tested)} tested matches are in the saved model's training "
+                                 f"data ({self.training_data_path}), so its scores would be in-sample; use retrain")
+        return self.df.assign(
+            HomeTeam_Code=le_team.transform(self.df['HomeTeam']),
+            AwayTeam_Code=le_team.transform(self.df['AwayTeam'])
+        )
+
+    def make_windows(self, min_train_matches=190, window_matches=38, rolling=False):
+        """Return (train, test) index ranges; rolling keeps the train set a fixed size"""
+        n = len(self.df)
+        windows = []
+        start = min_train_matches
+        while start < n:
+            end = min(start + window_matches, n)
+            train_start = start - min_train_matches if rolling else 0
+            windows.append((train_start, start, end))
+            start = end
+        return windows
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def run(self, min_train_matches=190, window_matches=38, rolling=False, retrain=True,
+            bookmaker='B365', closing=True, min_edge=0.02, n_bins=10, max_workers=None, progress=None):
+        """progress(fraction, message), if given, is called as each uncached window finishes"""
+        if self.df is None:
+            self.load_data()
+
+        source = ValueBetEngine.CLOSING_BOOKMAKERS if closing else ValueBetEngine.BOOKMAKERS
+        if bookmaker not in source:
+            raise ValueError(f"Unknown bookmaker: {bookmaker}")
+
+        params = {
+            'retrain': retrain,
+            'bookmaker': bookmaker,
+            'odds_columns': list(source[bookmaker]),
+            'model_path': self.model_path
+        }
+        if not retrain:
+            # Cached predictions are only valid for this exact model file
+            params['model_mtime'] = os.path.getmtime(self.model_path)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        windows = self.make_windows(min_train_matches, window_matches, rolling)
+        # Retrained windows use the file's own encoder; the saved model needs the codes it was trained on
+        df = self.df if retrain else self.saved_model_frame(self.df.iloc[min_train_matches:])
+        results = [None] * len(windows)
+        pending = []
+        for i, (train_start, test_start, test_end) in enumerate(windows):
+            train = df.iloc[train_start:test_start]
+            test = df.iloc[test_start:test_end]
+            key = _window_key(train, test, params)
+            path = self._cache_path(key)
+            if os.path.exists(path):
+                results[i] = joblib.load(path)
+            else:
+                pending.append((i, path, train, test))
+            record_cache('backtest_window', results[i] is not None)
+
+        # Windows are cached as they finish, so a run stopped by its request deadline resumes where it left off
+        if pending:
+            if len(pending) == 1 or max_workers == 1:
+                for done, (i, path, train, test) in enumerate(pending, 1):
+                    check_deadline()
+                    results[i] = _score_window(train, test, params)
+                    joblib.dump(results[i], path)
+                    if progress:
+                        progress(done / len(pending), f"{done}/{len(pending)} windows")
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    futures = [pool.submit(_score_window, train, test, params) for _, _, train, test in pending]
+                    try:
+                        for done, ((i, path, _, _), future) in enumerate(zip(pending, futures), 1):
+                            check_deadline()
+                            results[i] = future.result()
+                            joblib.dump(results[i], path)
+                            if progress:
+                                progress(done / len(pending), f"{done}/{len(pending)} windows")
+                    except Exception:
+                        # Deadline passed or the progress callback stopped the run
+                        for future in futures:
+                            future.cancel()
+                        raise
+
+        report = self._summarise(results, min_edge, n_bins)
+        report['windows_computed'] = len(pending)
+        report['windows_cached'] = len(windows) - len(pending)
+        report['bookmaker'] = bookmaker
+        report['closing_odds'] = closing
+        return report
+
+    @staticmethod
+    def _metrics(probs, outcomes, odds, min_edge):
+        n = len(outcomes)
+        eps = 1e-15
+        onehot = np.zeros_like(probs)
+        onehot[np.arange(n), outcomes] = 1.0
+        p_true = np.clip(probs[np.arange(n), outcomes], eps, 1.0)
+
+        with np.errstate(invalid='ignore'):
+            edges = probs * odds - 1.0
+        filled = np.where(np.isfinite(edges), edges, -np.inf)
+        pick = filled.argmax(axis=1)
+        placed = filled[np.arange(n), pick] > min_edge
+        won = placed & (pick == outcomes)
+        pnl = np.where(won, odds[np.arange(n), pick] - 1.0, -1.0)[placed]
+
+        return {
+            'matches': int(n),
+            'accuracy': float((probs.argmax(axis=1) == outcomes).mean()),
+            'log_loss': float(-np.log(p_true).mean()),
+            'brier': float(((probs - onehot) ** 2).sum(axis=1).mean()),
+            'bets': int(placed.sum()),
+            'profit': round(float(pnl.sum()), 2),
+            'roi': float(pnl.mean()) if len(pnl) else 0.0
+        }
+
+    def _summarise(self, results, min_edge, n_bins):
+        windows = []
+        for r in results:
+            summary = self._metrics(r['probs'], r['outcomes'], r['odds'], min_edge)
+            summary.update(start_date=r['start_date'], end_date=r['end_date'], train_matches=r['train_matches'])
+            windows.append(summary)
+
+        if not results:
+            return {'windows': [], 'overall': None, 'calibration': {}}
+
+        probs = np.concatenate([r['probs'] for r in results])
+        outcomes = np.concatenate([r['outcomes'] for r in results])
+        odds = np.concatenate([r['odds'] for r in results])
+
+        # Reliability curve per outcome: mean predicted vs observed frequency per bin
+        edges = np.linspace(0.0, 1.0, n_bins + 1)
+        calibration = {}
+        for o, name in enumerate(ValueBetEngine.OUTCOMES):
+            p = probs[:, o]
+            hit = (outcomes == o).astype(float)
+            bins = np.clip(np.digitize(p, edges) - 1, 0, n_bins - 1)
+            counts = np.bincount(bins, minlength=n_bins)
+            pred_sum = np.bincount(bins, weights=p, minlength=n_bins)
+            hit_sum = np.bincount(bins, weights=hit, minlength=n_bins)
+            nonempty = counts > 0
+            calibration[name] = [
+                {
+                    'bin_start': float(edges[b]),
+                    'count': int(counts[b]),
+                    'mean_predicted': float(pred_sum[b] / counts[b]),
+                    'observed_frequency': float(hit_sum[b] / counts[b])
+                }
+                for b in np.flatnonzero(nonempty)
+            ]
+
+        return {
+            'windows': windows,
+            'overall': self._metrics(probs, outcomes, odds, min_edge),
+            'calibration': calibration
+        }
+
+
+if __name__ == "__main__":
+    backtester = Backtester()
+    report = backtester.run()
+    for window in report['windows']:
+        print(window)
+    print("Overall:", report['overall'])
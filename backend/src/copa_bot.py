@@ -3,6 +3,8 @@ import pandas as pd
 import joblib
 from src.stats_engine import StatsEngine
 from src.league_simulator import LeagueSimulator
+from src.metrics import stage_timer
+from src.sqlite_store import season_label
 
 class ScoreBot:
     def __init__(self):
@@ -20,9 +22,28 @@ class ScoreBot:
                 found_teams.append(self.teams[i])
         return found_teams
 
+    @staticmethod
+    def _window(query):
+        """Stats window asked for in the query: 'last 10', 'home'/'away'"""
+        match = re.search(r'last (\d+)', query)
+        last = int(match.group(1)) if match and int(match.group(1)) > 0 else None
+        venue = 'home' if re.search(r'\bhome\b', query) else 'away' if re.search(r'\baway\b', query) else 'all'
+        return last, venue
+
+    @staticmethod
+    def _window_label(stats, last, venue):
+        """e.g. '2020-2021', 'last 5 home matches', '2018-2019 to 2020-2021' (from the matches actually used)"""
+        if last is not None:
+            return f"last {stats['matches_played']} {'' if venue == 'all' else venue + ' '}matches"
+        first, final = (season_label(pd.Timestamp(stats[k])) if stats[k] else None
+                        for k in ('first_match', 'last_match'))
+        label = first if first == final else f"{first} to {final}"
+        return label if venue == 'all' else f"{label} {venue}"
+
     def ask(self, query):
         query = query.lower()
-        found_teams = self._find_teams(query)
+        with stage_timer('score_bot', 'find_teams'):
+            found_teams = self._find_teams(query)
 
         # Intent: Prediction / Winner
         if "predict" in query or "win" in query or "winner" in query:
@@ -31,26 +52,9 @@ class ScoreBot:
                 # We need odds, but for the bot we'll use average odds from the simulator
                 home, away = found_teams[0], found_teams[1]
                 
-                # Get average odds for home team at home
-                h_odds = self.league_simulator.avg_odds[home]['home']
-                
-                # Create input for model (reusing logic from api/simulator would be best, but duplicating for speed here)
-                home_code = self.le_team.transform([home])[0]
-                away_code = self.le_team.transform([away])[0]
-                
-                input_data = pd.DataFrame({
-                    'HomeTeam_Code': [home_code],
-                    'AwayTeam_Code': [away_code],
-                    'B365H': [h_odds['win']],
-                    'B365D': [h_odds['draw']],
-                    'B365A': [h_odds['loss']]
-                })
-                
-                probs = self.league_simulator.model.predict_proba(input_data)[0]
-                # Classes: Away, Draw, Home
-                prob_a = probs[0]
-                prob_d = probs[1]
-                prob_h = probs[2]
+                # The simulator already scored every fixture at the home side's average home odds
+                with stage_timer('score_bot', 'fixture_probs'):
+                    prob_h, prob_d, prob_a = self.league_simulator.fixture_probabilities(home, away)
                 
                 winner = "Draw"
                 if prob_h > prob_a and prob_h > prob_d:
@@ -67,9 +71,11 @@ class ScoreBot:
         if "stats" in query or "performance" in query:
             if len(found_teams) > 0:
                 team = found_teams[0]
-                stats = self.stats_engine.get_stats(team)
+                last, venue = self._window(query)
+                with stage_timer('score_bot', 'stats'):
+                    stats = self.stats_engine.get_team_stats(team, last=last, venue=venue)
                 if stats:
-                    return (f"**{team} 2020-2021 Stats:**\n"
+                    return (f"**{team} Stats ({self._window_label(stats, last, venue)}):**\n"
                             f"- Win Rate: {stats['win_rate']*100:.1f}%\n"
                             f"- Goals/Match: {stats['goals_scored_per_match']:.2f}\n"
                             f"- Shots/Match: {stats['shots_per_match']:.2f}\n"
@@ -81,12 +87,16 @@ class ScoreBot:
         if "compare" in query or "better" in query:
             if len(found_teams) == 2:
                 t1, t2 = found_teams[0], found_teams[1]
-                s1 = self.stats_engine.get_stats(t1)
-                s2 = self.stats_engine.get_stats(t2)
-                
+                last, venue = self._window(query)
+                with stage_timer('score_bot', 'stats'):
+                    s1 = self.stats_engine.get_team_stats(t1, last=last, venue=venue)
+                    s2 = self.stats_engine.get_team_stats(t2, last=last, venue=venue)
+                if not s1 or not s2:
+                    return f"I couldn't find stats for {t2 if s1 else t1}."
+
                 better_team = t1 if s1['win_rate'] > s2['win_rate'] else t2
                 
-                return (f"**Comparison: {t1} vs {t2}**\n\n"
+                return (f"**Comparison: {t1} vs {t2} ({self._window_label(s1, last, venue)})**\n\n"
                         f"**{t1}**:\n- Win Rate: {s1['win_rate']*100:.1f}%\n- Goals: {s1['goals_scored_per_match']:.2f}\n\n"
                         f"**{t2}**:\n- Win Rate: {s2['win_rate']*100:.1f}%\n- Goals: {s2['goals_scored_per_match']:.2f}\n\n"
                         f"Historically, **{better_team}** has a better win rate.")
@@ -102,3 +112,4 @@ if __name__ == "__main__":
     bot = ScoreBot()
     print(bot.ask("Predict Arsenal vs Chelsea"))
     print(bot.ask("Stats for Liverpool"))
+    print(bot.ask("Liverpool stats over the last 5 home games"))
@@ -0,0 +1,49 @@
+"""
+Request Deadlines
+The admission middleware gives every request a deadline. Once it passes
+the client is answered with 503, and long-running engine loops call
+check_deadline() between units of work so the abandoned request stops
+using CPU instead of finishing for nobody.
+"""
+
+import contextvars
+import time
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """A point in time on the monotonic clock; at=None means no deadline"""
+    __slots__ = ('at',)
+
+    def __init__(self, seconds=None):
+        self.at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self):
+        if self.at is None:
+            return None
+        return max(self.at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+
+# Copied into tasks and threadpool calls with the rest of the request's context
+_current = contextvars.ContextVar('deadline', default=None)
+
+
+def set_deadline(deadline):
+    return _current.set(deadline)
+
+
+def reset_deadline(token):
+    _current.reset(token)
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request's deadline has passed; no-op outside requests"""
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("Request deadline exceeded")
@@ -1,9 +1,37 @@
 import pandas as pd
 import numpy as np
+from src.metrics import record_cache, stage_timer
 
 class FIFAPlayerEngine:
+    # Numeric attribute columns used for player similarity (crossing ... sliding_tackle)
+    ATTRIBUTE_COLUMNS = [
+        'crossing', 'finishing', 'heading_accuracy', 'short_passing', 'volleys', 'dribbling',
+        'curve', 'freekick_accuracy', 'long_passing', 'ball_control', 'acceleration',
+        'sprint_speed', 'agility', 'reactions', 'balance', 'shot_power', 'jumping', 'stamina',
+        'strength', 'long_shots', 'aggression', 'interceptions', 'positioning', 'vision',
+        'penalties', 'composure', 'marking', 'standing_tackle', 'sliding_tackle'
+    ]
+    # Group-by dimensions for aggregate queries and the columns behind them
+    GROUP_DIMENSIONS = {
+        'nationality': 'nationality_name',
+        'club': 'club_name',
+        'position': 'player_positions',
+        'age_band': 'age',
+        'preferred_foot': 'preferred_foot'
+    }
+    AGGREGATE_METRICS = ['overall', 'potential', 'value_euro', 'wage_euro', 'age',
+                         'release_clause_euro', 'pace', 'shooting', 'passing', 'physic', 'defending']
+    AGE_BANDS = [(0, 20, 'U21'), (21, 24, '21-24'), (25, 28, '25-28'), (29, 32, '29-32'), (33, 200, '33+')]
+
     def __init__(self):
         self.df = None
+        self.attr_columns = []
+        self.attr_matrix = None
+        self.attr_unit = None
+        self.name_index = {}
+        self.group_stats = {}
+        self.display_df = None
+        self._display_columns = {}
 
     def load_fifa_data(self, filepath):
         try:
@@ -63,111 +91,377 @@ class FIFAPlayerEngine:
             # Map club_name from national_team
             if 'club_name' not in self.df.columns and 'national_team' in self.df.columns:
                 self.df['club_name'] = self.df['national_team']
+
+            self._build_display_columns()
+            self._build_similarity_index()
+            self._build_group_stats()
                 
         except Exception as e:
             print(f"Error loading FIFA data: {e}")
             self.df = pd.DataFrame()
 
+    def _build_similarity_index(self):
+        """Standardise the attribute columns into a float32 matrix once, at load time"""
+        self.attr_columns = [c for c in self.ATTRIBUTE_COLUMNS if c in self.df.columns]
+        n = len(self.df)
+        if not self.attr_columns:
+            self.attr_matrix = np.zeros((n, 0), dtype=np.float32)
+            self.attr_unit = self.attr_matrix
+        else:
+            X = self.df[self.attr_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+            # Missing attributes fall back to the column mean so they add no distance
+            col_mean = np.nan_to_num(np.nanmean(X, axis=0))
+            X = np.where(np.isnan(X), col_mean, X)
+            col_std = X.std(axis=0)
+            col_std[col_std == 0] = 1.0
+            self.attr_matrix = ((X - col_mean) / col_std).astype(np.float32)
+            norms = np.linalg.norm(self.attr_matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.attr_unit = self.attr_matrix / norms
+
+        # First row wins for duplicate names, same as get_player_card
+        self.name_index = {}
+        for i, name in enumerate(self.df['short_name'].astype(str).str.lower()):
+            self.name_index.setdefault(name, i)
+
+        self._ages = pd.to_numeric(self.df.get('age', pd.Series(np.nan, index=self.df.index)), errors='coerce').to_numpy()
+        self._values = pd.to_numeric(self.df.get('value_euro', pd.Series(np.nan, index=self.df.index)), errors='coerce').to_numpy()
+        self._positions = self.df.get('player_positions', pd.Series('', index=self.df.index)).fillna('').astype(str)
+        # Masks are cached only for position codes that occur in the data, so client input cannot grow the cache
+        self._position_codes = {p.strip().upper() for positions in self._positions.unique() for p in positions.split(',')}
+        self._position_codes.discard('')
+        self._position_masks = {}
+
+    def _group_keys(self, dimension):
+        """Row positions and group labels for a dimension; positions explode 'CF,RW,ST' into three rows"""
+        column = self.GROUP_DIMENSIONS[dimension]
+        if column not in self.df.columns:
+            return np.array([], dtype=np.int64), np.array([], dtype=object)
+        if dimension == 'position':
+            exploded = self.df[column].fillna('').astype(str).str.split(',').explode().str.strip()
+            exploded = exploded[exploded != '']
+            rows = self.df.index.get_indexer(exploded.index)
+            return rows, exploded.to_numpy(dtype=object)
+        if dimension == 'age_band':
+            ages = pd.to_numeric(self.df[column], errors='coerce').to_numpy()
+            labels = np.full(len(ages), None, dtype=object)
+            for low, high, label in self.AGE_BANDS:
+                labels[(ages >= low) & (ages <= high)] = label
+            rows = np.flatnonzero(labels != None)
+            return rows, labels[rows]
+        keys = self.df[column]
+        rows = np.flatnonzero(keys.notna().to_numpy())
+        return rows, keys.to_numpy(dtype=object)[rows]
+
+    def _build_group_stats(self):
+        """
+        Precompute per-group counts, sums and sorted metric arrays for every
+        dimension. Groups whose rows hash the same as before a reload keep
+        their previous summaries instead of being re-sorted.
+        """
+        previous = self.group_stats
+        self.group_stats = {}
+        metrics = [m for m in self.AGGREGATE_METRICS if m in self.df.columns]
+        values = self.df[metrics].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float) if metrics \
+            else np.zeros((len(self.df), 0))
+        row_hashes = pd.util.hash_pandas_object(self.df[metrics], index=False).to_numpy() if metrics \
+            else np.zeros(len(self.df), dtype=np.uint64)
+
+        for dimension in self.GROUP_DIMENSIONS:
+            rows, keys = self._group_keys(dimension)
+            groups = {}
+            if len(rows):
+                codes, labels = pd.factorize(keys)
+                order = np.argsort(codes, kind='stable')
+                sorted_rows = rows[order]
+                starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+                bounds = np.r_[starts, len(order)]
+                # Order-independent fingerprint of each group's member rows: a wrapping sum with the count (an
+                # XOR would let two identical rows cancel out)
+                fingerprints = np.add.reduceat(row_hashes[sorted_rows], starts)
+                old = previous.get(dimension, {})
+                for g, label in enumerate(labels[codes[order][starts]]):
+                    members = sorted_rows[bounds[g]:bounds[g + 1]]
+                    fingerprint = (int(fingerprints[g]), len(members))
+                    cached = old.get(label)
+                    if cached is not None and cached['fingerprint'] == fingerprint:
+                        record_cache('fifa_group_stats', True)
+                        groups[label] = cached
+                        continue
+                    record_cache('fifa_group_stats', False)
+                    group_metrics = {}
+                    for m, metric in enumerate(metrics):
+                        column = values[members, m]
+                        column = np.sort(column[~np.isnan(column)])
+                        group_metrics[metric] = {'sorted': column, 'sum': float(column.sum())}
+                    groups[label] = {'count': len(members), 'fingerprint': fingerprint, 'metrics': group_metrics}
+            self.group_stats[dimension] = groups
+
+    @staticmethod
+    def _percentile(sorted_values, q):
+        """Linear-interpolated percentile from an already sorted array (same as numpy's default)"""
+        n = len(sorted_values)
+        if n == 0:
+            return None
+        pos = (n - 1) * q / 100.0
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, n - 1)
+        return float(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo))
+
+    def aggregate(self, group_by, metric='overall', stats=('count', 'mean'), sort_by=None,
+                  ascending=False, limit=50, min_count=1):
+        """
+        Group-level summaries from the precomputed tables.
+        stats: any of count, sum, mean, min, max, median and pNN (e.g. p90).
+        """
+        if group_by not in self.GROUP_DIMENSIONS:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        if metric not in self.AGGREGATE_METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if not stats:
+            raise ValueError("stats must name at least one stat")
+        for stat in stats:
+            if stat not in ('count', 'sum', 'mean', 'min', 'max', 'median') and \
+                    not (stat.startswith('p') and stat[1:].replace('.', '', 1).isdigit() and float(stat[1:]) <= 100):
+                raise ValueError(f"Unknown stat: {stat}")
+        sort_by = sort_by or stats[0]
+        if sort_by not in stats:
+            raise ValueError("sort_by must be one of the requested stats")
+
+        rows = []
+        for label, group in self.group_stats.get(group_by, {}).items():
+            if group['count'] < min_count or metric not in group['metrics']:
+                continue
+            summary = group['metrics'][metric]
+            values = summary['sorted']
+            row = {'group': label}
+            for stat in stats:
+                if stat == 'count':
+                    row[stat] = group['count']
+                elif stat == 'sum':
+                    row[stat] = summary['sum']
+                elif stat == 'mean':
+                    row[stat] = summary['sum'] / len(values) if len(values) else None
+                elif stat == 'min':
+                    row[stat] = float(values[0]) if len(values) else None
+                elif stat == 'max':
+                    row[stat] = float(values[-1]) if len(values) else None
+                elif stat == 'median':
+                    row[stat] = self._percentile(values, 50)
+                else:
+                    row[stat] = self._percentile(values, float(stat[1:]))
+            rows.append(row)
+
+        # Groups with no value for the sort stat go last either way
+        present = [r for r in rows if r[sort_by] is not None]
+        missing = [r for r in rows if r[sort_by] is None]
+        present.sort(key=lambda r: r[sort_by], reverse=not ascending)
+        return {
+            'group_by': group_by,
+            'metric': metric,
+            'total_groups': len(rows),
+            'groups': (present + missing)[:limit]
+        }
+
     def get_player_count(self):
         return len(self.df) if self.df is not None else 0
 
-    def search_players(self, query="", team=None, position=None, nationality=None, min_rating=0, max_results=50):
+    def squad_ratings(self):
+        """club_name, player_positions and overall per player for SquadStrength; a new frame only on reload"""
+        return self.df
+
+    def _build_display_columns(self):
+        """
+        Clean the data for output once at load (NaN -> 0 or '', floats -> ints)
+        and keep each column as an array, so responses are built by indexing
+        instead of re-cleaning a DataFrame per request
+        """
+        display = self.df.copy()
+        numeric_cols = display.select_dtypes(include=['float64', 'int64']).columns
+        display[numeric_cols] = display[numeric_cols].fillna(0)
+        string_cols = display.select_dtypes(include=['object', 'str']).columns
+        display[string_cols] = display[string_cols].fillna('')
+        display = display.astype({col: int for col in display.select_dtypes(include=['float64']).columns})
+        self.display_df = display
+        self._display_columns = {col: display[col].to_numpy() for col in display.columns}
+
+    def _records(self, rows, fields=None):
+        """Player dicts for row positions, optionally projected to the requested fields"""
+        columns = [f for f in fields if f in self._display_columns] if fields else list(self._display_columns)
+        values = [self._display_columns[col][rows].tolist() for col in columns]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def _search_mask(self, query="", team=None, position=None, nationality=None, min_rating=0):
+        mask = pd.Series([True] * len(self.df))
+        
+        if query:
+            mask &= self.df['short_name'].str.contains(query, case=False, na=False)
+        if team:
+            # Search in club_name if it exists
+            if 'club_name' in self.df.columns:
+                mask &= self.df['club_name'].str.contains(team, case=False, na=False)
+        if position:
+            if 'player_positions' in self.df.columns:
+                mask &= self.df['player_positions'].str.contains(position, case=False, na=False)
+        if nationality:
+            if 'nationality_name' in self.df.columns:
+                mask &= self.df['nationality_name'].str.contains(nationality, case=False, na=False)
+        if min_rating > 0:
+            if 'overall' in self.df.columns:
+                mask &= (self.df['overall'] >= min_rating)
+        return mask.to_numpy()
+
+    def search_players(self, query="", team=None, position=None, nationality=None, min_rating=0, max_results=50,
+                       fields=None, offset=0):
         if self.df is None or len(self.df) == 0:
             return []
         
         try:
-            mask = pd.Series([True] * len(self.df))
-            
-            if query:
-                mask &= self.df['short_name'].str.contains(query, case=False, na=False)
-            if team:
-                # Search in club_name if it exists
-                if 'club_name' in self.df.columns:
-                    mask &= self.df['club_name'].str.contains(team, case=False, na=False)
-            if position:
-                if 'player_positions' in self.df.columns:
-                    mask &= self.df['player_positions'].str.contains(position, case=False, na=False)
-            if nationality:
-                if 'nationality_name' in self.df.columns:
-                    mask &= self.df['nationality_name'].str.contains(nationality, case=False, na=False)
-            if min_rating > 0:
-                if 'overall' in self.df.columns:
-                    mask &= (self.df['overall'] >= min_rating)
-                
-            results = self.df[mask].head(max_results).copy()
-            
-            # Replace NaN with appropriate defaults
-            numeric_cols = results.select_dtypes(include=['float64', 'int64']).columns
-            results[numeric_cols] = results[numeric_cols].fillna(0)
-            
-            string_cols = results.select_dtypes(include=['object']).columns
-            results[string_cols] = results[string_cols].fillna('')
-            
-            # Convert floats to ints where appropriate
-            for col in results.select_dtypes(include=['float64']).columns:
-                results[col] = results[col].astype(int)
-            
-            return results.to_dict('records')
+            with stage_timer('search_players', 'filter'):
+                mask = self._search_mask(query, team, position, nationality, min_rating)
+                rows = np.flatnonzero(mask)[offset:offset + max_results]
+            with stage_timer('search_players', 'records'):
+                return self._records(rows, fields)
         except Exception as e:
             print(f"Error in search_players: {e}")
             import traceback
             traceback.print_exc()
             return []
 
-    def get_player_card(self, player_name):
+    def iter_players(self, query="", team=None, position=None, nationality=None, min_rating=0, limit=None,
+                     fields=None, chunk_size=1000):
+        """Yield matching players in chunks of records, so exports never hold every dict at once"""
+        if self.df is None or len(self.df) == 0:
+            return
+        rows = np.flatnonzero(self._search_mask(query, team, position, nationality, min_rating))
+        if limit is not None:
+            rows = rows[:limit]
+        for start in range(0, len(rows), chunk_size):
+            yield self._records(rows[start:start + chunk_size], fields)
+
+    def get_player_card(self, player_name, fields=None):
         if self.df is None:
             return None
         
         try:
-            player_df = self.df[self.df['short_name'].str.lower() == player_name.lower()]
-            if player_df.empty:
+            row = self.name_index.get(player_name.lower())
+            if row is None:
                 return None
-            
-            # Get single row and make a copy
-            result_df = player_df.head(1).copy()
-            
-            # Replace NaN with appropriate defaults
-            numeric_cols = result_df.select_dtypes(include=['float64', 'int64']).columns
-            result_df[numeric_cols] = result_df[numeric_cols].fillna(0)
-            
-            string_cols = result_df.select_dtypes(include=['object']).columns  
-            result_df[string_cols] = result_df[string_cols].fillna('')
-            
-            # Convert floats to ints
-            for col in result_df.select_dtypes(include=['float64']).columns:
-                result_df[col] = result_df[col].astype(int)
-            
-            return result_df.iloc[0].to_dict()
+            return self._records([row], fields)[0]
         except Exception as e:
             print(f"Error in get_player_card: {e}")
             import traceback
             traceback.print_exc()
             return None
 
-    def get_top_players(self, limit=100):
+    def _candidate_mask(self, position=None, min_age=None, max_age=None, max_value=None):
+        mask = np.ones(len(self.df), dtype=bool)
+        if position:
+            key = position.upper()
+            position_mask = self._position_masks.get(key)
+            if position_mask is None:
+                position_mask = self._positions.str.contains(position, case=False, regex=False).to_numpy()
+                if key in self._position_codes:
+                    self._position_masks[key] = position_mask
+            mask &= position_mask
+        if min_age is not None:
+            mask &= self._ages >= min_age
+        if max_age is not None:
+            mask &= self._ages <= max_age
+        if max_value is not None:
+            mask &= self._values <= max_value
+        return mask
+
+    def find_similar_players(self, player_names, k=10, metric='cosine', weights=None,
+                             position=None, min_age=None, max_age=None, max_value=None):
+        """
+        k-nearest players by attribute profile for one or many query players.
+        metric: 'cosine' (higher is closer) or 'euclidean' (optionally weighted
+        per attribute, lower is closer). Returns one list of players per query
+        name, in request order (repeated names get their own entry), with None
+        for names that are not in the database.
+        """
+        if self.df is None or len(self.df) == 0 or self.attr_matrix is None:
+            return [None] * len(player_names)
+        if metric not in ('cosine', 'euclidean'):
+            raise ValueError(f"Unknown metric: {metric}")
+        if weights:
+            unknown = sorted(set(weights) - set(self.attr_columns))
+            if unknown:
+                raise ValueError(f"Unknown weight attributes: {', '.join(map(str, unknown))}")
+            invalid = sorted(col for col, weight in weights.items() if not (np.isfinite(weight) and weight >= 0))
+            if invalid:
+                raise ValueError(f"Weights must be finite and non-negative: {', '.join(invalid)}")
+
+        results = [None] * len(player_names)
+        rows = [self.name_index.get(str(name).lower()) for name in player_names]
+        found = [(i, row) for i, row in enumerate(rows) if row is not None]
+        if not found:
+            return results
+        query_rows = np.array([row for _, row in found])
+
+        if metric == 'cosine':
+            scores = self.attr_unit[query_rows] @ self.attr_unit.T
+        else:
+            w = np.ones(len(self.attr_columns), dtype=np.float32)
+            if weights:
+                for i, col in enumerate(self.attr_columns):
+                    w[i] = float(weights.get(col, 1.0))
+            X = self.attr_matrix
+            Q = X[query_rows]
+            # ||x - q||_w^2 = x.w.x - 2 q.w.x + q.w.q, all as matrix products
+            sq_dist = (X * X) @ w - 2.0 * (Q * w) @ X.T + ((Q * Q) @ w)[:, None]
+            scores = -np.sqrt(np.maximum(sq_dist, 0.0))
+
+        mask = self._candidate_mask(position, min_age, max_age, max_value)
+        scores = np.where(mask, scores, -np.inf)
+        # Never return the query player as their own neighbour
+        scores[np.arange(len(query_rows)), query_rows] = -np.inf
+
+        k = max(0, min(k, int(mask.sum())))
+        if k == 0:
+            for i, _ in found:
+                results[i] = []
+            return results
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        columns = [c for c in ['short_name', 'overall', 'player_positions', 'age', 'club_name',
+                               'nationality_name', 'value_euro'] if c in self.df.columns]
+        keep = np.isfinite(top_scores)
+        # One pass for every query's neighbours, then split back per query
+        records = self._records(top[keep], columns)
+        key = 'similarity' if metric == 'cosine' else 'distance'
+        values = top_scores[keep] if metric == 'cosine' else -top_scores[keep]
+        for record, value in zip(records, np.round(values.astype(float), 4).tolist()):
+            record[key] = value
+
+        offsets = np.concatenate(([0], np.cumsum(keep.sum(axis=1))))
+        for q, (i, _) in enumerate(found):
+            results[i] = records[offsets[q]:offsets[q + 1]]
+        return results
+
+    def get_top_players(self, limit=100, team=None, fields=None, offset=0, clubs=None):
+        """Best rated players, optionally of clubs matching `team` (substring) or named exactly in `clubs`"""
         if self.df is None or len(self.df) == 0:
             return []
         
         try:
+            rows = np.arange(len(self.df))
+            if team and 'club_name' in self.df.columns:
+                rows = np.flatnonzero(self.df['club_name'].str.contains(team, case=False, na=False).to_numpy())
+            if clubs is not None:
+                in_clubs = self.df['club_name'].isin(clubs).to_numpy() if 'club_name' in self.df.columns \
+                    else np.zeros(len(self.df), dtype=bool)
+                rows = rows[in_clubs[rows]]
             if 'overall' in self.df.columns:
-                top_df = self.df.sort_values('overall', ascending=False).head(limit).copy()
-            else:
-                top_df = self.df.head(limit).copy()
-            
-            # Replace NaN with appropriate defaults
-            # For numeric columns, replace with 0
-            numeric_cols = top_df.select_dtypes(include=['float64', 'int64']).columns
-            top_df[numeric_cols] = top_df[numeric_cols].fillna(0)
-            
-            # For string columns, replace with empty string
-            string_cols = top_df.select_dtypes(include=['object']).columns
-            top_df[string_cols] = top_df[string_cols].fillna('')
-            
-            # Convert floats to ints where appropriate
-            for col in top_df.select_dtypes(include=['float64']).columns:
-                top_df[col] = top_df[col].astype(int)
-            
-            return top_df.to_dict('records')
+                # Stable sort keeps file order among equal ratings, like sort_values did
+                order = np.argsort(-self._display_columns['overall'][rows], kind='stable')
+                rows = rows[order]
+            return self._records(rows[offset:offset + limit], fields)
         except Exception as e:
             print(f"Error in get_top_players: {e}")
             import traceback
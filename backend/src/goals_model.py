@@ -0,0 +1,297 @@
+"""
+Goals Model
+Dixon-Coles Poisson model of FTHG/FTAG: team attack and defence strengths,
+home advantage and a low-score correction, with scoreline matrices and
+derived over/under, both-teams-to-score and Asian-handicap prices
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln
+
+
+class GoalsModel:
+    """
+    log(home rate) = home + attack[home_team] + defence[away_team]
+    log(away rate) =        attack[away_team] + defence[home_team]
+    P(x, y) = tau(x, y) * Poisson(x; home rate) * Poisson(y; away rate)
+    where tau adjusts 0-0, 1-0, 0-1 and 1-1 by rho (Dixon & Coles, 1997).
+
+    Fitting maximises the (optionally time-decayed) log-likelihood with
+    L-BFGS-B and an analytic gradient, vectorised over all matches, so a
+    season fits in milliseconds and fifty in well under a second.
+    """
+
+    DEFAULT_OU_LINES = [0.5, 1.5, 2.5, 3.5, 4.5]
+    DEFAULT_AH_LINES = [-2.5, -2.0, -1.5, -1.25, -1.0, -0.75, -0.5, -0.25, 0.0,
+                        0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5]
+
+    def __init__(self, data_path="data/match_data.csv", max_goals=10, half_life_days=None):
+        self.data_path = data_path
+        self.max_goals = max_goals
+        # Older matches count less when set: weight = 0.5 ** (days_ago / half_life_days)
+        self.half_life_days = half_life_days
+        self.teams = []
+        self.team_index = {}
+        self.attack = None
+        self.defence = None
+        self.home = 0.0
+        self.rho = 0.0
+        self.fit_info = {}
+
+    def load_data(self, df=None):
+        if df is None:
+            df = pd.read_csv(self.data_path)
+        df = df.assign(
+            Date=pd.to_datetime(df['Date'], dayfirst=True, errors='coerce'),
+            FTHG=pd.to_numeric(df['FTHG'], errors='coerce'),
+            FTAG=pd.to_numeric(df['FTAG'], errors='coerce')
+        )
+        return df.dropna(subset=['HomeTeam', 'AwayTeam', 'FTHG', 'FTAG'])
+
+    @staticmethod
+    def _tau_terms(x, y, lam, mu, rho):
+        """tau and d(log tau)/d(log lam), d(log tau)/d(log mu), d(log tau)/d(rho) per match"""
+        n = len(x)
+        tau = np.ones(n)
+        d_lam = np.zeros(n)
+        d_mu = np.zeros(n)
+        d_rho = np.zeros(n)
+
+        m = (x == 0) & (y == 0)
+        tau[m] = 1 - lam[m] * mu[m] * rho
+        d_lam[m] = d_mu[m] = -lam[m] * mu[m] * rho / tau[m]
+        d_rho[m] = -lam[m] * mu[m] / tau[m]
+
+        m = (x == 0) & (y == 1)
+        tau[m] = 1 + lam[m] * rho
+        d_lam[m] = lam[m] * rho / tau[m]
+        d_rho[m] = lam[m] / tau[m]
+
+        m = (x == 1) & (y == 0)
+        tau[m] = 1 + mu[m] * rho
+        d_mu[m] = mu[m] * rho / tau[m]
+        d_rho[m] = mu[m] / tau[m]
+
+        m = (x == 1) & (y == 1)
+        tau[m] = 1 - rho
+        d_rho[m] = -1 / tau[m]
+        return tau, d_lam, d_mu, d_rho
+
+    def fit(self, df=None):
+        df = self.load_data(df)
+        self.teams = sorted(set(df['HomeTeam']) | set(df['AwayTeam']))
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        n = len(self.teams)
+
+        h = df['HomeTeam'].map(self.team_index).to_numpy()
+        a = df['AwayTeam'].map(self.team_index).to_numpy()
+        x = df['FTHG'].to_numpy(dtype=float)
+        y = df['FTAG'].to_numpy(dtype=float)
+        const = gammaln(x + 1) + gammaln(y + 1)
+
+        if self.half_life_days and df['Date'].notna().any():
+            days_ago = (df['Date'].max() - df['Date']).dt.days.fillna(0).to_numpy()
+            w = 0.5 ** (days_ago / self.half_life_days)
+        else:
+            w = np.ones(len(df))
+
+        # Parameters: attack[0..n-2] (last = -sum, for identifiability), defence[0..n-1], home, rho
+        def unpack(theta):
+            attack = np.append(theta[:n - 1], -theta[:n - 1].sum())
+            return attack, theta[n - 1:2 * n - 1], theta[2 * n - 1], theta[2 * n]
+
+        def objective(theta):
+            attack, defence, home, rho = unpack(theta)
+            log_lam = home + attack[h] + defence[a]
+            log_mu = attack[a] + defence[h]
+            lam, mu = np.exp(log_lam), np.exp(log_mu)
+            tau, t_lam, t_mu, t_rho = self._tau_terms(x, y, lam, mu, rho)
+            tau = np.maximum(tau, 1e-10)
+
+            ll = w * (x * log_lam - lam + y * log_mu - mu - const + np.log(tau))
+            # Gradients with respect to each match's log-rates
+            g_lam = w * (x - lam + t_lam)
+            g_mu = w * (y - mu + t_mu)
+
+            g_attack = np.bincount(h, g_lam, n) + np.bincount(a, g_mu, n)
+            g_defence = np.bincount(a, g_lam, n) + np.bincount(h, g_mu, n)
+            grad = np.concatenate([
+                g_attack[:n - 1] - g_attack[n - 1],
+                g_defence,
+                [g_lam.sum(), (w * t_rho).sum()]
+            ])
+            return -ll.sum(), -grad
+
+        theta0 = np.zeros(2 * n + 1)
+        theta0[2 * n - 1] = 0.25
+        bounds = [(None, None)] * (2 * n) + [(-0.2, 0.2)]
+        result = minimize(objective, theta0, jac=True, method='L-BFGS-B', bounds=bounds)
+
+        self.attack, self.defence, self.home, self.rho = unpack(result.x)
+        self.home, self.rho = float(self.home), float(self.rho)
+        self.fit_info = {
+            'matches': int(len(df)),
+            'teams': n,
+            'log_likelihood': float(-result.fun),
+            'iterations': int(result.nit),
+            'converged': bool(result.success)
+        }
+        return self
+
+    def expected_goals(self, home_teams, away_teams):
+        """Home and away scoring rates per fixture; NaN where a team is unknown"""
+        h = np.array([self.team_index.get(t, -1) for t in home_teams], dtype=int)
+        a = np.array([self.team_index.get(t, -1) for t in away_teams], dtype=int)
+        known = (h >= 0) & (a >= 0)
+        lam = np.full(len(h), np.nan)
+        mu = np.full(len(h), np.nan)
+        lam[known] = np.exp(self.home + self.attack[h[known]] + self.defence[a[known]])
+        mu[known] = np.exp(self.attack[a[known]] + self.defence[h[known]])
+        return lam, mu
+
+    def score_matrix(self, lam, mu):
+        """(n, G+1, G+1) scoreline probabilities, home goals on axis 1, as batched outer products"""
+        goals = np.arange(self.max_goals + 1)
+        log_fact = gammaln(goals + 1)
+        pmf_h = np.exp(goals * np.log(lam)[:, None] - lam[:, None] - log_fact)
+        pmf_a = np.exp(goals * np.log(mu)[:, None] - mu[:, None] - log_fact)
+        matrix = pmf_h[:, :, None] * pmf_a[:, None, :]
+
+        rho = self.rho
+        matrix[:, 0, 0] *= 1 - lam * mu * rho
+        matrix[:, 0, 1] *= 1 + lam * rho
+        matrix[:, 1, 0] *= 1 + mu * rho
+        matrix[:, 1, 1] *= 1 - rho
+        return matrix
+
+    @staticmethod
+    def _fair(p):
+        """Fair decimal odds, None where the probability is zero"""
+        with np.errstate(divide='ignore'):
+            odds = np.round(1 / p, 3)
+        return np.where(p > 0, odds, np.nan)
+
+    @staticmethod
+    def _rows(*arrays):
+        """Column arrays -> per-fixture rows of Python floats, NaN as None"""
+        stacked = np.stack(arrays, axis=-1)
+        rows = np.round(stacked, 6).astype(object)
+        rows[np.isnan(stacked)] = None
+        return rows.tolist()
+
+    def markets(self, matrix, ou_lines=None, ah_lines=None):
+        """1X2, over/under, BTTS and Asian-handicap probabilities and fair odds from (n, G+1, G+1) matrices"""
+        ou_lines = list(self.DEFAULT_OU_LINES if ou_lines is None else ou_lines)
+        ah_lines = list(self.DEFAULT_AH_LINES if ah_lines is None else ah_lines)
+        g = matrix.shape[1]
+        i, j = np.indices((g, g))
+        total = i + j
+        diff = i - j
+
+        home = (matrix * (diff > 0)).sum(axis=(1, 2))
+        draw = (matrix * (diff == 0)).sum(axis=(1, 2))
+        away = (matrix * (diff < 0)).sum(axis=(1, 2))
+        btts = 1 - matrix[:, 0, :].sum(axis=1) - matrix[:, :, 0].sum(axis=1) + matrix[:, 0, 0]
+
+        # Goal-difference distribution, d = -(G)..G, for the handicap settlement
+        d_values = np.arange(-(g - 1), g)
+        d_onehot = (diff[None, :, :] == d_values[:, None, None]).astype(float)
+        diff_dist = np.einsum('nij,dij->nd', matrix, d_onehot)
+        total_dist = np.einsum('nij,tij->nt', matrix, (total[None, :, :] == np.arange(2 * g - 1)[:, None, None]))
+
+        # (n, lines) matrices; every market is a dot product with a settlement mask
+        def settle(dist, values, lines, sign):
+            # Won when sign * (value + line) > 0 and refunded when it is 0 (whole lines); quarter lines split
+            # the stake over the two neighbouring half/whole lines
+            lines = np.array(lines, dtype=float)
+            quarter = (lines * 4) % 2 == 1
+            low = np.where(quarter, lines - 0.25, lines)
+            high = np.where(quarter, lines + 0.25, lines)
+            mask = lambda parts: (sign * (values[:, None] + parts[None, :]) > 0).astype(float)
+            return dist @ ((mask(low) + mask(high)) / 2)
+
+        def fair_pair(win, lose):
+            # Fair price makes the bet zero-EV with pushes refunded; 1 / p when nothing can push
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return (np.where(win > 0, np.round(1 + lose / win, 3), np.nan),
+                        np.where(lose > 0, np.round(1 + win / lose, 3), np.nan))
+
+        # Over wins when total - line > 0, so the total is settled against the negated line
+        totals = np.arange(2 * g - 1)
+        over = settle(total_dist, totals, -np.array(ou_lines, dtype=float), 1)
+        under = settle(total_dist, totals, -np.array(ou_lines, dtype=float), -1)
+        over_odds, under_odds = fair_pair(over, under)
+
+        ah_win = settle(diff_dist, d_values, ah_lines, 1)
+        ah_lose = settle(diff_dist, d_values, ah_lines, -1)
+        ah_home_odds, ah_away_odds = fair_pair(ah_win, ah_lose)
+
+        outcomes = self._rows(home, draw, away)
+        btts_rows = self._rows(btts, 1 - btts, self._fair(btts), self._fair(1 - btts))
+        ou_rows = self._rows(over, under, over_odds, under_odds)
+        ah_rows = self._rows(ah_win, ah_lose, ah_home_odds, ah_away_odds)
+
+        return [
+            {
+                'probabilities': dict(zip('HDA', outcomes[k])),
+                'over_under': [
+                    {'line': line, 'over': o, 'under': u, 'over_odds': oo, 'under_odds': uo}
+                    for line, (o, u, oo, uo) in zip(ou_lines, ou_rows[k])
+                ],
+                'btts': dict(zip(('yes', 'no', 'yes_odds', 'no_odds'), btts_rows[k])),
+                # Home handicap line
+                'asian_handicap': [
+                    {'line': line, 'home_win': w, 'home_lose': l, 'home_odds': ho, 'away_odds': ao}
+                    for line, (w, l, ho, ao) in zip(ah_lines, ah_rows[k])
+                ]
+            }
+            for k in range(len(matrix))
+        ]
+
+    def predict(self, fixtures, include_matrix=True, ou_lines=None, ah_lines=None):
+        """fixtures: [(home_team, away_team), ...] -> one result per fixture, errors for unknown teams"""
+        home_teams = [f[0] for f in fixtures]
+        away_teams = [f[1] for f in fixtures]
+        lam, mu = self.expected_goals(home_teams, away_teams)
+        known = np.flatnonzero(~np.isnan(lam))
+
+        results = [{'home_team': home, 'away_team': away, 'error': 'Unknown team'}
+                   for home, away in zip(home_teams, away_teams)]
+        if len(known) == 0:
+            return results
+
+        matrix = self.score_matrix(lam[known], mu[known])
+        markets = self.markets(matrix, ou_lines, ah_lines)
+        for k, idx in enumerate(known):
+            flat = int(matrix[k].argmax())
+            result = {
+                'home_team': home_teams[idx],
+                'away_team': away_teams[idx],
+                'expected_goals': {'home': float(lam[idx]), 'away': float(mu[idx])},
+                'most_likely_score': {
+                    'home': flat // matrix.shape[2],
+                    'away': flat % matrix.shape[2],
+                    'probability': float(matrix[k].max())
+                },
+                **markets[k]
+            }
+            if include_matrix:
+                result['score_matrix'] = np.round(matrix[k], 6).tolist()
+            results[idx] = result
+        return results
+
+    def team_ratings(self):
+        return sorted(
+            [{'team': team, 'attack': float(self.attack[i]), 'defence': float(self.defence[i])}
+             for i, team in enumerate(self.teams)],
+            key=lambda r: r['attack'] - r['defence'], reverse=True
+        )
+
+
+if __name__ == "__main__":
+    model = GoalsModel().fit()
+    print(model.fit_info, "home:", model.home, "rho:", model.rho)
+    result = model.predict([("Arsenal", "Chelsea")], include_matrix=False)[0]
+    print(result['expected_goals'], result['probabilities'], result['btts'])
@@ -0,0 +1,261 @@
+"""
+Background Jobs
+Long simulations, retraining, backtests and bulk predictions run on a local
+worker pool instead of inside an HTTP request. A job is submitted with a
+kind and parameters and polled by id for status, progress and result.
+
+- Jobs live in an SQLite table next to their results, so queued jobs are
+  picked up again after a restart; a job running at shutdown is requeued
+  (or marked failed if the process died)
+- Parameters are completed with the kind's defaults and hashed; a submit
+  identical to a queued, running or unexpired finished job returns that job
+  instead of running the work again
+- Results are written as JSON files and deleted, with their rows, once
+  older than the TTL
+- Progress is kept in memory while a job runs and written through to the
+  table at most every PROGRESS_FLUSH_SECONDS
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from src.metrics import record_cache
+
+
+PROGRESS_FLUSH_SECONDS = 0.5
+CLEANUP_INTERVAL_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+"""
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed')
+# A failed job is retried by the next identical submit rather than shared
+SHARED_STATUSES = ('queued', 'running', 'succeeded')
+FIELDS = ('id', 'kind', 'params', 'status', 'progress', 'message', 'error', 'created_at', 'started_at',
+          'finished_at', 'expires_at')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobInterrupted(Exception):
+    """Raised from a job's progress callback once the queue is shutting down"""
+
+
+class JobKind:
+    """
+    run(params, progress, output_prefix) does the work and returns a
+    JSON-serialisable result; it calls progress(fraction, message=None) as it
+    goes, and any files it writes start with output_prefix so they expire
+    with the result. defaults lists every accepted parameter;
+    validate(params) raises ValueError for bad values.
+    """
+
+    def __init__(self, run, defaults=None, validate=None):
+        self.run = run
+        self.defaults = defaults or {}
+        self.validate = validate
+
+    def normalise(self, params):
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        params = {**self.defaults, **params}
+        if self.validate:
+            self.validate(params)
+        return params
+
+
+class JobQueue:
+    def __init__(self, kinds, directory="data/jobs", workers=2, ttl=3600, max_pending=100):
+        self.kinds = kinds
+        self.directory = directory
+        self.results_dir = os.path.join(directory, "results")
+        self.ttl = ttl
+        self.max_pending = max_pending
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        # One connection shared by the API threads and the workers, serialised by the lock
+        self._conn = sqlite3.connect(os.path.join(directory, "jobs.db"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # job id -> (progress, message, last flush time) while it runs
+        self._live = {}
+        self._last_cleanup = 0.0
+        self._stopping = False
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = 'failed', error = 'Interrupted by a restart', "
+                               "finished_at = ?, expires_at = ? WHERE status = 'running'",
+                               (time.time(), time.time() + ttl))
+            queued = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at")]
+        for job_id in queued:
+            self.pool.submit(self._execute, job_id)
+        self.cleanup()
+
+    @staticmethod
+    def dedup_key(kind, params):
+        payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def result_path(self, job_id):
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def submit(self, kind, params=None):
+        """(job, deduplicated); ValueError for an unknown kind or bad parameters, QueueFull when too many are waiting"""
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown job kind {kind}; one of {', '.join(self.kinds)}")
+        params = self.kinds[kind].normalise(dict(params or {}))
+        key = self.dedup_key(kind, params)
+        self._maybe_cleanup()
+        now = time.time()
+        with self._lock, self._conn:
+            placeholders = ', '.join('?' * len(SHARED_STATUSES))
+            row = self._conn.execute(
+                f"SELECT id FROM jobs WHERE dedup_key = ? AND status IN ({placeholders}) "
+                f"AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1",
+                (key, *SHARED_STATUSES, now)).fetchone()
+            record_cache('jobs', row is not None)
+            if row is not None:
+                job_id, deduplicated = row[0], True
+            else:
+                pending = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFull(f"{pending} jobs are already waiting")
+                job_id, deduplicated = uuid.uuid4().hex, False
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, params, dedup_key, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                    (job_id, kind, json.dumps(params, default=str), key, now))
+        if not deduplicated:
+            self.pool.submit(self._execute, job_id)
+        return self.get(job_id, include_result=False), deduplicated
+
+    def get(self, job_id, include_result=True):
+        """The job's status, progress and timings, plus its result once it has succeeded; None if unknown or expired"""
+        self._maybe_cleanup()
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(FIELDS, row))
+        job['params'] = json.loads(job['params'])
+        live = self._live.get(job_id)
+        if live is not None and job['status'] == 'running':
+            job['progress'], job['message'] = live[0], live[1]
+        if include_result and job['status'] == 'succeeded':
+            try:
+                with open(self.result_path(job_id), 'rb') as f:
+                    job['result'] = orjson.loads(f.read())
+            except FileNotFoundError:
+                # Removed by cleanup between the two reads
+                return None
+        return job
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _progress_callback(self, job_id):
+        def progress(fraction, message=None):
+            if self._stopping:
+                raise JobInterrupted()
+            fraction = min(max(float(fraction), 0.0), 1.0)
+            now = time.monotonic()
+            _, _, flushed = self._live.get(job_id, (0.0, None, 0.0))
+            if now - flushed >= PROGRESS_FLUSH_SECONDS:
+                self._update(job_id, progress=fraction, message=message)
+                flushed = now
+            self._live[job_id] = (fraction, message, flushed)
+        return progress
+
+    def _execute(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT kind, params FROM jobs WHERE id = ? AND status = 'queued'",
+                                     (job_id,)).fetchone()
+        if row is None:
+            return
+        kind, params = row[0], json.loads(row[1])
+        self._live[job_id] = (0.0, None, 0.0)
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            path = self.result_path(job_id)
+            result = self.kinds[kind].run(params, self._progress_callback(job_id), os.path.splitext(path)[0])
+            # Written under a temporary name so readers never see half a file
+            with open(path + ".tmp", 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY))
+            os.replace(path + ".tmp", path)
+            message = self._live.get(job_id, (0, None, 0))[1]
+            finished = time.time()
+            self._update(job_id, status='succeeded', progress=1.0, message=message, finished_at=finished,
+                         expires_at=finished + self.ttl)
+        except JobInterrupted:
+            # Runs again from the start after the restart
+            self._update(job_id, status='queued', progress=0.0, message=None, started_at=None)
+        except Exception as e:
+            finished = time.time()
+            self._update(job_id, status='failed', error=f"{type(e).__name__}: {e}", finished_at=finished,
+                         expires_at=finished + self.ttl)
+        finally:
+            self._live.pop(job_id, None)
+
+    def _maybe_cleanup(self):
+        if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+            self.cleanup()
+
+    def cleanup(self):
+        """Delete finished jobs past their TTL and their result files; returns how many were removed"""
+        self._last_cleanup = time.monotonic()
+        with self._lock, self._conn:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            # The result and anything else the job wrote
+            for path in glob.glob(os.path.join(self.results_dir, f"{job_id}.*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(expired)
+
+    def counts(self):
+        """Jobs per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in STATUSES} | dict(rows)
+
+    def shutdown(self):
+        """Stop taking work: queued jobs stay queued, running ones stop at their next progress report and are requeued"""
+        self._stopping = True
+        self.pool.shutdown(wait=True, cancel_futures=True)
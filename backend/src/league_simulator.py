@@ -1,33 +1,179 @@
 import pandas as pd
 import numpy as np
+import joblib
+
+from src.deadlines import check_deadline
 
 class LeagueSimulator:
-    def __init__(self):
-        self.teams = []
+    def __init__(self, data_path="data/match_data.csv", model_path="data/xgb_model.joblib",
+                 le_team_path="data/le_team.joblib", le_target_path="data/le_target.joblib",
+                 df=None, artifacts=None):
+        # A loaded frame and (model, le_team, le_target) can be shared instead, e.g. by partitions
+        if artifacts is None:
+            artifacts = (joblib.load(model_path), joblib.load(le_team_path), joblib.load(le_target_path))
+        self.model, self.le_team, le_target = artifacts
+        self.df = pd.read_csv(data_path) if df is None else df
+
+        # The teams in this data; the encoder must know every one of them
+        self.teams = sorted(set(self.df['HomeTeam'].dropna()) | set(self.df['AwayTeam'].dropna()))
+        unknown = set(self.teams) - set(self.le_team.classes_)
+        if unknown:
+            raise ValueError(f"Teams unknown to the model: {', '.join(sorted(unknown))}")
+        self.team_codes = self.le_team.transform(self.teams)
+        self.avg_odds = self._average_odds()
+
+        # Every home/away pairing of a double round-robin season
+        pairs = [(h, a) for h in range(len(self.teams)) for a in range(len(self.teams)) if h != a]
+        self.home_idx = np.array([h for h, _ in pairs])
+        self.away_idx = np.array([a for _, a in pairs])
+        self.fixture_index = {(self.teams[h], self.teams[a]): i for i, (h, a) in enumerate(pairs)}
+
+        # Score all fixtures once; columns reordered to H/D/A
+        classes = list(le_target.classes_)
+        probs = self.model.predict_proba(self._fixture_features())
+        self.fixture_probs = probs[:, [classes.index('H'), classes.index('D'), classes.index('A')]]
+
+    def fixture_probabilities(self, home_team, away_team):
+        """(H, D, A) for one fixture at the home side's average odds, as scored at construction"""
+        return tuple(float(p) for p in self.fixture_probs[self.fixture_index[(home_team, away_team)]])
+
+    def _average_odds(self):
+        # Mean B365 prices per team at home and away, as win/draw/loss from that team's side
+        avg_odds = {}
+        for team in self.teams:
+            home = self.df[self.df['HomeTeam'] == team]
+            away = self.df[self.df['AwayTeam'] == team]
+            avg_odds[team] = {
+                'home': {
+                    'win': float(home['B365H'].mean()),
+                    'draw': float(home['B365D'].mean()),
+                    'loss': float(home['B365A'].mean())
+                },
+                'away': {
+                    'win': float(away['B365A'].mean()),
+                    'draw': float(away['B365D'].mean()),
+                    'loss': float(away['B365H'].mean())
+                }
+            }
+        return avg_odds
+
+    def _fixture_features(self):
+        # Same odds features the chat bot uses: the home side's average home prices
+        home_odds = [self.avg_odds[self.teams[h]]['home'] for h in self.home_idx]
+        return pd.DataFrame({
+            'HomeTeam_Code': self.team_codes[self.home_idx],
+            'AwayTeam_Code': self.team_codes[self.away_idx],
+            'B365H': [o['win'] for o in home_odds],
+            'B365D': [o['draw'] for o in home_odds],
+            'B365A': [o['loss'] for o in home_odds]
+        })
+
+    def _simulate_results(self, n_simulations, rng):
+        """Draw outcomes for every fixture in n seasons at once: (n, fixtures) of 0=H, 1=D, 2=A"""
+        cumulative = np.cumsum(self.fixture_probs, axis=1)
+        u = rng.random((n_simulations, len(self.home_idx)))
+        return (u >= cumulative[:, 0]).astype(np.int8) + (u >= cumulative[:, 1])
+
+    def _season_tables(self, results):
+        """Per-simulation wins, draws, losses and points for each team, each of shape (n, teams)"""
+        n_teams = len(self.teams)
+        home_onehot = np.eye(n_teams)[self.home_idx]
+        away_onehot = np.eye(n_teams)[self.away_idx]
+        home_win = (results == 0).astype(float)
+        draw = (results == 1).astype(float)
+        away_win = (results == 2).astype(float)
+
+        won = home_win @ home_onehot + away_win @ away_onehot
+        drawn = draw @ home_onehot + draw @ away_onehot
+        lost = away_win @ home_onehot + home_win @ away_onehot
+        points = 3 * won + drawn
+        return won, drawn, lost, points
+
+    @staticmethod
+    def _rank(points, rng):
+        """Finishing position (0 = champion) per simulation; level points are split at random"""
+        # Points are whole numbers, so jitter below 1 only reorders teams that are level
+        jitter = rng.random(points.shape) * 0.5
+        order = np.argsort(-(points + jitter), axis=1)
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(points.shape[1])[None, :], axis=1)
+        return positions
+
+    def simulate_season(self, seed=None):
+        # One season sampled from the model's fixture probabilities
+        rng = np.random.default_rng(seed)
+        results = self._simulate_results(1, rng)
+        won, drawn, lost, points = self._season_tables(results)
+        played = 2 * (len(self.teams) - 1)
 
-    def simulate_season(self):
-        # Mock simulation returning a random table
-        teams = ["Manchester City", "Arsenal", "Liverpool", "Aston Villa", "Tottenham", "Chelsea", "Newcastle", "Manchester Utd"]
         table = []
-        for i, team in enumerate(teams):
+        for i, team in enumerate(self.teams):
             table.append({
-                "position": i + 1,
+                "position": 0,
                 "team": team,
-                "played": 38,
-                "won": np.random.randint(20, 30) - i,
-                "drawn": np.random.randint(5, 10),
-                "lost": np.random.randint(0, 10) + i,
-                "points": 0 # Calculate points
+                "played": played,
+                "won": int(won[0, i]),
+                "drawn": int(drawn[0, i]),
+                "lost": int(lost[0, i]),
+                "points": int(points[0, i])
             })
-        
-        for row in table:
-            row['points'] = row['won'] * 3 + row['drawn']
-            
+
         # Sort by points
         table.sort(key=lambda x: x['points'], reverse=True)
-        
+
         # Update positions
         for i, row in enumerate(table):
             row['position'] = i + 1
-            
+
         return table
+
+    def simulate_batches(self, n_simulations=10000, batch_size=1000, seed=None):
+        """
+        Monte Carlo over many seasons, yielding running estimates after each batch:
+        expected points and title / top-4 / relegation probabilities per team.
+        """
+        rng = np.random.default_rng(seed)
+        n_teams = len(self.teams)
+        points_sum = np.zeros(n_teams)
+        position_counts = np.zeros((n_teams, n_teams))
+        done = 0
+
+        while done < n_simulations:
+            check_deadline()
+            size = min(batch_size, n_simulations - done)
+            results = self._simulate_results(size, rng)
+            _, _, _, points = self._season_tables(results)
+            positions = self._rank(points, rng)
+
+            points_sum += points.sum(axis=0)
+            np.add.at(position_counts, (np.tile(np.arange(n_teams), size), positions.ravel()), 1)
+            done += size
+
+            yield {
+                "simulations": done,
+                "total_simulations": n_simulations,
+                "standings": self._summarise(points_sum, position_counts, done)
+            }
+
+    def _summarise(self, points_sum, position_counts, n):
+        standings = []
+        for i, team in enumerate(self.teams):
+            standings.append({
+                "team": team,
+                "expected_points": round(float(points_sum[i] / n), 2),
+                "title_probability": float(position_counts[i, 0] / n),
+                "top4_probability": float(position_counts[i, :4].sum() / n),
+                "relegation_probability": float(position_counts[i, -3:].sum() / n),
+                "average_position": round(float((position_counts[i] * np.arange(1, len(self.teams) + 1)).sum() / n), 2)
+            })
+        standings.sort(key=lambda x: x['expected_points'], reverse=True)
+        for i, row in enumerate(standings):
+            row['position'] = i + 1
+        return standings
+
+    def simulate_many(self, n_simulations=10000, batch_size=1000, seed=None):
+        # Run every batch and return only the final estimate
+        summary = None
+        for summary in self.simulate_batches(n_simulations, batch_size, seed):
+            pass
+        return summary
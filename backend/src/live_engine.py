@@ -0,0 +1,369 @@
+"""
+Live Engine
+In-play match state built from a feed of events (score, minute, SportMonks
+statistics, xG), win probabilities from the goals still to come, and
+WebSocket fan-out of every match's updates to its subscribers.
+
+Events are JSON objects with a fixture_id and a type:
+    {"fixture_id": 1, "type": "kickoff", "home_team": "Arsenal", "away_team": "Chelsea"}
+    {"fixture_id": 1, "type": "minute", "minute": 12}
+    {"fixture_id": 1, "type": "goal", "participant": "home", "minute": 23}
+    {"fixture_id": 1, "type": "xg", "participant": "away", "value": 0.31, "minute": 40}
+    {"fixture_id": 1, "type": "statistic", "participant": "home", "code": "corners", "value": 4}
+    {"fixture_id": 1, "type": "full-time"}
+Any event may carry "minute", and "ts" (feed send time, echoed back as
+event_ts so clients can measure delivery latency).
+"""
+
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+import orjson
+from scipy.special import gammaln
+
+from src.metrics import LIVE_EVENTS, LIVE_MESSAGES
+
+
+MATCH_MINUTES = 90
+# Per-team goals per match in the 2020-21 data; used when the model does not know a team
+DEFAULT_EXPECTED_GOALS = (1.35, 1.35)
+MAX_REMAINING_GOALS = 10
+SIDES = ('home', 'away')
+EVENT_TYPES = ('kickoff', 'minute', 'goal', 'xg', 'statistic', 'full-time')
+# Seconds a finished match stays readable (and its final update deliverable) before the hub drops it
+FINISHED_TTL = 300
+
+_GOALS = np.arange(MAX_REMAINING_GOALS + 1)
+_LOG_FACTORIAL = gammaln(_GOALS + 1)
+
+
+def _poisson_pmf(rate):
+    if rate <= 0:
+        return (_GOALS == 0).astype(float)
+    return np.exp(_GOALS * np.log(rate) - rate - _LOG_FACTORIAL)
+
+
+class MatchState:
+    """One match in play"""
+
+    def __init__(self, fixture_id, home_team, away_team, expected_goals):
+        self.fixture_id = fixture_id
+        self.home_team = home_team
+        self.away_team = away_team
+        # Pre-match (home, away) goals over a full match
+        self.expected_goals = expected_goals
+        self.status = 'LIVE'
+        self.minute = 0
+        self.score = {'home': 0, 'away': 0}
+        self.xg = {'home': 0.0, 'away': 0.0}
+        self.statistics = {'home': {}, 'away': {}}
+        self.events = 0
+        self.event_ts = None
+        self.updated_at = None
+
+    def remaining_rates(self):
+        """
+        Expected goals still to come for each side. The pre-match rate counts
+        as one match of evidence and the xG so far as the minutes played
+        (a Gamma-Poisson update), scaled to the minutes left.
+        """
+        minute = min(self.minute, MATCH_MINUTES)
+        remaining = MATCH_MINUTES - minute
+        return tuple(
+            (prior + self.xg[side]) / (MATCH_MINUTES + minute) * remaining
+            for prior, side in zip(self.expected_goals, SIDES)
+        )
+
+    def win_probabilities(self):
+        lead = self.score['home'] - self.score['away']
+        if self.status == 'FT':
+            return {'H': float(lead > 0), 'D': float(lead == 0), 'A': float(lead < 0)}
+
+        home_rate, away_rate = self.remaining_rates()
+        # Distribution of (home - away) goals from here; index k is a difference of k - MAX_REMAINING_GOALS
+        diff = np.convolve(_poisson_pmf(home_rate), _poisson_pmf(away_rate)[::-1])
+        final = lead + np.arange(-MAX_REMAINING_GOALS, MAX_REMAINING_GOALS + 1)
+        return {
+            'H': float(diff[final > 0].sum()),
+            'D': float(diff[final == 0].sum()),
+            'A': float(diff[final < 0].sum())
+        }
+
+    def snapshot(self):
+        home_rate, away_rate = self.remaining_rates()
+        return {
+            'fixture_id': self.fixture_id,
+            'home_team': self.home_team,
+            'away_team': self.away_team,
+            'status': self.status,
+            'minute': self.minute,
+            'score': dict(self.score),
+            'xg': {side: round(value, 3) for side, value in self.xg.items()},
+            'statistics': {side: dict(stats) for side, stats in self.statistics.items()},
+            'remaining_expected_goals': {'home': round(home_rate, 3), 'away': round(away_rate, 3)},
+            'probabilities': self.win_probabilities(),
+            'events': self.events,
+            'event_ts': self.event_ts,
+            'updated_at': self.updated_at
+        }
+
+
+class LiveEngine:
+    """Applies feed events to per-match state"""
+
+    def __init__(self, goals_model=None):
+        # Pre-match goal expectations come from the Dixon-Coles model when it knows both teams
+        self.goals_model = goals_model
+        self.matches = {}
+
+    def _expected_goals(self, event):
+        if 'expected_goals' in event:
+            return float(event['expected_goals']['home']), float(event['expected_goals']['away'])
+        if self.goals_model is not None:
+            lam, mu = self.goals_model.expected_goals([event['home_team']], [event['away_team']])
+            if not np.isnan(lam[0]):
+                return float(lam[0]), float(mu[0])
+        return DEFAULT_EXPECTED_GOALS
+
+    def validate(self, event, fixtures=None):
+        """
+        ValueError if apply() would reject the event, without changing any
+        state. fixtures: ids that have kicked off (default: the live matches).
+        """
+        fixtures = self.matches if fixtures is None else fixtures
+        if not isinstance(event, dict):
+            raise ValueError("Events must be objects")
+        fixture_id = event.get('fixture_id')
+        kind = event.get('type')
+        if fixture_id is None or kind is None:
+            raise ValueError("Events need a fixture_id and a type")
+        if isinstance(fixture_id, bool) or not isinstance(fixture_id, (int, str)):
+            raise ValueError(f"fixture_id must be an integer or a string, got {type(fixture_id).__name__}")
+        if not isinstance(kind, str):
+            raise ValueError(f"Unknown event type {kind}")
+        if kind not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type {kind}")
+        try:
+            if kind == 'kickoff':
+                if 'home_team' not in event or 'away_team' not in event:
+                    raise ValueError("kickoff events need home_team and away_team")
+                if 'expected_goals' in event:
+                    float(event['expected_goals']['home']), float(event['expected_goals']['away'])
+            elif fixture_id not in fixtures:
+                raise ValueError(f"No kickoff for fixture {fixture_id}")
+            if 'minute' in event:
+                int(event['minute'])
+            if kind in ('goal', 'xg', 'statistic'):
+                if event.get('participant') not in SIDES:
+                    raise ValueError(f"participant must be home or away, got {event.get('participant')}")
+                if kind == 'xg':
+                    float(event['value'])
+                elif kind == 'statistic':
+                    event['code'], event['value']
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed {kind} event: {e!r}") from e
+
+    def apply(self, event):
+        """Update the event's match and return its state; ValueError (and no change) for malformed events"""
+        self.validate(event)
+        fixture_id = event['fixture_id']
+        kind = event['type']
+
+        if kind == 'kickoff':
+            state = MatchState(fixture_id, event['home_team'], event['away_team'], self._expected_goals(event))
+            self.matches[fixture_id] = state
+        else:
+            state = self.matches[fixture_id]
+
+        if 'minute' in event:
+            state.minute = max(state.minute, int(event['minute']))
+
+        if kind in ('goal', 'xg', 'statistic'):
+            side = event['participant']
+            if kind == 'goal':
+                state.score[side] += 1
+            elif kind == 'xg':
+                state.xg[side] += float(event['value'])
+            else:
+                state.statistics[side][event['code']] = event['value']
+        elif kind == 'full-time':
+            state.status = 'FT'
+            state.minute = max(state.minute, MATCH_MINUTES)
+
+        state.events += 1
+        state.event_ts = event.get('ts', state.event_ts)
+        state.updated_at = time.time()
+        LIVE_EVENTS.labels(kind).inc()
+        return state
+
+
+class _Subscriber:
+    """One WebSocket client; holds only the latest undelivered update"""
+    __slots__ = ('fixture_id', 'payload', 'ready')
+
+    def __init__(self, fixture_id):
+        self.fixture_id = fixture_id
+        self.payload = None
+        self.ready = asyncio.Event()
+
+    def offer(self, payload):
+        if self.payload is not None:
+            LIVE_MESSAGES.labels('coalesced').inc()
+        self.payload = payload
+        self.ready.set()
+
+    async def next(self):
+        await self.ready.wait()
+        self.ready.clear()
+        payload, self.payload = self.payload, None
+        return payload
+
+
+class LiveHub:
+    """
+    Event ingestion and WebSocket fan-out on one asyncio loop.
+    - Subscribers are grouped per fixture, so an event only touches its match's clients
+    - Events mark their match dirty; every `interval` seconds each dirty
+      match is encoded once and the same text is handed to all its subscribers
+    - A subscriber keeps only the latest update, so a slow client skips
+      intermediate states instead of building a backlog
+    - Finished matches are dropped finished_ttl seconds after their last
+      event, once the full-time update has gone out
+    All methods must be called from the loop's thread.
+    """
+
+    def __init__(self, engine, interval=0.1, finished_ttl=FINISHED_TTL):
+        self.engine = engine
+        self.interval = interval
+        self.finished_ttl = finished_ttl
+        self.groups = defaultdict(set)
+        self.dirty = set()
+        # fixture_id -> time of its last event, oldest first, for matches at full time
+        self.finished = {}
+
+    def ingest(self, event):
+        state = self.engine.apply(event)
+        self.dirty.add(state.fixture_id)
+        self.finished.pop(state.fixture_id, None)
+        if state.status == 'FT':
+            self.finished[state.fixture_id] = state.updated_at
+        return state
+
+    def ingest_many(self, events):
+        """
+        Apply a batch in order, or none of it: every event is validated first
+        (a kickoff earlier in the batch counts), and a ValueError names the
+        first bad one before any match changes or subscriber is notified.
+        """
+        fixtures = set(self.engine.matches)
+        for i, event in enumerate(events):
+            try:
+                self.engine.validate(event, fixtures)
+            except ValueError as e:
+                raise ValueError(f"Event {i}: {e}; no events were applied") from e
+            if event['type'] == 'kickoff':
+                fixtures.add(event['fixture_id'])
+        return [self.ingest(event) for event in events]
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, set()
+        for fixture_id in dirty:
+            subscribers = self.groups.get(fixture_id)
+            if not subscribers:
+                continue
+            payload = orjson.dumps(self.engine.matches[fixture_id].snapshot()).decode()
+            for subscriber in subscribers:
+                subscriber.offer(payload)
+        self._evict_finished()
+
+    def _evict_finished(self):
+        # Runs after the flush, so the full-time update was already handed to subscribers
+        cutoff = time.time() - self.finished_ttl
+        while self.finished:
+            fixture_id, finished_at = next(iter(self.finished.items()))
+            if finished_at > cutoff:
+                break
+            del self.finished[fixture_id]
+            self.engine.matches.pop(fixture_id, None)
+
+    async def run(self):
+        """Flush loop; run as a background task for the lifetime of the app"""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+    async def consume(self, events):
+        """Ingest every event from an async iterator, e.g. tail_events(path)"""
+        async for event in events:
+            try:
+                self.ingest(event)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping live event {event}: {e}")
+
+    def subscriber_count(self, fixture_id=None):
+        if fixture_id is not None:
+            return len(self.groups.get(fixture_id, ()))
+        return sum(len(group) for group in self.groups.values())
+
+    async def serve(self, websocket, fixture_id):
+        """Push the match's current state, then every update, until the client disconnects"""
+        await websocket.accept()
+        subscriber = _Subscriber(fixture_id)
+        self.groups[fixture_id].add(subscriber)
+        state = self.engine.matches.get(fixture_id)
+        if state is not None:
+            subscriber.offer(orjson.dumps(state.snapshot()).decode())
+
+        async def send():
+            while True:
+                await websocket.send_text(await subscriber.next())
+                LIVE_MESSAGES.labels('sent').inc()
+
+        sender = asyncio.create_task(send())
+        try:
+            # Clients do not send anything; reading is how a disconnect is noticed
+            while (await websocket.receive())['type'] != 'websocket.disconnect':
+                pass
+        finally:
+            # Unsubscribe before awaiting anything; a cancelled task may not get past the next await
+            group = self.groups.get(fixture_id)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del self.groups[fixture_id]
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+
+async def tail_events(path, poll_interval=0.05, from_start=False):
+    """
+    Yield JSON events appended to a file, one per line, like `tail -f`.
+    Waits for the file to appear and starts over if it is truncated.
+    """
+    while not os.path.exists(path):
+        await asyncio.sleep(poll_interval)
+    with open(path, 'r') as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        partial = ''
+        while True:
+            line = f.readline()
+            if not line:
+                if os.path.getsize(path) < f.tell():
+                    f.seek(0)
+                    partial = ''
+                await asyncio.sleep(poll_interval)
+                continue
+            partial += line
+            # A line without its newline is still being written
+            if not partial.endswith('\n'):
+                continue
+            if partial.strip():
+                try:
+                    yield orjson.loads(partial)
+                except orjson.JSONDecodeError as e:
+                    print(f"Skipping malformed live event line: {e}")
+            partial = ''
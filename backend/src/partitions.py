@@ -0,0 +1,238 @@
+"""
+League / Season Partitions
+Match data split into one CSV per division and season, loaded on first use
+and evicted least-recently-used under a memory budget, so one process can
+serve many leagues without holding them all in memory.
+
+Layout (from the backend directory):
+    data/leagues/<Div>/<season>.csv         e.g. data/leagues/E1/2019-2020.csv
+    data/leagues/<Div>/xgb_model.joblib     optional per-league model, with
+    data/leagues/<Div>/le_team.joblib       its team and target encoders;
+    data/leagues/<Div>/le_target.joblib     data/*.joblib are used otherwise
+
+data/match_data.csv is served as the partition named by its own Div/Date
+columns (E0 2020-2021) unless the leagues directory has the same one.
+
+Split football-data CSVs into that layout with:
+    python -m src.partitions data/match_data.csv more_seasons.csv --out data/leagues
+"""
+
+import argparse
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+import pandas as pd
+
+from src.league_simulator import LeagueSimulator
+from src.metrics import record_cache
+from src.sqlite_store import season_label
+from src.stats_engine import StatsEngine
+
+
+MODEL_FILES = ('xgb_model.joblib', 'le_team.joblib', 'le_target.joblib')
+
+
+class Partition:
+    """One league/season: its matches, stats engine and (on first use) league simulator"""
+
+    def __init__(self, league, season, data_path, artifacts, on_resize=None):
+        self.league = league
+        self.season = season
+        self.data_path = data_path
+        # (model, le_team, le_target), shared by every partition of the league
+        self.artifacts = artifacts
+        self.on_resize = on_resize
+
+        self.df = pd.read_csv(data_path)
+        self.stats_engine = StatsEngine(df=self.df)
+        self.teams = sorted(set(self.df['HomeTeam'].dropna()) | set(self.df['AwayTeam'].dropna()))
+        self._frame_bytes = int(self.df.memory_usage(deep=True).sum())
+        self._simulator = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.artifacts[0]
+
+    @property
+    def le_team(self):
+        return self.artifacts[1]
+
+    @property
+    def le_target(self):
+        return self.artifacts[2]
+
+    @property
+    def league_simulator(self):
+        # Scoring every fixture is the expensive part, so only partitions that are simulated pay for it
+        if self._simulator is None:
+            with self._lock:
+                if self._simulator is None:
+                    self._simulator = LeagueSimulator(df=self.df, artifacts=self.artifacts)
+                    if self.on_resize:
+                        self.on_resize(self)
+        return self._simulator
+
+    def memory_bytes(self):
+        total = self._frame_bytes
+        if self._simulator is not None:
+            total += sum(a.nbytes for a in (self._simulator.fixture_probs, self._simulator.home_idx,
+                                            self._simulator.away_idx, self._simulator.team_codes))
+        return total
+
+
+class PartitionCatalog:
+    """
+    Every league/season on disk, with at most budget_mb of them in memory.
+    Lookups are thread-safe; a partition being loaded by one request is
+    waited on, not loaded again, by concurrent requests for it.
+    """
+
+    def __init__(self, root="data/leagues", default_data_path="data/match_data.csv",
+                 artifacts_dir="data", default_artifacts=None, budget_mb=256):
+        self.root = root
+        self.default_data_path = default_data_path
+        self.artifacts_dir = artifacts_dir
+        self.budget_bytes = budget_mb * 2**20
+        self._artifacts = {}
+        if default_artifacts is not None:
+            # Reuse the artifacts the API already loaded
+            self._artifacts[artifacts_dir] = default_artifacts
+        self._loaded = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.discover()
+
+    def discover(self):
+        """(league, season) -> CSV path for everything under root, plus the default file"""
+        paths = {}
+        if self.default_data_path and os.path.exists(self.default_data_path):
+            head = pd.read_csv(self.default_data_path, nrows=1, usecols=['Div', 'Date'])
+            season = season_label(pd.to_datetime(head['Date'].iloc[0], dayfirst=True))
+            self.default_league = str(head['Div'].iloc[0])
+            paths[(self.default_league, season)] = self.default_data_path
+        else:
+            self.default_league = None
+
+        if os.path.isdir(self.root):
+            for league in sorted(os.listdir(self.root)):
+                league_dir = os.path.join(self.root, league)
+                if not os.path.isdir(league_dir):
+                    continue
+                for name in sorted(os.listdir(league_dir)):
+                    if name.endswith('.csv'):
+                        paths[(league, name[:-4])] = os.path.join(league_dir, name)
+                if self.default_league is None:
+                    self.default_league = league
+
+        self.paths = paths
+        return paths
+
+    def resolve(self, league=None, season=None):
+        """Fill in the default league and that league's latest season; KeyError if there is no such data"""
+        league = league or self.default_league
+        if season is None:
+            seasons = [s for (l, s) in self.paths if l == league]
+            if not seasons:
+                raise KeyError(f"No data for league {league}")
+            season = max(seasons)
+        if (league, season) not in self.paths:
+            raise KeyError(f"No data for league {league} season {season}")
+        return league, season
+
+    def artifacts_for(self, league):
+        """Per-league model and encoders when the league directory has them, else the top-level ones"""
+        league_dir = os.path.join(self.root, league)
+        directory = league_dir if all(os.path.exists(os.path.join(league_dir, f)) for f in MODEL_FILES) \
+            else self.artifacts_dir
+        if directory not in self._artifacts:
+            self._artifacts[directory] = tuple(joblib.load(os.path.join(directory, f)) for f in MODEL_FILES)
+        return self._artifacts[directory]
+
+    def get(self, league=None, season=None):
+        key = self.resolve(league, season)
+        with self._lock:
+            partition = self._loaded.get(key)
+            if partition is not None:
+                self._loaded.move_to_end(key)
+            else:
+                loading = self._loading.setdefault(key, threading.Lock())
+        record_cache('partition', partition is not None)
+        if partition is not None:
+            return partition
+
+        with loading:
+            with self._lock:
+                partition = self._loaded.get(key)
+            if partition is None:
+                try:
+                    partition = Partition(key[0], key[1], self.paths[key], self.artifacts_for(key[0]),
+                                          on_resize=self._resized)
+                    with self._lock:
+                        self._loaded[key] = partition
+                        self._evict(keep=key)
+                finally:
+                    # Also on a failed load, so the next caller retries instead of waiting on a stale lock
+                    with self._lock:
+                        self._loading.pop(key, None)
+        return partition
+
+    def _resized(self, partition):
+        with self._lock:
+            self._evict(keep=(partition.league, partition.season))
+
+    def _evict(self, keep):
+        # Caller holds the lock; the partition just used always stays, even if it alone is over budget
+        total = sum(p.memory_bytes() for p in self._loaded.values())
+        while total > self.budget_bytes and len(self._loaded) > 1:
+            key = next(k for k in self._loaded if k != keep)
+            total -= self._loaded.pop(key).memory_bytes()
+            self.evictions += 1
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(p.memory_bytes() for p in self._loaded.values())
+
+    def list_partitions(self):
+        with self._lock:
+            loaded = dict(self._loaded)
+        return [
+            {
+                "league": league,
+                "season": season,
+                "loaded": (league, season) in loaded,
+                "memory_mb": round(loaded[(league, season)].memory_bytes() / 2**20, 3)
+                if (league, season) in loaded else None
+            }
+            for league, season in sorted(self.paths)
+        ]
+
+
+def split_matches(paths, out_dir="data/leagues"):
+    """Write football-data CSVs (any mix of divisions and seasons) as <out_dir>/<Div>/<season>.csv"""
+    df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    dates = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+    df = df[dates.notna()]
+    seasons = dates[dates.notna()].map(season_label)
+
+    written = []
+    for (league, season), group in df.groupby([df['Div'], seasons], sort=True):
+        league_dir = os.path.join(out_dir, str(league))
+        os.makedirs(league_dir, exist_ok=True)
+        path = os.path.join(league_dir, f"{season}.csv")
+        group.to_csv(path, index=False)
+        written.append((league, season, len(group), path))
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split match CSVs into per-league, per-season files")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--out", default="data/leagues")
+    args = parser.parse_args()
+
+    for league, season, rows, path in split_matches(args.paths, args.out):
+        print(f"{league} {season}: {rows} matches -> {path}")
@@ -0,0 +1,203 @@
+"""
+Fixture Probability Grid
+Model probabilities for every (home, away) pair over a grid of B365 odds,
+scored in one batch per model load, so /predict is a table lookup.
+
+The model is a tree ensemble, so for a fixed pair its output only changes
+where the odds cross one of its split thresholds. The buckets of each odds
+axis are therefore bounded by the model's own thresholds on that feature,
+keeping the ones with the most total gain. Each bucket is scored at its
+midpoint, and a lookup returns the bucket the odds fall in. Thresholds left
+out are the only source of error, which `accuracy` measures against the
+exact model on the historical odds. Odds outside the range the grid covers
+(the historical min/max per column) get None, and the caller falls back to
+the exact model.
+
+A refresh builds the new table on the side and swaps it in whole, so
+lookups keep using the previous table until the new one is ready.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import record_cache, stage_timer
+
+
+ODDS_COLUMNS = ('B365H', 'B365D', 'B365A')
+# Buckets per odds axis (H, D, A); the draw price moves least, so it gets fewer
+DEFAULT_RESOLUTION = (24, 12, 24)
+# Relative odds noise of the second accuracy sample: historical prices moved a little, as a live market would
+JITTER = 0.05
+
+
+def bucket_edges(booster, feature, n_buckets, low, high):
+    """The n_buckets - 1 split thresholds on a feature inside (low, high] with the most total gain, sorted"""
+    trees = booster.trees_to_dataframe()
+    splits = trees[(trees['Feature'] == feature) & (trees['Split'] > low) & (trees['Split'] <= high)]
+    gain = splits.groupby('Split')['Gain'].sum().sort_values(ascending=False, kind='stable')
+    return np.sort(gain.index[:n_buckets - 1].to_numpy(dtype=np.float32))
+
+
+class GridTable:
+    """One built grid: bucket edges per odds axis and probabilities [home, away, H, D, A, class]"""
+
+    def __init__(self, edges, bounds, probs, build_seconds):
+        self.edges = edges
+        # Python floats for bisect; the values are the float32 thresholds the model compares against
+        self._edge_lists = [e.astype(np.float64).tolist() for e in edges]
+        self.bounds = bounds
+        self.probs = probs
+        self.build_seconds = build_seconds
+        self.accuracy = {}
+
+    def buckets(self, odds):
+        """Bucket index per odds axis, or None when any price is outside the grid"""
+        index = []
+        for value, edges, (low, high) in zip(odds, self._edge_lists, self.bounds):
+            # Rounded to float32 first, as the model sees it
+            value = float(np.float32(value))
+            if not low <= value <= high:
+                return None
+            index.append(bisect_right(edges, value))
+        return index
+
+    def lookup_many(self, home_codes, away_codes, odds):
+        """Vectorized lookups: (n, classes) with NaN rows outside the grid"""
+        odds = np.asarray(odds, dtype=np.float32)
+        inside = np.ones(len(odds), dtype=bool)
+        index = []
+        for axis, (edges, (low, high)) in enumerate(zip(self.edges, self.bounds)):
+            inside &= (odds[:, axis] >= low) & (odds[:, axis] <= high)
+            index.append(np.searchsorted(edges, odds[:, axis], side='right'))
+        out = np.full((len(odds), self.probs.shape[-1]), np.nan)
+        out[inside] = self.probs[np.asarray(home_codes)[inside], np.asarray(away_codes)[inside],
+                                 index[0][inside], index[1][inside], index[2][inside]]
+        return out
+
+    def memory_bytes(self):
+        return int(self.probs.nbytes + sum(e.nbytes for e in self.edges))
+
+
+class FixtureProbabilityGrid:
+    def __init__(self, model, le_team, data_path="data/match_data.csv", resolution=DEFAULT_RESOLUTION):
+        self.model = model
+        self.n_teams = len(le_team.classes_)
+        self.le_team = le_team
+        self.data_path = data_path
+        self.resolution = tuple(int(n) for n in resolution)
+        self.table = None
+        self.refreshing = False
+        self._lock = threading.Lock()
+
+    def _history(self):
+        """Encoded historical fixtures known to the model, with their B365 odds"""
+        df = pd.read_csv(self.data_path)
+        odds = df[list(ODDS_COLUMNS)].apply(pd.to_numeric, errors='coerce')
+        known = df['HomeTeam'].isin(self.le_team.classes_) & df['AwayTeam'].isin(self.le_team.classes_) \
+            & odds.notna().all(axis=1)
+        return (self.le_team.transform(df.loc[known, 'HomeTeam']), self.le_team.transform(df.loc[known, 'AwayTeam']),
+                odds[known].to_numpy(dtype=np.float32))
+
+    def _exact(self, home_codes, away_codes, odds):
+        features = np.column_stack([home_codes, away_codes, odds]).astype(np.float32)
+        return self.model.get_booster().inplace_predict(features).reshape(len(features), -1)
+
+    def build(self):
+        """Score every pair at every bucket midpoint; returns the new GridTable (not yet swapped in)"""
+        start = time.perf_counter()
+        booster = self.model.get_booster()
+        home_codes, away_codes, odds = self._history()
+        bounds = [(float(odds[:, i].min()), float(odds[:, i].max())) for i in range(len(ODDS_COLUMNS))]
+
+        edges, midpoints = [], []
+        for feature, n_buckets, (low, high) in zip(ODDS_COLUMNS, self.resolution, bounds):
+            axis_edges = bucket_edges(booster, feature, n_buckets, low, high)
+            limits = np.r_[low, axis_edges, high]
+            edges.append(axis_edges)
+            midpoints.append(((limits[:-1] + limits[1:]) / 2).astype(np.float32))
+
+        grid = np.stack(np.meshgrid(*midpoints, indexing='ij'), axis=-1).reshape(-1, len(ODDS_COLUMNS))
+        shape = tuple(len(m) for m in midpoints)
+        away = np.repeat(np.arange(self.n_teams), len(grid))
+        probs = None
+        with stage_timer('probability_grid', 'score'):
+            # One batch per home team keeps the feature matrix small
+            for home in range(self.n_teams):
+                features = np.column_stack([np.full(len(away), home), away, np.tile(grid, (self.n_teams, 1))])
+                scored = booster.inplace_predict(features.astype(np.float32)).reshape(self.n_teams, *shape, -1)
+                if probs is None:
+                    probs = np.empty((self.n_teams, self.n_teams, *shape, scored.shape[-1]), dtype=np.float32)
+                probs[home] = scored
+
+        table = GridTable(edges, bounds, probs, time.perf_counter() - start)
+        with stage_timer('probability_grid', 'accuracy'):
+            table.accuracy = self._accuracy(table, home_codes, away_codes, odds)
+        return table
+
+    def _accuracy(self, table, home_codes, away_codes, odds):
+        """Grid against exact probabilities on the historical odds, and on the same odds moved by JITTER"""
+        rng = np.random.default_rng(0)
+        jittered = odds * np.exp(rng.normal(0, JITTER, odds.shape)).astype(np.float32)
+        report = {}
+        for name, sample in (('historical', odds), ('jittered', jittered)):
+            grid = table.lookup_many(home_codes, away_codes, sample)
+            inside = ~np.isnan(grid[:, 0])
+            exact = self._exact(home_codes[inside], away_codes[inside], sample[inside])
+            error = np.abs(grid[inside] - exact)
+            report[name] = {
+                'fixtures': int(len(sample)),
+                'in_grid': float(inside.mean()) if len(sample) else 0.0,
+                'mean_abs_error': float(error.mean()) if error.size else None,
+                'p99_abs_error': float(np.percentile(error, 99)) if error.size else None,
+                'max_abs_error': float(error.max()) if error.size else None,
+                'same_favourite': float((grid[inside].argmax(axis=1) == exact.argmax(axis=1)).mean())
+                if error.size else None,
+            }
+        return report
+
+    def refresh(self):
+        """Build a new table and swap it in; lookups use the old one (or the exact model) meanwhile"""
+        with self._lock:
+            self.refreshing = True
+            try:
+                self.table = self.build()
+            finally:
+                self.refreshing = False
+
+    def start_refresh(self):
+        """refresh() on a background thread"""
+        thread = threading.Thread(target=self.refresh, name="probability-grid", daemon=True)
+        thread.start()
+        return thread
+
+    def lookup(self, home_code, away_code, odds):
+        """Probabilities in the model's class order, or None when the grid is not built or the odds are outside it"""
+        table = self.table
+        if table is None:
+            record_cache('probability_grid', False)
+            return None
+        index = table.buckets(odds)
+        if index is None:
+            record_cache('probability_grid', False)
+            return None
+        record_cache('probability_grid', True)
+        return table.probs[home_code, away_code, index[0], index[1], index[2]]
+
+    def describe(self):
+        """Resolution, coverage, memory, build time and measured accuracy of the current table"""
+        table = self.table
+        info = {'ready': table is not None, 'refreshing': self.refreshing, 'resolution': list(self.resolution)}
+        if table is not None:
+            info.update({
+                'buckets': [len(e) + 1 for e in table.edges],
+                'bounds': {column: [round(b, 4) for b in bounds] for column, bounds in zip(ODDS_COLUMNS, table.bounds)},
+                'cells': int(table.probs[..., 0].size),
+                'memory_mb': round(table.memory_bytes() / 2**20, 2),
+                'build_seconds': round(table.build_seconds, 2),
+                'accuracy': table.accuracy,
+            })
+        return info
@@ -1,27 +1,299 @@
-import json
-import pandas as pd
+"""
+Real Player Engine
+SportMonks player payloads for whole leagues, indexed at load time:
+- team posting lists (team id -> player ids, split by position) built from
+  each player's nested `teams` entries, with team names and short codes
+  resolved to ids
+- a name index (full and common name) for player cards
+- each player's `statistics` rolled up into one row per season of a
+  float32 array (STAT_FIELDS columns, NaN where the feed has no value),
+  so cards never walk the nested detail lists
+
+Load one file with load_api_data or a directory of them with load_directory;
+a file may hold one player, a list of players, or a SportMonks response
+with either under "data".
+"""
+
+import os
+
+import numpy as np
+import orjson
+
+
+# (SportMonks type code, key inside its value); the rest of the value is ignored
+STAT_FIELDS = (
+    ('appearances', 'total'),
+    ('minutes-played', 'total'),
+    ('goals', 'total'),
+    ('assists', 'total'),
+    ('shots-total', 'total'),
+    ('shots-on-target', 'total'),
+    ('passes', 'total'),
+    ('key-passes', 'total'),
+    ('tackles', 'total'),
+    ('interceptions', 'total'),
+    ('saves', 'total'),
+    ('cleansheets', 'total'),
+    ('yellowcards', 'total'),
+    ('redcards', 'total'),
+    ('rating', 'average'),
+)
+STAT_NAMES = tuple(code.replace('-', '_') for code, _ in STAT_FIELDS)
+_FIELD_INDEX = {code: i for i, (code, _) in enumerate(STAT_FIELDS)}
+_MINUTES = _FIELD_INDEX['minutes-played']
+# Averages are combined weighted by minutes (appearances when minutes are missing), not summed
+_AVERAGE_FIELDS = np.array([key == 'average' for _, key in STAT_FIELDS])
+
+# SportMonks position ids
+POSITIONS = {24: 'Goalkeeper', 25: 'Defender', 26: 'Midfielder', 27: 'Attacker'}
+_POSITION_IDS = {name.lower(): position_id for position_id, name in POSITIONS.items()}
+
+# Raw fields kept on each player; statistics live in the season arrays instead
+PROFILE_FIELDS = ('id', 'name', 'common_name', 'display_name', 'position_id', 'detailed_position_id',
+                  'date_of_birth', 'nationality_id', 'height', 'weight', 'image_path')
+
+
+class PlayerRecord:
+    """One player's profile, clubs and per-season stat rows"""
+    __slots__ = ('profile', 'teams', 'trophies', 'season_ids', 'season_teams', 'stats')
+
+    def __init__(self, profile, teams, trophies, season_ids, season_teams, stats):
+        self.profile = profile
+        # team id -> jersey number
+        self.teams = teams
+        self.trophies = trophies
+        # int32 [seasons], int32 [seasons] (-1 if unknown), float32 [seasons, len(STAT_FIELDS)]
+        self.season_ids = season_ids
+        self.season_teams = season_teams
+        self.stats = stats
+
+
+def _detail_value(value, key):
+    if isinstance(value, dict):
+        value = value.get(key)
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def _combine(rows):
+    """Several stat rows as one: totals summed, averages weighted by minutes (else appearances)"""
+    present = ~np.isnan(rows)
+    values = np.where(present, rows, 0)
+    weights = values[:, _MINUTES]
+    if weights.sum() <= 0:
+        weights = values[:, _FIELD_INDEX['appearances']]
+    if weights.sum() <= 0:
+        weights = np.ones(len(rows))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = (values * weights[:, None]).sum(axis=0) / (present * weights[:, None]).sum(axis=0)
+    merged = np.where(_AVERAGE_FIELDS, averages, values.sum(axis=0))
+    return np.where(present.any(axis=0), merged, np.nan)
+
+
+def roll_up_statistics(statistics):
+    """
+    SportMonks statistics entries -> (season_ids, team_ids, stats), one row per season
+    sorted by season id. A season split between clubs is merged: totals are
+    summed, averages weighted by minutes, and the team is the one with most minutes.
+    """
+    rows = {}
+    for entry in statistics or ():
+        season_id = entry.get('season_id')
+        if season_id is None:
+            continue
+        values = np.full(len(STAT_FIELDS), np.nan, dtype=np.float64)
+        for detail in entry.get('details') or ():
+            code = (detail.get('type') or {}).get('code')
+            index = _FIELD_INDEX.get(code)
+            if index is not None:
+                values[index] = _detail_value(detail.get('value'), STAT_FIELDS[index][1])
+        rows.setdefault(season_id, []).append((entry.get('team_id'), values))
+
+    season_ids = np.array(sorted(rows), dtype=np.int32)
+    team_ids = np.full(len(season_ids), -1, dtype=np.int32)
+    stats = np.full((len(season_ids), len(STAT_FIELDS)), np.nan, dtype=np.float32)
+    for i, season_id in enumerate(season_ids):
+        entries = rows[int(season_id)]
+        values = np.array([v for _, v in entries])
+        team_id = entries[int(np.argmax(np.nan_to_num(values[:, _MINUTES])))][0]
+        team_ids[i] = -1 if team_id is None else team_id
+        stats[i] = values[0] if len(entries) == 1 else _combine(values)
+    return season_ids, team_ids, stats
+
+
+def _stat_dict(row):
+    return {
+        name: None if np.isnan(value) else round(float(value), 2) if average else int(round(float(value)))
+        for name, value, average in zip(STAT_NAMES, row, _AVERAGE_FIELDS)
+    }
+
 
 class RealPlayerEngine:
     def __init__(self):
+        # player id -> PlayerRecord
         self.players = {}
+        # lower-cased full/common name -> player ids
+        self.name_index = {}
+        # team id -> player ids, and team id -> position id -> player ids
+        self.team_players = {}
+        self.team_positions = {}
+        # team id -> {id, name, short_code}, and lower-cased name / short code / id -> team id
+        self.teams = {}
+        self.team_lookup = {}
 
     def load_api_data(self, filepath):
+        """Index every player in one JSON file; returns how many were loaded"""
         try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                # Assuming data structure, adjust as needed
-                if isinstance(data, list):
-                    for p in data:
-                        self.players[p.get('name')] = p
-                elif isinstance(data, dict):
-                     self.players[data.get('name', 'Unknown')] = data
+            with open(filepath, 'rb') as f:
+                data = orjson.loads(f.read())
         except Exception as e:
             print(f"Error loading real player data: {e}")
+            return 0
+        if isinstance(data, dict) and 'data' in data:
+            data = data['data']
+        players = data if isinstance(data, list) else [data]
+        loaded = 0
+        for p in players:
+            if isinstance(p, dict) and p.get('id') is not None:
+                self.add_player(p)
+                loaded += 1
+        return loaded
+
+    def load_directory(self, directory):
+        """Index every *.json file in a directory; returns how many players were loaded"""
+        loaded = 0
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json'):
+                loaded += self.load_api_data(os.path.join(directory, name))
+        return loaded
+
+    def add_player(self, p):
+        player_id = p['id']
+        if player_id in self.players:
+            # A newer payload for the same player replaces the old one
+            self._remove(player_id)
+
+        teams = {}
+        for membership in p.get('teams') or ():
+            team = membership.get('team') or {}
+            team_id = membership.get('team_id', team.get('id'))
+            if team_id is None:
+                continue
+            teams[team_id] = membership.get('jersey_number')
+            self._register_team(team_id, team)
+
+        season_ids, season_teams, stats = roll_up_statistics(p.get('statistics'))
+        profile = {field: p[field] for field in PROFILE_FIELDS if field in p}
+        trophies = p.get('trophies') or []
+        self.players[player_id] = PlayerRecord(profile, teams, trophies, season_ids, season_teams, stats)
+
+        for name in self._names(profile):
+            self.name_index.setdefault(name, []).append(player_id)
+        position_id = p.get('position_id')
+        for team_id in teams:
+            self.team_players.setdefault(team_id, []).append(player_id)
+            self.team_positions.setdefault(team_id, {}).setdefault(position_id, []).append(player_id)
+
+    @staticmethod
+    def _names(profile):
+        return {name.lower() for name in (profile.get('name'), profile.get('common_name'),
+                                          profile.get('display_name')) if name}
 
-    def get_team_players(self, team_name):
-        # Filter players by team if available in data
-        return [p for p in self.players.values() if p.get('team') == team_name]
+    def _register_team(self, team_id, team):
+        known = self.teams.setdefault(team_id, {'id': team_id, 'name': None, 'short_code': None})
+        for field in ('name', 'short_code'):
+            if team.get(field):
+                known[field] = team[field]
+                self.team_lookup[team[field].lower()] = team_id
+        self.team_lookup[str(team_id)] = team_id
+
+    def _remove(self, player_id):
+        record = self.players.pop(player_id)
+        for name in self._names(record.profile):
+            self.name_index[name].remove(player_id)
+        for team_id in record.teams:
+            self.team_players[team_id].remove(player_id)
+            self.team_positions[team_id][record.profile.get('position_id')].remove(player_id)
+
+    def resolve_team(self, team):
+        """Team id from a name, short code or id (as int or string); None if unknown"""
+        if isinstance(team, int):
+            return team if team in self.teams else None
+        return self.team_lookup.get(str(team).strip().lower())
+
+    @staticmethod
+    def position_id(position):
+        """SportMonks position id from an id or a name; ValueError if it is neither"""
+        if isinstance(position, str) and not position.isdigit():
+            if position.lower() not in _POSITION_IDS:
+                raise ValueError(f"Unknown position {position}")
+            return _POSITION_IDS[position.lower()]
+        return int(position)
+
+    def get_team_players(self, team_name, position=None):
+        """Summaries of the team's players, optionally only one position (id or name, e.g. 'Attacker')"""
+        team_id = self.resolve_team(team_name)
+        if team_id is None:
+            return []
+        if position is None:
+            ids = self.team_players.get(team_id, [])
+        else:
+            position_id = self.position_id(position)
+            ids = self.team_positions.get(team_id, {}).get(position_id, [])
+        return [self._summary(self.players[player_id], team_id) for player_id in ids]
 
     def get_player_card(self, team_name, player_name):
-        # Simple lookup
-        return self.players.get(player_name)
+        """
+        Profile, clubs and per-season stats. When a team is given the player
+        must have played for it (None otherwise); that also settles a name
+        shared by several players.
+        """
+        ids = self.name_index.get(str(player_name).strip().lower())
+        if not ids:
+            return None
+        if not team_name:
+            return self._card(self.players[ids[0]])
+        team_id = self.resolve_team(team_name)
+        player_id = next((i for i in ids if team_id is not None and team_id in self.players[i].teams), None)
+        return None if player_id is None else self._card(self.players[player_id])
+
+    def _summary(self, record, team_id):
+        profile = record.profile
+        summary = {
+            'id': profile['id'],
+            'name': profile.get('name'),
+            'common_name': profile.get('common_name'),
+            'position_id': profile.get('position_id'),
+            'position': POSITIONS.get(profile.get('position_id')),
+            'jersey_number': record.teams.get(team_id),
+            'date_of_birth': profile.get('date_of_birth'),
+            'image_path': profile.get('image_path'),
+            'team': self.teams[team_id]['name'],
+        }
+        if len(record.season_ids):
+            summary['latest_season'] = {'season_id': int(record.season_ids[-1]), **_stat_dict(record.stats[-1])}
+        return summary
+
+    def _card(self, record):
+        card = dict(record.profile)
+        card['position'] = POSITIONS.get(record.profile.get('position_id'))
+        card['teams'] = [
+            {'team_id': team_id, 'jersey_number': jersey, 'team': self.teams[team_id]}
+            for team_id, jersey in record.teams.items()
+        ]
+        card['season_stats'] = [
+            {'season_id': int(season_id), 'team_id': None if team_id < 0 else int(team_id), **_stat_dict(row)}
+            for season_id, team_id, row in zip(record.season_ids, record.season_teams, record.stats)
+        ]
+        card['career'] = _stat_dict(self.career_totals(record))
+        card['trophies'] = record.trophies
+        return card
+
+    @staticmethod
+    def career_totals(record):
+        """All season rows combined the same way a split season is"""
+        if not len(record.stats):
+            return np.full(len(STAT_FIELDS), np.nan, dtype=np.float32)
+        return _combine(record.stats.astype(np.float64)).astype(np.float32)
+
+    def get_player_count(self):
+        return len(self.players)
@@ -0,0 +1,439 @@
+"""
+SQL-backed engines
+Drop-in versions of StatsEngine, FIFAPlayerEngine and TeamStatsEngine that
+answer from an SQLiteStore, pushing filtering and aggregation into indexed
+queries instead of holding every row in pandas
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.fifa_player_engine import FIFAPlayerEngine
+from src.metrics import stage_timer
+from src.sqlite_store import quote
+from src.stats_engine import check_window
+from src.team_stats_engine import TeamStatsEngine
+
+
+class SQLStatsEngine:
+    """StatsEngine over the matches table; one aggregate query per team, windowed on the (team, date) indexes"""
+
+    HOME_MATCHES_SQL = """
+        SELECT date, ftr = 'H' AS win, ftr = 'D' AS draw, "FTHG" AS gf, "FTAG" AS ga, "HS" AS shots,
+               "HST" AS sot, "HC" AS corners, "HY" AS yellows, "HR" AS reds
+        FROM matches WHERE home_team = :team AND date BETWEEN :start AND :end
+    """
+    AWAY_MATCHES_SQL = """
+        SELECT date, ftr = 'A' AS win, ftr = 'D' AS draw, "FTAG" AS gf, "FTHG" AS ga, "AS" AS shots,
+               "AST" AS sot, "AC" AS corners, "AY" AS yellows, "AR" AS reds
+        FROM matches WHERE away_team = :team AND date BETWEEN :start AND :end
+    """
+    # LIMIT -1 is no limit; the latest `last` matches are taken after the date filter
+    TEAM_STATS_SQL = """
+        SELECT COUNT(*), TOTAL(win), TOTAL(draw), TOTAL(gf), TOTAL(ga), TOTAL(shots), TOTAL(sot),
+               TOTAL(corners), TOTAL(yellows), TOTAL(reds), MIN(date), MAX(date)
+        FROM (SELECT * FROM ({matches}) ORDER BY date DESC LIMIT :last)
+    """
+    TEAM_STATS_QUERIES = {
+        'all': TEAM_STATS_SQL.format(matches=HOME_MATCHES_SQL + " UNION ALL " + AWAY_MATCHES_SQL),
+        'home': TEAM_STATS_SQL.format(matches=HOME_MATCHES_SQL),
+        'away': TEAM_STATS_SQL.format(matches=AWAY_MATCHES_SQL),
+    }
+    AVERAGE_ODDS_SQL = """
+        SELECT (SELECT COUNT(*) FROM matches WHERE home_team = ?1),
+               (SELECT COUNT(*) FROM matches WHERE away_team = ?2),
+               (SELECT AVG("B365H") FROM matches WHERE home_team = ?1),
+               (SELECT AVG(d) FROM (SELECT "B365D" AS d FROM matches WHERE home_team = ?1
+                                    UNION ALL SELECT "B365D" FROM matches WHERE away_team = ?2)),
+               (SELECT AVG("B365A") FROM matches WHERE away_team = ?2)
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_team_stats(self, team_name, start=None, end=None, last=None, venue='all'):
+        start, end = check_window(start, end, last, venue)
+        params = {
+            "team": team_name,
+            "start": "0000-01-01" if start is None else str(np.datetime64(start, 'D')),
+            "end": "9999-12-31" if end is None else str(np.datetime64(end, 'D')),
+            "last": -1 if last is None else last,
+        }
+        with stage_timer('get_team_stats', 'query'):
+            row = self.store.query_one(self.TEAM_STATS_QUERIES[venue], params)
+        (total_matches, wins, draws, goals_scored, goals_conceded, shots, shots_on_target, corners, yellows, reds,
+         first_match, last_match) = row
+        if total_matches == 0:
+            return None
+        losses = total_matches - wins - draws
+
+        return {
+            "matches_played": int(total_matches),
+            "win_rate": float(wins / total_matches),
+            "draw_rate": float(draws / total_matches),
+            "loss_rate": float(losses / total_matches),
+            "goals_scored_per_match": float(goals_scored / total_matches),
+            "goals_conceded_per_match": float(goals_conceded / total_matches),
+            "shots_per_match": float(shots / total_matches),
+            "shots_on_target_per_match": float(shots_on_target / total_matches),
+            "corners_per_match": float(corners / total_matches),
+            "cards_per_match": float((yellows + reds) / total_matches),
+            "yellow_cards_per_match": float(yellows / total_matches),
+            "red_cards_per_match": float(reds / total_matches),
+            "first_match": first_match,
+            "last_match": last_match
+        }
+
+    def get_average_odds(self, home_team, away_team):
+        home_count, away_count, b365h, b365d, b365a = self.store.query_one(self.AVERAGE_ODDS_SQL, (home_team, away_team))
+        if home_count == 0 or away_count == 0:
+            return None
+        as_float = lambda v: float('nan') if v is None else float(v)
+        return {"b365h": as_float(b365h), "b365d": as_float(b365d), "b365a": as_float(b365a)}
+
+    def get_comparison(self, home_team, away_team, start=None, end=None, last=None, venue='all'):
+        home_venue, away_venue = ('home', 'away') if venue == 'split' else (venue, venue)
+        home_stats = self.get_team_stats(home_team, start, end, last, home_venue)
+        away_stats = self.get_team_stats(away_team, start, end, last, away_venue)
+
+        if not home_stats or not away_stats:
+            return None
+
+        return {
+            "home_team": home_team,
+            "away_team": away_team,
+            "home_stats": home_stats,
+            "away_stats": away_stats
+        }
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SQLFIFAPlayerEngine(FIFAPlayerEngine):
+    """
+    FIFAPlayerEngine answering searches, cards and top-player lists from SQLite:
+    - Name/club/nationality substring filters use a trigram FTS index
+    - Position filters use a position -> player posting table
+    - Top players walk the overall-rating index
+    - Squad strength reads club, primary position and rating counts from a
+      grouped query
+    Similarity, aggregates and the squad optimizer need the full attribute
+    matrix; the first of those calls reads the table into the in-memory
+    structures of the parent class, so servers that never use them never
+    hold the players in pandas.
+    """
+
+    # One row per (club, primary position, overall) with its player count
+    SQUAD_RATINGS_SQL = """
+        SELECT club_name,
+               TRIM(CASE WHEN instr(player_positions, ',') > 0
+                         THEN substr(player_positions, 1, instr(player_positions, ',') - 1)
+                         ELSE player_positions END) AS player_positions,
+               overall, COUNT(*) AS players
+        FROM fifa_players WHERE club_name IS NOT NULL AND club_name != ''
+        GROUP BY 1, 2, 3
+    """
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._squad_ratings = None
+        self._refresh_columns()
+
+    def _refresh_columns(self):
+        rows = self.store.query("SELECT name, kind FROM fifa_columns ORDER BY ordinal")
+        self.columns = [name for name, _ in rows]
+        self.column_kinds = dict(rows)
+
+    @property
+    def df(self):
+        self._ensure_frame()
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+
+    def _ensure_frame(self):
+        if self._df is None and self.columns:
+            self._load_frame()
+
+    def _load_frame(self):
+        select = ', '.join(quote(c) for c in self.columns)
+        self._df = pd.read_sql_query(f"SELECT {select} FROM fifa_players ORDER BY id", self.store.connection())
+        self._build_display_columns()
+        self._build_similarity_index()
+        self._build_group_stats()
+
+    def load_fifa_data(self, filepath):
+        try:
+            self.store.import_fifa_players(filepath)
+        except Exception as e:
+            print(f"Error loading FIFA data: {e}")
+        self._df = None
+        self._squad_ratings = None
+        self._refresh_columns()
+
+    def get_player_count(self):
+        if not self.columns:
+            return 0
+        return self.store.query_one("SELECT COUNT(*) FROM fifa_players")[0]
+
+    def squad_ratings(self):
+        if self._squad_ratings is None and {'club_name', 'player_positions', 'overall'} <= self.column_kinds.keys():
+            with stage_timer('squad_strength', 'query'):
+                self._squad_ratings = pd.read_sql_query(self.SQUAD_RATINGS_SQL, self.store.connection())
+        return self._squad_ratings
+
+    def _to_records(self, columns, rows):
+        cleaners = [(lambda v: '' if v is None else v) if self.column_kinds[c] == 'text'
+                    else (lambda v: 0 if v is None else int(v)) for c in columns]
+        return [{c: clean(v) for c, clean, v in zip(columns, cleaners, row)} for row in rows]
+
+    def _select(self, clauses, params, order="id", limit=None, fields=None, offset=0):
+        columns = [f for f in fields if f in self.column_kinds] if fields else list(self.columns)
+        if not columns:
+            columns = list(self.columns)
+        sql = f"SELECT {', '.join(quote(c) for c in columns)} FROM fifa_players"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params = list(params) + [int(limit), int(offset)]
+        return columns, self.store.query(sql, params)
+
+    def _filters(self, query="", team=None, position=None, nationality=None, min_rating=0):
+        """WHERE clauses with the same case-insensitive substring semantics as the pandas filters"""
+        clauses, params, fts = [], [], []
+        for column, value in (('short_name', query), ('club_name', team), ('nationality_name', nationality)):
+            if not value or column not in self.column_kinds:
+                continue
+            if len(value) >= 3:
+                # Trigram tokens need three characters; shorter terms fall back to LIKE
+                fts.append(f'{column} : "' + value.replace('"', '""') + '"')
+            else:
+                clauses.append(f"{quote(column)} LIKE ? ESCAPE '\\'")
+                params.append('%' + _escape_like(value) + '%')
+        if fts:
+            clauses.append("id IN (SELECT rowid FROM fifa_players_fts WHERE fifa_players_fts MATCH ?)")
+            params.append(' AND '.join(fts))
+
+        if position and 'player_positions' in self.column_kinds:
+            key = position.strip().upper()
+            codes = [code for (code,) in self.store.query("SELECT DISTINCT position FROM fifa_player_positions")
+                     if key in code] if ',' not in key else None
+            if codes is None:
+                clauses.append("\"player_positions\" LIKE ? ESCAPE '\\'")
+                params.append('%' + _escape_like(position) + '%')
+            else:
+                # 'LW' also matches 'LWB', as the substring filter does
+                clauses.append("id IN (SELECT player_id FROM fifa_player_positions WHERE position IN "
+                               f"({', '.join('?' * len(codes))}))" if codes else "0")
+                params.extend(codes)
+
+        if min_rating > 0 and 'overall' in self.column_kinds:
+            clauses.append('"overall" >= ?')
+            params.append(min_rating)
+        return clauses, params
+
+    def search_players(self, query="", team=None, position=None, nationality=None, min_rating=0, max_results=50,
+                       fields=None, offset=0):
+        if not self.columns:
+            return []
+        try:
+            with stage_timer('search_players', 'filter'):
+                clauses, params = self._filters(query, team, position, nationality, min_rating)
+                columns, rows = self._select(clauses, params, limit=max_results, fields=fields, offset=offset)
+            with stage_timer('search_players', 'records'):
+                return self._to_records(columns, rows)
+        except Exception as e:
+            print(f"Error in search_players: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def iter_players(self, query="", team=None, position=None, nationality=None, min_rating=0, limit=None,
+                     fields=None, chunk_size=1000):
+        if not self.columns:
+            return
+        clauses, params = self._filters(query, team, position, nationality, min_rating)
+        columns = [f for f in fields if f in self.column_kinds] if fields else list(self.columns)
+        columns = columns or list(self.columns)
+        sql = f"SELECT {', '.join(quote(c) for c in columns)} FROM fifa_players"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = params + [int(limit)]
+        # Streaming responses may resume the generator on another thread, so it
+        # gets its own connection rather than the calling thread's pooled one
+        conn = self.store.connect(check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield self._to_records(columns, rows)
+        finally:
+            conn.close()
+
+    def get_player_card(self, player_name, fields=None):
+        if not self.columns:
+            return None
+        try:
+            columns, rows = self._select(["name_key = ?"], [str(player_name).lower()], limit=1, fields=fields)
+            return self._to_records(columns, rows)[0] if rows else None
+        except Exception as e:
+            print(f"Error in get_player_card: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def get_top_players(self, limit=100, team=None, fields=None, offset=0, clubs=None):
+        if not self.columns:
+            return []
+        try:
+            clauses, params = self._filters(team=team)
+            if clubs is not None:
+                if clubs and 'club_name' in self.column_kinds:
+                    clauses.append(f'"club_name" IN ({", ".join("?" * len(clubs))})')
+                    params.extend(clubs)
+                else:
+                    clauses.append("0")
+            order = '"overall" DESC, id' if 'overall' in self.column_kinds else 'id'
+            columns, rows = self._select(clauses, params, order=order, limit=limit, fields=fields, offset=offset)
+            return self._to_records(columns, rows)
+        except Exception as e:
+            print(f"Error in get_top_players: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def aggregate(self, *args, **kwargs):
+        # Group tables are built along with the in-memory frame
+        self._ensure_frame()
+        return super().aggregate(*args, **kwargs)
+
+
+class SQLTeamStatsEngine(TeamStatsEngine):
+    """TeamStatsEngine over the teams / team_matches / team_match_stats tables"""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def load_team_data(self, filepath: str):
+        self.store.import_team_file(filepath)
+
+    def _team_id(self, team_name):
+        row = self.store.query_one("SELECT id FROM teams WHERE name = ?", (team_name,))
+        return row[0] if row else None
+
+    def get_recent_form(self, team_name: str, num_matches: int = 5):
+        team_id = self._team_id(team_name)
+        if team_id is None:
+            return None
+        matches = self.store.query(
+            "SELECT team_goals, opponent_goals FROM team_matches WHERE team_id = ? ORDER BY seq LIMIT ?",
+            (team_id, num_matches)
+        )
+
+        wins = draws = losses = goals_for = goals_against = 0
+        form = []
+        for team_score, opponent_score in matches:
+            if team_score is None or opponent_score is None:
+                continue
+            goals_for += team_score
+            goals_against += opponent_score
+            if team_score > opponent_score:
+                wins += 1
+                form.append('W')
+            elif team_score < opponent_score:
+                losses += 1
+                form.append('L')
+            else:
+                draws += 1
+                form.append('D')
+
+        return {
+            'matches_played': len(matches),
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'goals_for': goals_for,
+            'goals_against': goals_against,
+            'goal_difference': goals_for - goals_against,
+            'form_string': ''.join(form),
+            'points': wins * 3 + draws
+        }
+
+    def get_match_statistics(self, team_name: str, match_index: int = 0):
+        team_id = self._team_id(team_name)
+        if team_id is None:
+            return None
+        match = self.store.query_one(
+            "SELECT name, starting_at, result_info FROM team_matches WHERE team_id = ? AND seq = ?",
+            (team_id, match_index)
+        )
+        if match is None:
+            return None
+
+        stats = {
+            'match_name': match[0],
+            'date': match[1],
+            'result': match[2],
+            'team_stats': {},
+            'xg_stats': {}
+        }
+        rows = self.store.query(
+            "SELECT source, code, value FROM team_match_stats WHERE team_id = ? AND seq = ? ORDER BY id",
+            (team_id, match_index)
+        )
+        for source, code, value in rows:
+            stats['team_stats' if source == 'statistics' else 'xg_stats'][code] = value
+        return stats
+
+    def get_average_stats(self, team_name: str, num_matches: int = 5):
+        team_id = self._team_id(team_name)
+        if team_id is None:
+            return None
+        count = self.store.query_one(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM team_matches WHERE team_id = ? ORDER BY seq LIMIT ?)",
+            (team_id, num_matches)
+        )[0]
+        rows = self.store.query(
+            "SELECT source, code, TOTAL(value) FROM team_match_stats WHERE team_id = ? AND seq < ? "
+            "GROUP BY source, code ORDER BY MIN(id)",
+            (team_id, num_matches)
+        )
+
+        avg_stats = {}
+        avg_xg = {}
+        for source, code, total in rows:
+            target = avg_stats if source == 'statistics' else avg_xg
+            target[code] = round(total / count, 2)
+        return {
+            'matches_analyzed': count,
+            'average_stats': avg_stats,
+            'average_xg': avg_xg
+        }
+
+    def get_team_info(self, team_name: str):
+        row = self.store.query_one(
+            "SELECT id, name, short_code, founded, image_path, last_played_at FROM teams WHERE name = ?", (team_name,)
+        )
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'name': row[1],
+            'short_code': row[2],
+            'founded': row[3],
+            'image_path': row[4],
+            'last_played': row[5]
+        }
@@ -0,0 +1,323 @@
+"""
+SQLite Store
+Optional embedded database (WAL mode) holding match results, FIFA players and
+SportMonks team data, with a one-shot importer from the CSV/JSON files
+
+Usage (from the backend directory):
+    python -m src.sqlite_store --db data/copascore.db
+    python -m src.sqlite_store --db data/copascore.db --matches data/match_data.csv --teams data/
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from src.fifa_player_engine import FIFAPlayerEngine
+
+
+# match_data.csv columns kept in the matches table; AS is an SQL keyword, hence the quoting everywhere
+MATCH_COLUMNS = ['FTHG', 'FTAG', 'HS', 'AS', 'HST', 'AST', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR', 'B365H', 'B365D', 'B365A']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    league TEXT,
+    season TEXT,
+    date TEXT NOT NULL,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    ftr TEXT,
+    {match_columns}
+);
+CREATE INDEX IF NOT EXISTS idx_matches_home ON matches (home_team, date);
+CREATE INDEX IF NOT EXISTS idx_matches_away ON matches (away_team, date);
+CREATE INDEX IF NOT EXISTS idx_matches_date ON matches (date);
+CREATE INDEX IF NOT EXISTS idx_matches_league_season ON matches (league, season);
+
+CREATE TABLE IF NOT EXISTS fifa_columns (
+    ordinal INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fifa_player_positions (
+    position TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    PRIMARY KEY (position, player_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    short_code TEXT,
+    founded INTEGER,
+    image_path TEXT,
+    last_played_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS team_matches (
+    team_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    fixture_id INTEGER,
+    name TEXT,
+    starting_at TEXT,
+    result_info TEXT,
+    team_goals INTEGER,
+    opponent_goals INTEGER,
+    PRIMARY KEY (team_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS team_match_stats (
+    id INTEGER PRIMARY KEY,
+    team_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    code TEXT,
+    value -- untyped, so integer stats stay integers
+);
+CREATE INDEX IF NOT EXISTS idx_team_match_stats ON team_match_stats (team_id, seq, source);
+""".format(match_columns=',\n    '.join(f'"{c}" REAL' for c in MATCH_COLUMNS))
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def season_label(date):
+    # European seasons start in July: 2020-09-12 -> '2020-2021'
+    start = date.year if date.month >= 7 else date.year - 1
+    return f"{start}-{start + 1}"
+
+
+class SQLiteStore:
+    """
+    One database file shared by the SQL-backed engines.
+    - WAL journal, so readers never block on the importer and vice versa
+    - One connection per thread (sqlite3 connections are not shared across
+      threads), created on first use and reused for the thread's lifetime
+    """
+
+    def __init__(self, db_path="data/copascore.db", mmap_size=256 * 2**20, cache_kib=65536):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def connect(self, **kwargs):
+        """A new connection with the store's pragmas; the caller owns and closes it"""
+        conn = sqlite3.connect(self.db_path, timeout=30, **kwargs)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kib)}")
+        return conn
+
+    def connection(self):
+        """This thread's pooled connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # Importers
+
+    def import_matches(self, paths, replace=True):
+        """Load match_data.csv style files; replace=False appends further leagues/seasons"""
+        conn = self.connection()
+        total = 0
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM matches")
+            for path in paths:
+                df = pd.read_csv(path)
+                dates = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+                df = df[dates.notna()]
+                dates = dates[dates.notna()]
+                numeric = {c: pd.to_numeric(df[c], errors='coerce') if c in df.columns else pd.Series(float('nan'), index=df.index)
+                           for c in MATCH_COLUMNS}
+                frame = pd.DataFrame({
+                    'league': df['Div'] if 'Div' in df.columns else None,
+                    'season': dates.map(season_label),
+                    'date': dates.dt.strftime('%Y-%m-%d'),
+                    'home_team': df['HomeTeam'],
+                    'away_team': df['AwayTeam'],
+                    'ftr': df['FTR'],
+                    **numeric
+                })
+                frame = frame.astype(object).where(frame.notna(), None)
+                columns = ['league', 'season', 'date', 'home_team', 'away_team', 'ftr'] + MATCH_COLUMNS
+                conn.executemany(
+                    f"INSERT INTO matches ({', '.join(quote(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    frame[columns].itertuples(index=False, name=None)
+                )
+                total += len(frame)
+            conn.execute("ANALYZE matches")
+        return total
+
+    def import_fifa_players(self, path):
+        """
+        Load a FIFA players CSV with the same column normalisation as
+        FIFAPlayerEngine. Rebuilds the players table, its trigram search index
+        and the position posting table.
+        """
+        engine = FIFAPlayerEngine()
+        engine.load_fifa_data(path)
+        df = engine.df
+        if df is None or len(df) == 0:
+            raise ValueError(f"No players loaded from {path}")
+
+        # Column kinds mirror the engine's display cleaning: numbers come out as ints, text as strings
+        kinds = {c: ('text' if c in engine.display_df.select_dtypes(include=['object', 'str']).columns else 'int')
+                 for c in df.columns}
+        sql_types = {c: 'TEXT' if kinds[c] == 'text' else ('INTEGER' if pd.api.types.is_integer_dtype(df[c]) else 'REAL')
+                     for c in df.columns}
+
+        conn = self.connection()
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS fifa_players")
+            conn.execute("DROP TABLE IF EXISTS fifa_players_fts")
+            conn.execute("DELETE FROM fifa_columns")
+            conn.execute("DELETE FROM fifa_player_positions")
+
+            column_defs = ', '.join(f"{quote(c)} {sql_types[c]}" for c in df.columns)
+            conn.execute(f"CREATE TABLE fifa_players (id INTEGER PRIMARY KEY, name_key TEXT, {column_defs})")
+            conn.executemany("INSERT INTO fifa_columns (ordinal, name, kind) VALUES (?, ?, ?)",
+                             [(i, c, kinds[c]) for i, c in enumerate(df.columns)])
+
+            values = df.astype(object).where(df.notna(), None)
+            name_keys = df['short_name'].astype(str).str.lower()
+            rows = ((i, key, *row) for i, (key, row) in
+                    enumerate(zip(name_keys, values.itertuples(index=False, name=None))))
+            placeholders = ', '.join('?' * (len(df.columns) + 2))
+            conn.executemany(f"INSERT INTO fifa_players VALUES ({placeholders})", rows)
+
+            conn.execute("CREATE INDEX idx_fifa_name_key ON fifa_players (name_key)")
+            conn.execute("CREATE INDEX idx_fifa_overall ON fifa_players (overall DESC, id)")
+            for col in ('club_name', 'nationality_name'):
+                if col in df.columns:
+                    conn.execute(f"CREATE INDEX idx_fifa_{col} ON fifa_players ({quote(col)} COLLATE NOCASE)")
+
+            # Contentless trigram index: substring search on name/club/nationality without a scan
+            conn.execute("CREATE VIRTUAL TABLE fifa_players_fts USING fts5("
+                         "short_name, club_name, nationality_name, content='', tokenize='trigram')")
+            text = df.reindex(columns=['short_name', 'club_name', 'nationality_name']).fillna('').astype(str)
+            conn.executemany("INSERT INTO fifa_players_fts (rowid, short_name, club_name, nationality_name) "
+                             "VALUES (?, ?, ?, ?)",
+                             ((i, *row) for i, row in enumerate(text.itertuples(index=False, name=None))))
+
+            if 'player_positions' in df.columns:
+                postings = set()
+                for i, positions in enumerate(df['player_positions'].fillna('').astype(str)):
+                    for position in positions.split(','):
+                        if position.strip():
+                            postings.add((position.strip().upper(), i))
+                conn.executemany("INSERT INTO fifa_player_positions (position, player_id) VALUES (?, ?)",
+                                 sorted(postings))
+            conn.execute("ANALYZE fifa_players")
+        return len(df)
+
+    def import_team_file(self, path):
+        """Load (or replace) one SportMonks team JSON file"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return self.import_team_data(data)
+
+    def import_team_data(self, data):
+        team_id = data.get('id')
+        conn = self.connection()
+        with conn:
+            # Replace by id or name so re-importing a refreshed file is idempotent
+            old = conn.execute("SELECT id FROM teams WHERE id = ? OR name = ?", (team_id, data.get('name'))).fetchall()
+            for (old_id,) in old:
+                conn.execute("DELETE FROM teams WHERE id = ?", (old_id,))
+                conn.execute("DELETE FROM team_matches WHERE team_id = ?", (old_id,))
+                conn.execute("DELETE FROM team_match_stats WHERE team_id = ?", (old_id,))
+
+            conn.execute(
+                "INSERT INTO teams (id, name, short_code, founded, image_path, last_played_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (team_id, data.get('name'), data.get('short_code'), data.get('founded'),
+                 data.get('image_path'), data.get('last_played_at'))
+            )
+
+            stats = []
+            for seq, match in enumerate(data.get('latest', [])):
+                # Same reading of the CURRENT scores as TeamStatsEngine.get_recent_form
+                team_score = None
+                opponent_score = None
+                for score in match.get('scores', []):
+                    if score.get('description') == 'CURRENT':
+                        if score.get('participant_id') == team_id:
+                            team_score = score.get('score', {}).get('goals', 0)
+                        else:
+                            opponent_score = score.get('score', {}).get('goals', 0)
+                conn.execute(
+                    "INSERT INTO team_matches (team_id, seq, fixture_id, name, starting_at, result_info, "
+                    "team_goals, opponent_goals) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (team_id, seq, match.get('id'), match.get('name'), match.get('starting_at'),
+                     match.get('result_info'), team_score, opponent_score)
+                )
+                for source in ('statistics', 'xgfixture'):
+                    for stat in match.get(source, []):
+                        if stat.get('participant_id') == team_id:
+                            stats.append((team_id, seq, source, stat.get('type', {}).get('code'),
+                                          stat.get('data', {}).get('value')))
+            conn.executemany(
+                "INSERT INTO team_match_stats (team_id, seq, source, code, value) VALUES (?, ?, ?, ?, ?)", stats
+            )
+        return data.get('name')
+
+    def import_all(self, matches=("data/match_data.csv",), fifa="data/fifa_players.csv", teams=("data/liverpool_team.json",)):
+        counts = {}
+        if matches:
+            counts['matches'] = self.import_matches(matches)
+        if fifa:
+            counts['fifa_players'] = self.import_fifa_players(fifa)
+        if teams:
+            names = []
+            for entry in teams:
+                files = sorted(glob.glob(os.path.join(entry, '*.json'))) if os.path.isdir(entry) else [entry]
+                names.extend(self.import_team_file(path) for path in files)
+            counts['teams'] = len(names)
+        return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the CSV/JSON data files into SQLite")
+    parser.add_argument("--db", default="data/copascore.db")
+    parser.add_argument("--matches", nargs="*", default=["data/match_data.csv"])
+    parser.add_argument("--fifa", default="data/fifa_players.csv")
+    parser.add_argument("--teams", nargs="*", default=["data/liverpool_team.json"],
+                        help="Team JSON files or directories of them")
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db)
+    print(store.import_all(args.matches, args.fifa, args.teams))
+    store.close()
@@ -0,0 +1,265 @@
+"""
+Squad Optimizer
+Picks the highest-rated XI or 23-man squad for a formation under budget,
+wage and nationality/club constraints, using FIFAPlayerEngine data
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix
+
+from src.metrics import record_cache
+
+
+class SquadOptimizer:
+    """
+    Integer program over per-position candidate lists, solved with the HiGHS
+    MILP solver bundled in SciPy:
+    - Candidates per line (GK/DEF/MID/FWD) are pre-sorted by overall rating
+      once per data load
+    - Players beaten on rating, value and wage by a full squad's worth of
+      others in the same line (and same nationality/club when those are
+      capped) are dropped first, which shrinks the program without changing
+      its optimum; the reduced lists are cached until the data reloads
+    - One binary per (player, line) pair; each player fills at most one slot
+    """
+
+    POSITION_GROUPS = {
+        'GK': 'GK',
+        'CB': 'DEF', 'LB': 'DEF', 'RB': 'DEF', 'LWB': 'DEF', 'RWB': 'DEF',
+        'CDM': 'MID', 'CM': 'MID', 'CAM': 'MID', 'LM': 'MID', 'RM': 'MID',
+        'ST': 'FWD', 'CF': 'FWD', 'LW': 'FWD', 'RW': 'FWD', 'LF': 'FWD', 'RF': 'FWD'
+    }
+    LINES = ['GK', 'DEF', 'MID', 'FWD']
+
+    def __init__(self, fifa_engine):
+        self.fifa_engine = fifa_engine
+        self._source = None
+        self.candidates = {}
+        self._reduced = {}
+
+    def _build_candidates(self):
+        """Pre-sort each line's candidates by overall rating; rebuilt only when the data reloads"""
+        df = self.fifa_engine.df
+        if df is self._source:
+            return
+        self._source = df
+        self.candidates = {}
+        self._reduced = {}
+        if df is None or len(df) == 0:
+            return
+
+        overall = pd.to_numeric(df.get('overall'), errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        value = pd.to_numeric(df.get('value_euro', pd.Series(0, index=df.index)), errors='coerce').fillna(0).to_numpy()
+        wage = pd.to_numeric(df.get('wage_euro', pd.Series(0, index=df.index)), errors='coerce').fillna(0).to_numpy()
+        positions = df.get('player_positions', pd.Series('', index=df.index)).fillna('').astype(str)
+
+        line_rows = {line: [] for line in self.LINES}
+        for row, pos in enumerate(positions):
+            lines = {self.POSITION_GROUPS.get(p.strip().upper()) for p in pos.split(',')}
+            for line in lines - {None}:
+                line_rows[line].append(row)
+
+        for line, rows in line_rows.items():
+            rows = np.array(rows, dtype=np.int64)
+            # Rating desc, then cheaper first so ties favour the affordable player
+            order = np.lexsort((wage[rows], value[rows], -overall[rows]))
+            rows = rows[order]
+            self.candidates[line] = {
+                'rows': rows,
+                'overall': overall[rows],
+                'value': value[rows],
+                'wage': wage[rows]
+            }
+
+    @staticmethod
+    def parse_formation(formation, squad_size=11):
+        """'4-3-3' -> {'GK': 1, 'DEF': 4, 'MID': 3, 'FWD': 3}; a 23-man squad doubles each line plus 3 keepers"""
+        parts = [int(p) for p in formation.split('-')]
+        if len(parts) < 2 or sum(parts) != 10 or min(parts) < 1:
+            raise ValueError(f"Invalid formation: {formation}")
+        slots = {'GK': 1, 'DEF': parts[0], 'MID': sum(parts[1:-1]), 'FWD': parts[-1]}
+        if squad_size == 23:
+            slots = {'GK': 3, 'DEF': 2 * slots['DEF'], 'MID': 2 * slots['MID'], 'FWD': 2 * slots['FWD']}
+        elif squad_size != 11:
+            raise ValueError("squad_size must be 11 or 23")
+        return slots
+
+    @staticmethod
+    def _undominated(rating, value, wage, keep_count):
+        """
+        Indices of candidates that fewer than keep_count others beat or match
+        on every criterion. Any squad using a dropped player can swap in one
+        of its unused dominators at no loss. Exact ties count as dominated by
+        earlier rows.
+        """
+        n = len(rating)
+        if n <= keep_count:
+            return np.arange(n)
+        idx = np.arange(n)
+        keep = np.zeros(n, dtype=bool)
+        chunk = 1024
+        for start in range(0, n, chunk):
+            i = idx[start:start + chunk, None]
+            ge = (rating[None, :] >= rating[i]) & (value[None, :] <= value[i]) & (wage[None, :] <= wage[i])
+            strict = (rating[None, :] > rating[i]) | (value[None, :] < value[i]) | (wage[None, :] < wage[i])
+            dominators = (ge & (strict | (idx[None, :] < i))).sum(axis=1)
+            keep[start:start + chunk] = dominators < keep_count
+        return np.flatnonzero(keep)
+
+    def _reduced_candidates(self, line, keep_count, use_value, use_wage, group_keys):
+        """
+        Candidate rows for a line after dominance reduction. With nationality or
+        club caps, only players sharing those keys may dominate each other, so
+        a swap never changes the capped counts.
+        """
+        cache_key = (line, keep_count, use_value, use_wage, tuple(group_keys))
+        if cache_key in self._reduced:
+            record_cache('squad_candidates', True)
+            return self._reduced[cache_key]
+        record_cache('squad_candidates', False)
+
+        cand = self.candidates[line]
+        n = len(cand['rows'])
+        rating = cand['overall']
+        value = cand['value'] if use_value else np.zeros(n)
+        wage = cand['wage'] if use_wage else np.zeros(n)
+
+        if group_keys:
+            df = self.fifa_engine.df
+            keys = pd.MultiIndex.from_arrays(
+                [df[col].fillna('').astype(str).to_numpy()[cand['rows']] for col in group_keys]
+            )
+            groups, _ = pd.factorize(keys)
+        else:
+            groups = np.zeros(n, dtype=np.int64)
+
+        keep = []
+        for g in np.unique(groups):
+            members = np.flatnonzero(groups == g)
+            keep.append(members[self._undominated(rating[members], value[members], wage[members], keep_count)])
+        keep = np.sort(np.concatenate(keep)) if keep else np.array([], dtype=np.int64)
+
+        rows = cand['rows'][keep]
+        self._reduced[cache_key] = rows
+        return rows
+
+    def optimize(self, formation="4-3-3", squad_size=11, budget=None, wage_cap=None,
+                 max_per_nationality=None, max_per_club=None, time_limit=1.0):
+        self._build_candidates()
+        slots = self.parse_formation(formation, squad_size)
+        if not self.candidates:
+            return None
+
+        df = self.fifa_engine.df
+        total_slots = sum(slots.values())
+        group_keys = []
+        if max_per_nationality is not None and 'nationality_name' in df.columns:
+            group_keys.append('nationality_name')
+        if max_per_club is not None and 'club_name' in df.columns:
+            group_keys.append('club_name')
+
+        # One decision variable per (candidate row, line)
+        var_rows, var_lines = [], []
+        for k, line in enumerate(self.LINES):
+            if len(self.candidates[line]['rows']) < slots[line]:
+                return {'formation': formation, 'squad_size': squad_size, 'feasible': False, 'optimal': False,
+                        'status': f"Not enough {line} players for the formation"}
+            rows = self._reduced_candidates(line, total_slots, budget is not None, wage_cap is not None, group_keys)
+            var_rows.append(rows)
+            var_lines.append(np.full(len(rows), k))
+        var_rows = np.concatenate(var_rows)
+        var_lines = np.concatenate(var_lines)
+        n_vars = len(var_rows)
+
+        overall = pd.to_numeric(df['overall'], errors='coerce').fillna(0).to_numpy()[var_rows]
+        value = pd.to_numeric(df.get('value_euro', pd.Series(0, index=df.index)), errors='coerce').fillna(0).to_numpy()[var_rows]
+        wage = pd.to_numeric(df.get('wage_euro', pd.Series(0, index=df.index)), errors='coerce').fillna(0).to_numpy()[var_rows]
+
+        constraints = []
+        cols = np.arange(n_vars)
+
+        def add_group_rows(keys, upper, lower=0):
+            """One constraint row per distinct key, summing the variables that carry it"""
+            codes, uniques = pd.factorize(keys)
+            valid = codes >= 0
+            matrix = coo_matrix((np.ones(valid.sum()), (codes[valid], cols[valid])),
+                                shape=(len(uniques), n_vars)).tocsr()
+            constraints.append(LinearConstraint(matrix, lower, upper))
+
+        # Exactly the formation's count per line
+        need = np.array([slots[line] for line in self.LINES], dtype=float)
+        line_matrix = coo_matrix((np.ones(n_vars), (var_lines, cols)), shape=(len(self.LINES), n_vars)).tocsr()
+        constraints.append(LinearConstraint(line_matrix, need, need))
+
+        # Players eligible for several lines can still only be picked once
+        if len(np.unique(var_rows)) < n_vars:
+            add_group_rows(var_rows, 1)
+        if budget is not None:
+            constraints.append(LinearConstraint(value[None, :], -np.inf, float(budget)))
+        if wage_cap is not None:
+            constraints.append(LinearConstraint(wage[None, :], -np.inf, float(wage_cap)))
+        if max_per_nationality is not None and 'nationality_name' in df.columns:
+            add_group_rows(df['nationality_name'].to_numpy()[var_rows], max_per_nationality)
+        if max_per_club is not None and 'club_name' in df.columns:
+            add_group_rows(df['club_name'].to_numpy()[var_rows], max_per_club)
+
+        result = milp(
+            c=-overall,
+            constraints=constraints,
+            integrality=np.ones(n_vars),
+            bounds=Bounds(0, 1),
+            options={'time_limit': time_limit, 'disp': False}
+        )
+
+        if result.x is None:
+            return {
+                'formation': formation,
+                'squad_size': squad_size,
+                'feasible': False,
+                'optimal': False,
+                # Proven infeasible (HiGHS status 2), or no squad found before the time limit
+                'status': result.message,
+                'candidates': int(n_vars)
+            }
+
+        picked = np.flatnonzero(result.x > 0.5)
+        picked = picked[np.lexsort((-overall[picked], var_lines[picked]))]
+        text_cols = ['short_name', 'player_positions', 'nationality_name', 'club_name']
+        info = df.iloc[var_rows[picked]].reindex(columns=text_cols).fillna('')
+        players = []
+        for var, (_, player) in zip(picked, info.iterrows()):
+            players.append({
+                'short_name': player['short_name'],
+                'line': self.LINES[var_lines[var]],
+                'player_positions': player['player_positions'],
+                'overall': int(overall[var]),
+                'value_euro': float(value[var]),
+                'wage_euro': float(wage[var]),
+                'nationality_name': player['nationality_name'],
+                'club_name': player['club_name']
+            })
+
+        total_overall = int(overall[picked].sum())
+        return {
+            'formation': formation,
+            'squad_size': squad_size,
+            'feasible': True,
+            # status 0 means HiGHS proved optimality within the time limit
+            'optimal': result.status == 0,
+            'total_overall': total_overall,
+            'average_overall': round(total_overall / total_slots, 2),
+            'total_value_euro': float(value[picked].sum()),
+            'total_wage_euro': float(wage[picked].sum()),
+            'candidates': int(n_vars),
+            'players': players
+        }
+
+
+if __name__ == "__main__":
+    from src.fifa_player_engine import FIFAPlayerEngine
+    engine = FIFAPlayerEngine()
+    engine.load_fifa_data("data/fifa_players.csv")
+    optimizer = SquadOptimizer(engine)
+    print(optimizer.optimize("4-3-3", budget=300_000_000, max_per_nationality=2))
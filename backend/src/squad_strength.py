@@ -0,0 +1,364 @@
+"""
+Squad Strength
+Player-quality features for the match model, from FIFAPlayerEngine ratings.
+
+The three sources name teams differently: the model's label encoder uses
+football-data names ("Man City", "Wolves"), the FIFA data its club_name
+column ("Manchester City", "Wolverhampton Wanderers") and SportMonks its own
+`name` field. TeamEntities maps every name from every source onto one model
+team, once, and caches the table as JSON keyed by a fingerprint of the names.
+
+SquadStrength keeps one vector per team (SQUAD_FEATURES): best-XI average
+overall, each line's rating within that XI, the depth of the next
+DEPTH_PLAYERS and the squad size. Vectors are computed with grouped
+cumulative counts over rating-sorted players, and on a data reload only the
+teams whose players changed are recomputed. Lookups are a dict get, or one
+row of a matrix indexed by team code.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import record_cache, stage_timer
+from src.squad_optimizer import SquadOptimizer
+
+
+ENTITIES_PATH = "data/team_entities.json"
+
+# Football-data name -> other names the same club goes by
+TEAM_ALIASES = {
+    'Bournemouth': ('AFC Bournemouth',),
+    'Brighton': ('Brighton & Hove Albion', 'Brighton and Hove Albion'),
+    'Cardiff': ('Cardiff City',),
+    'Huddersfield': ('Huddersfield Town',),
+    'Hull': ('Hull City',),
+    'Ipswich': ('Ipswich Town',),
+    'Leeds': ('Leeds United',),
+    'Leicester': ('Leicester City',),
+    'Luton': ('Luton Town',),
+    'Man City': ('Manchester City', 'Man. City', 'Manchester C'),
+    'Man United': ('Manchester United', 'Man Utd', 'Manchester Utd', 'Man. United'),
+    'Newcastle': ('Newcastle United', 'Newcastle Utd'),
+    'Norwich': ('Norwich City',),
+    "Nott'm Forest": ('Nottingham Forest', 'Nottingham'),
+    'QPR': ('Queens Park Rangers',),
+    'Sheffield United': ('Sheffield Utd',),
+    'Sheffield Weds': ('Sheffield Wednesday',),
+    'Stoke': ('Stoke City',),
+    'Swansea': ('Swansea City',),
+    'Tottenham': ('Tottenham Hotspur', 'Spurs'),
+    'West Brom': ('West Bromwich Albion', 'West Bromwich'),
+    'West Ham': ('West Ham United',),
+    'Wolves': ('Wolverhampton Wanderers', 'Wolverhampton'),
+}
+# Dropped before matching: "AFC Bournemouth" and "Bournemouth" are one name
+GENERIC_TOKENS = {'fc', 'afc', 'cf', 'sc', 'ac', 'club', 'the'}
+
+SQUAD_FEATURES = ('best_xi_overall', 'gk_rating', 'def_rating', 'mid_rating', 'fwd_rating',
+                  'depth_rating', 'squad_size')
+# 4-3-3 by primary position; places left open are filled with the best outfield players remaining
+XI_QUOTAS = {'GK': 1, 'DEF': 4, 'MID': 3, 'FWD': 3}
+XI_SIZE = 11
+# Depth is the average of the players ranked 12th to 23rd
+DEPTH_PLAYERS = 12
+LINES = tuple(XI_QUOTAS)
+_LINE_INDEX = {line: i for i, line in enumerate(LINES)}
+# Quota per line code; the extra last code is players without a recognised position
+_QUOTAS = np.array([XI_QUOTAS[line] for line in LINES] + [0])
+
+
+def squad_columns(side):
+    """Model column names of one side's squad features, e.g. HomeSquad_best_xi_overall"""
+    return [f'{side}Squad_{feature}' for feature in SQUAD_FEATURES]
+
+
+SQUAD_COLUMNS = squad_columns('Home') + squad_columns('Away')
+
+
+def _rank_within(teams, mask):
+    """0-based rank of each masked row among the masked rows of its team (rows already in rank order)"""
+    ranks = np.full(len(teams), np.iinfo(np.int64).max)
+    selected = pd.Series(teams[mask])
+    ranks[mask] = selected.groupby(selected, sort=False).cumcount().to_numpy()
+    return ranks
+
+
+def normalize_team_name(name):
+    """Lower-case ASCII words without punctuation or generic tokens: 'AFC Bournemouth' -> 'bournemouth'"""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower()
+    tokens = re.findall(r'[a-z0-9]+', text.replace('&', ' and ').replace("'", ''))
+    kept = [t for t in tokens if t not in GENERIC_TOKENS]
+    return ' '.join(kept or tokens)
+
+
+class TeamEntities:
+    """
+    Team names from each source resolved to a model team. A name matches
+    exactly (after normalization) or through TEAM_ALIASES; every other name
+    stays unmatched rather than guessed, since shared words are no evidence
+    ("Newcastle Jets", "Arsenal Tula"). A row of the cached table can be
+    corrected by hand: give it the team (or null) and method "manual", and
+    it is kept when the table is rebuilt.
+    """
+
+    def __init__(self, teams, rows=None):
+        self.teams = list(teams)
+        self._exact = {normalize_team_name(team): team for team in self.teams}
+        self._aliases = {normalize_team_name(alias): team
+                         for team, aliases in TEAM_ALIASES.items() if team in self.teams for alias in aliases}
+        # {source, name, team, method} per source name
+        self.rows = list(rows) if rows is not None else []
+        # normalized name -> team (None if unmatched); names first seen at lookup are added
+        self.lookup = {normalize_team_name(row['name']): row['team'] for row in self.rows}
+        # Names exactly as asked for, so repeat lookups skip normalization
+        self._resolved = {}
+
+    def match(self, name):
+        """(team, method) for one name; method is exact, alias or unmatched"""
+        key = normalize_team_name(name)
+        if key in self._exact:
+            return self._exact[key], 'exact'
+        if key in self._aliases:
+            return self._aliases[key], 'alias'
+        return None, 'unmatched'
+
+    def resolve(self, name):
+        """Model team for a name from any source; None if it matches none"""
+        if name is None:
+            return None
+        if name in self._resolved:
+            return self._resolved[name]
+        key = normalize_team_name(name)
+        if key not in self.lookup:
+            self.lookup[key] = self.match(name)[0]
+        self._resolved[name] = self.lookup[key]
+        return self.lookup[key]
+
+    @classmethod
+    def build(cls, teams, sources, manual=None):
+        """sources: {source name: iterable of team names}; manual: {(source, name): team} corrections"""
+        entities = cls(teams)
+        manual = manual or {}
+        for source, names in sources.items():
+            for name in sorted({str(n) for n in names if isinstance(n, str) and n.strip()}):
+                if (source, name) in manual:
+                    team = manual[(source, name)]
+                    team, method = (team if team in entities.teams else None), 'manual'
+                else:
+                    team, method = entities.match(name)
+                entities.rows.append({'source': source, 'name': name, 'team': team, 'method': method})
+                entities.lookup[normalize_team_name(name)] = team
+        return entities
+
+    @staticmethod
+    def fingerprint(teams, sources):
+        names = {source: sorted({str(n) for n in names if isinstance(n, str)}) for source, names in sources.items()}
+        # The aliases too, so a new alias rebuilds the table
+        payload = json.dumps({'teams': sorted(map(str, teams)), 'sources': names, 'aliases': TEAM_ALIASES},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    @classmethod
+    def load_or_build(cls, teams, sources, path=ENTITIES_PATH):
+        """
+        The cached table when it was built from the same names, else a new one
+        (written back to path) keeping the cached table's manual rows
+        """
+        teams = [str(t) for t in teams]
+        sources = {source: list(names) for source, names in sources.items()}
+        key = cls.fingerprint(teams, sources)
+        manual = {}
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if cached.get('fingerprint') == key:
+                record_cache('team_entities', True)
+                return cls(teams, cached['entities'])
+            manual = {(row['source'], row['name']): row['team']
+                      for row in cached.get('entities', []) if row.get('method') == 'manual'}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        record_cache('team_entities', False)
+        entities = cls.build(teams, sources, manual)
+        try:
+            with open(path, 'w') as f:
+                json.dump({'fingerprint': key, 'entities': entities.rows}, f, indent=1)
+        except OSError as e:
+            print(f"Could not cache team entities: {e}")
+        return entities
+
+    def names(self, team, source):
+        """Every name from one source that resolves to a model team, e.g. its FIFA club names"""
+        return [row['name'] for row in self.rows if row['source'] == source and row['team'] == team]
+
+    def summary(self):
+        """Matched and unmatched name counts per source"""
+        counts = {}
+        for row in self.rows:
+            source = counts.setdefault(row['source'], {'matched': 0, 'unmatched': 0})
+            source['unmatched' if row['team'] is None else 'matched'] += 1
+        return counts
+
+
+class SquadStrength:
+    """Per-team squad vectors from a FIFAPlayerEngine, rebuilt incrementally when its data reloads"""
+
+    def __init__(self, fifa_engine, entities):
+        self.fifa_engine = fifa_engine
+        self.entities = entities
+        self._source = None
+        # team -> float array in SQUAD_FEATURES order, and the fingerprint of the rows behind it
+        self.vectors = {}
+        self._fingerprints = {}
+        # tuple of encoder classes -> (teams, len(SQUAD_FEATURES)) matrix
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _ensure_current(self):
+        df = self.fifa_engine.squad_ratings()
+        if df is self._source:
+            return
+        with self._lock:
+            if df is not self._source:
+                self.refresh(df)
+                self._source = df
+
+    def _players(self, df):
+        """
+        Team code, line code and overall per player, and the team behind each
+        code: the resolved model team, else the club as given. Names and
+        positions are worked out once per distinct value, not per player.
+        A `players` column (SQL engines group identical rows) repeats a row.
+        """
+        clubs = df.get('club_name', pd.Series(np.nan, index=df.index))
+        club_codes, club_names = pd.factorize(clubs)
+        # Clubs resolving to the same model team share a code
+        club_teams, teams = pd.factorize(pd.Series([self.entities.resolve(name) or name for name in club_names],
+                                                   dtype=object))
+        codes = np.append(club_teams, -1)[club_codes]
+
+        position_codes, position_labels = pd.factorize(df.get('player_positions', pd.Series('', index=df.index)))
+        # Primary (first listed) position; anything unrecognised is no line at all
+        line_of = np.array([_LINE_INDEX.get(SquadOptimizer.POSITION_GROUPS.get(str(p).split(',')[0].strip().upper()),
+                                            len(LINES)) for p in position_labels] + [len(LINES)])
+        lines = line_of[position_codes]
+        overall = pd.to_numeric(df.get('overall'), errors='coerce').to_numpy(dtype=float)
+
+        keep = codes >= 0
+        repeat = df['players'].to_numpy(dtype=np.int64)[keep] if 'players' in df.columns else 1
+        return (np.repeat(codes[keep], repeat), np.repeat(lines[keep], repeat), np.repeat(overall[keep], repeat),
+                np.asarray(teams, dtype=object))
+
+    def refresh(self, df):
+        """Recompute the vectors of teams whose players changed since the last refresh"""
+        if df is None or len(df) == 0:
+            self.vectors, self._fingerprints, self._matrices = {}, {}, {}
+            return
+        with stage_timer('squad_strength', 'fingerprint'):
+            codes, lines, overall, teams = self._players(df)
+            row_hashes = pd.util.hash_array(pd.util.hash_array(overall) ^ lines.astype(np.uint64))
+            order = np.argsort(codes, kind='stable')
+            present = np.flatnonzero(np.bincount(codes, minlength=len(teams)))
+            starts = np.searchsorted(codes[order], present)
+            # Order-independent fingerprint of each team's player rows, as in FIFAPlayerEngine group stats: a
+            # wrapping sum with the count (an XOR would let two identical rows cancel out)
+            hashes = np.add.reduceat(row_hashes[order], starts) if len(order) else row_hashes[:0]
+            counts = np.diff(np.r_[starts, len(order)])
+            fingerprints = {teams[c]: (int(h), int(n)) for c, h, n in zip(present, hashes, counts)}
+
+        changed = np.array([self._fingerprints.get(teams[c]) != fingerprints[teams[c]] for c in present], dtype=bool)
+        for team_changed in changed:
+            record_cache('squad_strength', not team_changed)
+        vectors = {teams[c]: self.vectors[teams[c]] for c in present[~changed]}
+        if changed.any():
+            with stage_timer('squad_strength', 'vectors'):
+                rows = np.isin(codes, present[changed])
+                table = self._compute(codes[rows], lines[rows], overall[rows], len(teams))
+                vectors.update((teams[c], table[c]) for c in present[changed])
+        self.vectors = vectors
+        self._fingerprints = fingerprints
+        self._matrices = {}
+
+    @staticmethod
+    def _compute(codes, lines, overall, n_teams):
+        """(n_teams, len(SQUAD_FEATURES)) by team code from grouped cumulative counts, not a loop per team"""
+        # By team, best rated first (unrated last), so a cumulative count is a rank
+        order = np.lexsort((-np.where(np.isnan(overall), -np.inf, overall), codes))
+        codes, lines, overall = codes[order], lines[order], overall[order]
+        players = pd.DataFrame({'team': codes, 'line': lines})
+        starter = players.groupby(['team', 'line'], sort=False).cumcount().to_numpy() < _QUOTAS[lines]
+
+        # Places a line could not fill go to the best outfield players left
+        spare = ~starter & (lines != _LINE_INDEX['GK'])
+        open_places = XI_SIZE - np.bincount(codes, weights=starter, minlength=n_teams)[codes]
+        starter |= spare & (_rank_within(codes, spare) < open_places)
+        depth = ~starter & (_rank_within(codes, ~starter) < DEPTH_PLAYERS)
+
+        rated = ~np.isnan(overall)
+
+        def mean(mask):
+            mask = mask & rated
+            totals = np.bincount(codes[mask], weights=overall[mask], minlength=n_teams)
+            counts = np.bincount(codes[mask], minlength=n_teams)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(counts > 0, totals / counts, np.nan)
+
+        columns = [mean(starter)]
+        columns += [mean(starter & (lines == _LINE_INDEX[line])) for line in LINES]
+        columns += [mean(depth), np.bincount(codes, minlength=n_teams).astype(float)]
+        return np.column_stack(columns)
+
+    def vector(self, team):
+        """A team's squad features as a dict (None values where a line is empty); None for unknown teams"""
+        self._ensure_current()
+        values = self.vectors.get(self.entities.resolve(team) or team)
+        if values is None:
+            return None
+        vector = {name: None if np.isnan(v) else round(float(v), 2) for name, v in zip(SQUAD_FEATURES, values)}
+        vector['squad_size'] = int(values[-1])
+        return vector
+
+    def feature_matrix(self, classes):
+        """(len(classes), len(SQUAD_FEATURES)) floats in encoder order, NaN rows for teams without players"""
+        self._ensure_current()
+        key = tuple(classes)
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            matrix = np.full((len(key), len(SQUAD_FEATURES)), np.nan)
+            for code, team in enumerate(key):
+                values = self.vectors.get(self.entities.resolve(team) or team)
+                if values is not None:
+                    matrix[code] = values
+            self._matrices[key] = matrix
+        return matrix
+
+    def features(self, classes, home_code, away_code):
+        """SQUAD_COLUMNS values for one encoded fixture"""
+        matrix = self.feature_matrix(classes)
+        return dict(zip(SQUAD_COLUMNS, np.concatenate([matrix[home_code], matrix[away_code]]).tolist()))
+
+    def add_squad_features(self, df, classes):
+        """df with SQUAD_COLUMNS added from its HomeTeam_Code/AwayTeam_Code columns"""
+        matrix = self.feature_matrix(classes)
+        home = matrix[df['HomeTeam_Code'].to_numpy(dtype=np.int64)]
+        away = matrix[df['AwayTeam_Code'].to_numpy(dtype=np.int64)]
+        squad = pd.DataFrame(np.hstack([home, away]), columns=SQUAD_COLUMNS, index=df.index)
+        return pd.concat([df, squad], axis=1)
+
+
+def squad_strength_for(fifa_engine, teams, extra_sources=None, path=ENTITIES_PATH):
+    """Entity table over the model teams, FIFA club names and any extra {source: names}, and the squad vectors"""
+    df = fifa_engine.squad_ratings()
+    clubs = df['club_name'].dropna().unique().tolist() if df is not None and 'club_name' in df.columns else []
+    sources = {'fifa': clubs, **(extra_sources or {})}
+    entities = TeamEntities.load_or_build(teams, {'model': list(teams), **sources}, path)
+    strength = SquadStrength(fifa_engine, entities)
+    strength._ensure_current()
+    return strength
@@ -1,9 +1,78 @@
 import pandas as pd
 import numpy as np
+from src.metrics import stage_timer
+
+# Per-match columns from the team's side: (home match column, away match column)
+TEAM_COLUMNS = {
+    'goals_scored': ('FTHG', 'FTAG'),
+    'goals_conceded': ('FTAG', 'FTHG'),
+    'shots': ('HS', 'AS'),
+    'shots_on_target': ('HST', 'AST'),
+    'corners': ('HC', 'AC'),
+    'yellows': ('HY', 'AY'),
+    'reds': ('HR', 'AR'),
+}
+SUM_FIELDS = ('wins', 'draws') + tuple(TEAM_COLUMNS)
+_FIELD = {name: i for i, name in enumerate(SUM_FIELDS)}
+VENUES = ('all', 'home', 'away')
+# Matches without a parseable date sort first, so date windows and last-N skip them
+_NO_DATE = np.iinfo(np.int64).min
+
+
+def _day(value):
+    """Day number (days since 1970-01-01) of a date or date string; None passes through"""
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+
+def _date_string(day):
+    return None if day == _NO_DATE else str(np.datetime64(int(day), 'D'))
+
+
+def check_window(start=None, end=None, last=None, venue='all'):
+    """Validate a stats window; returns (start, end) as day numbers. ValueError if it makes no sense"""
+    if venue not in VENUES:
+        raise ValueError(f"venue must be one of {', '.join(VENUES)}")
+    if last is not None and last < 1:
+        raise ValueError("last must be positive")
+    start, end = _day(start), _day(end)
+    if start is not None and end is not None and start > end:
+        raise ValueError("from must not be after to")
+    return start, end
+
+
+class TeamWindows:
+    """
+    One team's matches at one venue, sorted by date, with cumulative sums of
+    SUM_FIELDS (a leading row of zeros), so the totals over any run of
+    consecutive matches are one subtraction.
+    """
+    __slots__ = ('days', 'cumulative')
+
+    def __init__(self, days, values):
+        self.days = days
+        self.cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    def bounds(self, start=None, end=None, last=None):
+        """[lo, hi) positions of the matches from start to end (inclusive day numbers), then the last `last`"""
+        if start is not None:
+            lo = int(np.searchsorted(self.days, start, side='left'))
+        elif end is not None:
+            # Undated matches only count when no date bound is given
+            lo = int(np.searchsorted(self.days, _NO_DATE, side='right'))
+        else:
+            lo = 0
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, end, side='right'))
+        if last is not None:
+            lo = max(lo, hi - last)
+        return lo, max(lo, hi)
+
 
 class StatsEngine:
-    def __init__(self, data_path="data/match_data.csv"):
-        self.df = pd.read_csv(data_path)
+    def __init__(self, data_path="data/match_data.csv", df=None):
+        # An already-loaded frame can be passed instead, e.g. a league/season partition
+        self.df = pd.read_csv(data_path) if df is None else df
         self._prepare_data()
 
     def _prepare_data(self):
@@ -11,68 +80,116 @@ class StatsEngine:
         cols_to_numeric = ['FTHG', 'FTAG', 'HS', 'AS', 'HST', 'AST', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR']
         for col in cols_to_numeric:
             self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
+        with stage_timer('stats_engine', 'index'):
+            self._build_windows()
+
+    def _build_windows(self):
+        """team -> venue -> TeamWindows; every match appears once from each side"""
+        df = self.df
+        n = len(df)
+        dates = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+        days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+        days[dates.isna().to_numpy()] = _NO_DATE
+        result = df['FTR'].to_numpy()
+
+        teams = np.concatenate([df['HomeTeam'].to_numpy(), df['AwayTeam'].to_numpy()])
+        is_home = np.repeat([True, False], n)
+        values = np.empty((2 * n, len(SUM_FIELDS)))
+        values[:, _FIELD['wins']] = np.concatenate([result == 'H', result == 'A'])
+        values[:, _FIELD['draws']] = np.concatenate([result == 'D', result == 'D'])
+        for name, (home_col, away_col) in TEAM_COLUMNS.items():
+            values[:, _FIELD[name]] = np.concatenate([df[home_col].to_numpy(float), df[away_col].to_numpy(float)])
+        # Missing values count as zero, as a pandas sum would
+        values = np.nan_to_num(values)
+        all_days = np.concatenate([days, days])
+        file_rows = np.concatenate([np.arange(n), np.arange(n)])
+
+        known = pd.notna(teams)
+        teams, is_home, values, all_days = teams[known], is_home[known], values[known], all_days[known]
+        codes, names = pd.factorize(teams)
+        # File order within a day, whether the team was at home or away
+        order = np.lexsort((file_rows[known], all_days, codes))
+        codes, is_home, values, all_days = codes[order], is_home[order], values[order], all_days[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)]
 
-    def get_team_stats(self, team_name):
-        # Filter matches where the team played
-        home_matches = self.df[self.df['HomeTeam'] == team_name]
-        away_matches = self.df[self.df['AwayTeam'] == team_name]
-        
-        total_matches = len(home_matches) + len(away_matches)
-        
+        self.windows = {}
+        for start, end in zip(starts, ends):
+            team_home = is_home[start:end]
+            team_days, team_values = all_days[start:end], values[start:end]
+            self.windows[names[codes[start]]] = {
+                'all': TeamWindows(team_days, team_values),
+                'home': TeamWindows(team_days[team_home], team_values[team_home]),
+                'away': TeamWindows(team_days[~team_home], team_values[~team_home]),
+            }
+
+    def get_team_stats(self, team_name, start=None, end=None, last=None, venue='all'):
+        """
+        Per-match averages over the team's matches from start to end (dates,
+        inclusive), then only the last `last` of those; venue is all, home or away.
+        """
+        start, end = check_window(start, end, last, venue)
+        team = self.windows.get(team_name)
+        if team is None:
+            return None
+        windows = team[venue]
+        with stage_timer('get_team_stats', 'window'):
+            lo, hi = windows.bounds(start, end, last)
+
+        total_matches = hi - lo
         if total_matches == 0:
             return None
 
-        # Calculate Wins, Draws, Losses
-        home_wins = len(home_matches[home_matches['FTR'] == 'H'])
-        away_wins = len(away_matches[away_matches['FTR'] == 'A'])
-        wins = home_wins + away_wins
-        
-        home_draws = len(home_matches[home_matches['FTR'] == 'D'])
-        away_draws = len(away_matches[away_matches['FTR'] == 'D'])
-        draws = home_draws + away_draws
-        
-        losses = total_matches - wins - draws
-        
-        # Calculate Goals
-        goals_scored = home_matches['FTHG'].sum() + away_matches['FTAG'].sum()
-        goals_conceded = home_matches['FTAG'].sum() + away_matches['FTHG'].sum()
-        
-        # Calculate Shots
-        shots = home_matches['HS'].sum() + away_matches['AS'].sum()
-        shots_on_target = home_matches['HST'].sum() + away_matches['AST'].sum()
-        
-        # Calculate Corners
-        corners = home_matches['HC'].sum() + away_matches['AC'].sum()
-        
-        # Calculate Cards
-        yellows = home_matches['HY'].sum() + away_matches['AY'].sum()
-        reds = home_matches['HR'].sum() + away_matches['AR'].sum()
-        
-        # Averages per match
-        stats = {
-            "matches_played": int(total_matches),
-            "win_rate": float(wins / total_matches),
-            "draw_rate": float(draws / total_matches),
-            "loss_rate": float(losses / total_matches),
-            "goals_scored_per_match": float(goals_scored / total_matches),
-            "goals_conceded_per_match": float(goals_conceded / total_matches),
-            "shots_per_match": float(shots / total_matches),
-            "shots_on_target_per_match": float(shots_on_target / total_matches),
-            "corners_per_match": float(corners / total_matches),
-            "cards_per_match": float((yellows + reds) / total_matches), # Total cards
-            "yellow_cards_per_match": float(yellows / total_matches),
-            "red_cards_per_match": float(reds / total_matches)
-        }
-        
+        with stage_timer('get_team_stats', 'aggregate'):
+            totals = dict(zip(SUM_FIELDS, (windows.cumulative[hi] - windows.cumulative[lo]).tolist()))
+            wins, draws = totals['wins'], totals['draws']
+            losses = total_matches - wins - draws
+            yellows, reds = totals['yellows'], totals['reds']
+
+            # Averages per match
+            stats = {
+                "matches_played": int(total_matches),
+                "win_rate": float(wins / total_matches),
+                "draw_rate": float(draws / total_matches),
+                "loss_rate": float(losses / total_matches),
+                "goals_scored_per_match": float(totals['goals_scored'] / total_matches),
+                "goals_conceded_per_match": float(totals['goals_conceded'] / total_matches),
+                "shots_per_match": float(totals['shots'] / total_matches),
+                "shots_on_target_per_match": float(totals['shots_on_target'] / total_matches),
+                "corners_per_match": float(totals['corners'] / total_matches),
+                "cards_per_match": float((yellows + reds) / total_matches), # Total cards
+                "yellow_cards_per_match": float(yellows / total_matches),
+                "red_cards_per_match": float(reds / total_matches),
+                "first_match": _date_string(windows.days[lo]),
+                "last_match": _date_string(windows.days[hi - 1])
+            }
+
         return stats
 
-    def get_comparison(self, home_team, away_team):
-        home_stats = self.get_team_stats(home_team)
-        away_stats = self.get_team_stats(away_team)
-        
+    def get_average_odds(self, home_team, away_team):
+        # Typical B365 prices: home team at home, away team on the road
+        home_matches = self.df[self.df['HomeTeam'] == home_team]
+        away_matches = self.df[self.df['AwayTeam'] == away_team]
+
+        if len(home_matches) == 0 or len(away_matches) == 0:
+            return None
+
+        return {
+            "b365h": float(pd.to_numeric(home_matches['B365H'], errors='coerce').mean()),
+            "b365d": float(pd.concat([pd.to_numeric(home_matches['B365D'], errors='coerce'),
+                                      pd.to_numeric(away_matches['B365D'], errors='coerce')]).mean()),
+            "b365a": float(pd.to_numeric(away_matches['B365A'], errors='coerce').mean())
+        }
+
+    def get_comparison(self, home_team, away_team, start=None, end=None, last=None, venue='all'):
+        """venue='split' compares the home team's home matches with the away team's away matches"""
+        home_venue, away_venue = ('home', 'away') if venue == 'split' else (venue, venue)
+        home_stats = self.get_team_stats(home_team, start, end, last, home_venue)
+        away_stats = self.get_team_stats(away_team, start, end, last, away_venue)
+
         if not home_stats or not away_stats:
             return None
-            
+
         return {
             "home_team": home_team,
             "away_team": away_team,
@@ -83,3 +200,4 @@ class StatsEngine:
 if __name__ == "__main__":
     engine = StatsEngine()
     print(engine.get_comparison("Arsenal", "Chelsea"))
+    print(engine.get_comparison("Arsenal", "Chelsea", last=5, venue='split'))
@@ -1,3 +1,5 @@
+import argparse
+
 import pandas as pd
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
@@ -5,12 +7,34 @@ from sklearn.metrics import accuracy_score, classification_report
 import joblib
 import shap
 
-def train_model():
+FEATURES = ['HomeTeam_Code', 'AwayTeam_Code', 'B365H', 'B365D', 'B365A']
+
+
+def add_squad_features(df):
+    """Both sides' squad-strength features (NaN for teams without FIFA ratings, which XGBoost treats as missing)"""
+    from src.fifa_player_engine import FIFAPlayerEngine
+    from src.squad_strength import squad_strength_for
+
+    fifa_engine = FIFAPlayerEngine()
+    fifa_engine.load_fifa_data("data/fifa_players.csv")
+    le_team = joblib.load("data/le_team.joblib")
+    strength = squad_strength_for(fifa_engine, le_team.classes_)
+    print(f"Squad vectors for {sum(strength.entities.resolve(t) in strength.vectors for t in le_team.classes_)} "
+          f"of {len(le_team.classes_)} model teams")
+    return strength.add_squad_features(df, le_team.classes_)
+
+
+def train_model(squad_features=False, output="data/xgb_model.joblib"):
     # Load processed data
     df = pd.read_csv("data/processed_data.csv")
+    features = list(FEATURES)
+    if squad_features:
+        from src.squad_strength import SQUAD_COLUMNS
+        df = add_squad_features(df)
+        features += SQUAD_COLUMNS
     
     # Features and Target
-    X = df[['HomeTeam_Code', 'AwayTeam_Code', 'B365H', 'B365D', 'B365A']]
+    X = df[features]
     y = df['FTR_Code']
     
     # Split data
@@ -35,13 +59,26 @@ def train_model():
     print(classification_report(y_test, y_pred))
     
     # Save Model
-    joblib.dump(model, "data/xgb_model.joblib")
+    joblib.dump(model, output)
     
     # Explainability (SHAP)
     # explainer = shap.TreeExplainer(model)
     # joblib.dump(explainer, "data/shap_explainer.joblib")
     
     print("Model saved.")
+    return {
+        "output": output,
+        "features": features,
+        "train_matches": len(X_train),
+        "test_matches": len(X_test),
+        "accuracy": float(accuracy)
+    }
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the match result model")
+    parser.add_argument("--squad-features", action="store_true",
+                        help="Add both squads' strength vectors; saved to data/xgb_model_squad.joblib unless --output is given")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    default_output = "data/xgb_model_squad.joblib" if args.squad_features else "data/xgb_model.joblib"
+    train_model(args.squad_features, args.output or default_output)
@@ -0,0 +1,327 @@
+"""
+Value Bet Engine
+Compares batched model probabilities with bookmaker odds to find value bets
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class ValueBetEngine:
+    """
+    Scans fixture lists for value bets:
+    - Removes the bookmaker overround from every odds column at once
+    - Scores all fixtures with the prediction model in a single batch
+    - Ranks edges and suggests fractional Kelly stakes
+    - Backtests the strategy over the historical match data
+    """
+
+    # Opening and closing 1X2 columns per bookmaker in match_data.csv
+    BOOKMAKERS = {
+        'B365': ('B365H', 'B365D', 'B365A'),
+        'BW': ('BWH', 'BWD', 'BWA'),
+        'IW': ('IWH', 'IWD', 'IWA'),
+        'PS': ('PSH', 'PSD', 'PSA'),
+        'WH': ('WHH', 'WHD', 'WHA'),
+        'VC': ('VCH', 'VCD', 'VCA'),
+        'Max': ('MaxH', 'MaxD', 'MaxA'),
+        'Avg': ('AvgH', 'AvgD', 'AvgA'),
+    }
+    CLOSING_BOOKMAKERS = {
+        'B365': ('B365CH', 'B365CD', 'B365CA'),
+        'BW': ('BWCH', 'BWCD', 'BWCA'),
+        'IW': ('IWCH', 'IWCD', 'IWCA'),
+        'PS': ('PSCH', 'PSCD', 'PSCA'),
+        'WH': ('WHCH', 'WHCD', 'WHCA'),
+        'VC': ('VCCH', 'VCCD', 'VCCA'),
+        'Max': ('MaxCH', 'MaxCD', 'MaxCA'),
+        'Avg': ('AvgCH', 'AvgCD', 'AvgCA'),
+    }
+    # Outcome order used for every (n, 3) array in this engine
+    OUTCOMES = ('H', 'D', 'A')
+    # Model feature columns, in training order
+    FEATURES = ['HomeTeam_Code', 'AwayTeam_Code', 'B365H', 'B365D', 'B365A']
+
+    def __init__(self, model, le_team, le_target, data_path="data/match_data.csv"):
+        self.model = model
+        self.le_team = le_team
+        self.team_codes = {team: code for code, team in enumerate(le_team.classes_)}
+        # Column positions of H/D/A in predict_proba output
+        classes = list(le_target.classes_)
+        self.outcome_index = [classes.index(o) for o in self.OUTCOMES]
+        self.data_path = data_path
+        self.history = None
+
+    @staticmethod
+    def odds_matrix(df, bookmakers):
+        """Stack bookmaker odds into a float array of shape (fixtures, bookmakers, 3)"""
+        n = len(df)
+        odds = np.full((n, len(bookmakers), 3), np.nan)
+        for b, cols in enumerate(bookmakers.values()):
+            for o, col in enumerate(cols):
+                if col in df.columns:
+                    odds[:, b, o] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+        # Odds of 1.0 or less carry no information and would break the maths below
+        odds[odds <= 1.0] = np.nan
+        return odds
+
+    @staticmethod
+    def remove_overround(odds):
+        """
+        Convert odds of shape (..., 3) to fair probabilities by normalising
+        the implied probabilities of each market to sum to one.
+        Returns (fair_probabilities, overround)
+        """
+        implied = 1.0 / odds
+        booksum = implied.sum(axis=-1, keepdims=True)
+        return implied / booksum, booksum[..., 0] - 1.0
+
+    def encode_teams(self, home_teams, away_teams):
+        """Map team names to model codes; unknown teams get -1"""
+        home = np.fromiter((self.team_codes.get(t, -1) for t in home_teams), dtype=np.int64, count=len(home_teams))
+        away = np.fromiter((self.team_codes.get(t, -1) for t in away_teams), dtype=np.int64, count=len(away_teams))
+        return home, away
+
+    def model_probabilities(self, home_codes, away_codes, feature_odds):
+        """
+        Score every fixture in one predict_proba call.
+        feature_odds is (n, 3) H/D/A odds; returns (n, 3) H/D/A probabilities
+        with NaN rows for fixtures the model cannot score.
+        """
+        n = len(home_codes)
+        probs = np.full((n, 3), np.nan)
+        valid = (home_codes >= 0) & (away_codes >= 0) & np.isfinite(feature_odds).all(axis=1)
+        if valid.any():
+            input_data = pd.DataFrame({
+                'HomeTeam_Code': home_codes[valid],
+                'AwayTeam_Code': away_codes[valid],
+                'B365H': feature_odds[valid, 0],
+                'B365D': feature_odds[valid, 1],
+                'B365A': feature_odds[valid, 2]
+            })
+            probs[valid] = self.model.predict_proba(input_data)[:, self.outcome_index]
+        return probs
+
+    def iter_predictions(self, fixtures, chunk_size=1000):
+        """
+        Yield model predictions for a fixture list in chunks of records.
+        Each fixture needs HomeTeam, AwayTeam and B365H/B365D/B365A.
+        """
+        df = fixtures if isinstance(fixtures, pd.DataFrame) else pd.DataFrame(list(fixtures))
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            home_codes, away_codes = self.encode_teams(chunk['HomeTeam'].tolist(), chunk['AwayTeam'].tolist())
+            odds = self.odds_matrix(chunk, {'B365': self.BOOKMAKERS['B365']})[:, 0, :]
+            probs = self.model_probabilities(home_codes, away_codes, odds)
+            records = []
+            for home, away, p in zip(chunk['HomeTeam'].tolist(), chunk['AwayTeam'].tolist(), probs.tolist()):
+                record = {'home_team': home, 'away_team': away}
+                if np.isnan(p[0]):
+                    record['error'] = 'Unknown team or missing odds'
+                else:
+                    record['probabilities'] = dict(zip(self.OUTCOMES, p))
+                records.append(record)
+            yield records
+
+    def _feature_odds(self, odds, bookmakers):
+        """Pick the model's odds features: B365 where present, else the market average"""
+        names = list(bookmakers)
+        fallback = np.nanmean(odds, axis=1) if odds.shape[1] else np.full((len(odds), 3), np.nan)
+        if 'B365' in names:
+            b365 = odds[:, names.index('B365'), :]
+            return np.where(np.isfinite(b365), b365, fallback)
+        return fallback
+
+    def evaluate(self, df, bookmakers=None):
+        """
+        Vectorised core shared by scanning and backtesting.
+        Returns a dict of arrays: odds (n, b, 3), model/market probabilities,
+        edges (n, b, 3) and overround (n, b).
+        """
+        bookmakers = self.BOOKMAKERS if bookmakers is None else bookmakers
+        odds = self.odds_matrix(df, bookmakers)
+        fair, overround = self.remove_overround(odds)
+
+        home_codes, away_codes = self.encode_teams(df['HomeTeam'].tolist(), df['AwayTeam'].tolist())
+        model_probs = self.model_probabilities(home_codes, away_codes, self._feature_odds(odds, bookmakers))
+
+        with np.errstate(invalid='ignore'):
+            market_probs = np.nanmean(fair, axis=1)
+            edges = model_probs[:, None, :] * odds - 1.0
+
+        return {
+            'odds': odds,
+            'overround': overround,
+            'model_probs': model_probs,
+            'market_probs': market_probs,
+            'edges': edges
+        }
+
+    @staticmethod
+    def kelly_fraction(probs, odds):
+        """Full Kelly stake as a fraction of bankroll, floored at zero"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stake = (probs * odds - 1.0) / (odds - 1.0)
+        return np.clip(np.nan_to_num(stake, nan=0.0), 0.0, 1.0)
+
+    def _best_prices(self, evaluation, bookmakers):
+        """Reduce (n, b, 3) edges to the best bookmaker price per fixture and outcome"""
+        edges = evaluation['edges']
+        filled = np.where(np.isfinite(edges), edges, -np.inf)
+        best_book = filled.argmax(axis=1)
+        best_edge = np.take_along_axis(filled, best_book[:, None, :], axis=1)[:, 0, :]
+        best_odds = np.take_along_axis(evaluation['odds'], best_book[:, None, :], axis=1)[:, 0, :]
+        return best_book, best_edge, best_odds
+
+    def find_value_bets(self, fixtures, min_edge=0.02, kelly_multiplier=0.25, bankroll=None,
+                        bookmakers=None, max_results=100):
+        """
+        Rank value bets across a batch of fixtures.
+        fixtures: DataFrame or list of dicts with HomeTeam, AwayTeam and any
+        bookmaker odds columns (B365H, PSD, MaxA, ...).
+        """
+        if bookmakers is not None:
+            unknown = [name for name in bookmakers if name not in self.BOOKMAKERS]
+            if unknown:
+                raise ValueError(f"Unknown bookmakers: {', '.join(unknown)}; one of {', '.join(self.BOOKMAKERS)}")
+            if not bookmakers:
+                raise ValueError("bookmakers must name at least one bookmaker (omit it for all)")
+            bookmakers = {k: v for k, v in self.BOOKMAKERS.items() if k in bookmakers}
+        else:
+            bookmakers = self.BOOKMAKERS
+        names = list(bookmakers)
+
+        df = fixtures if isinstance(fixtures, pd.DataFrame) else pd.DataFrame(list(fixtures))
+        if df.empty or 'HomeTeam' not in df.columns or 'AwayTeam' not in df.columns:
+            return {'fixtures_scanned': 0, 'value_bets': []}
+
+        evaluation = self.evaluate(df, bookmakers)
+        best_book, best_edge, best_odds = self._best_prices(evaluation, bookmakers)
+        model_probs = evaluation['model_probs']
+        stakes = self.kelly_fraction(model_probs, best_odds) * kelly_multiplier
+
+        rows, outcomes = np.nonzero(best_edge > min_edge)
+        order = np.argsort(-best_edge[rows, outcomes], kind='stable')[:max_results]
+        rows, outcomes = rows[order], outcomes[order]
+
+        home_teams = df['HomeTeam'].to_numpy()
+        away_teams = df['AwayTeam'].to_numpy()
+        value_bets = []
+        for r, o in zip(rows.tolist(), outcomes.tolist()):
+            bet = {
+                'home_team': home_teams[r],
+                'away_team': away_teams[r],
+                'outcome': self.OUTCOMES[o],
+                'bookmaker': names[best_book[r, o]],
+                'odds': float(best_odds[r, o]),
+                'model_probability': float(model_probs[r, o]),
+                'market_probability': float(evaluation['market_probs'][r, o]),
+                'edge': float(best_edge[r, o]),
+                'kelly_fraction': float(stakes[r, o])
+            }
+            if bankroll:
+                bet['stake'] = round(float(stakes[r, o]) * bankroll, 2)
+            value_bets.append(bet)
+
+        return {
+            'fixtures_scanned': int(len(df)),
+            'bookmakers': names,
+            'value_bets': value_bets
+        }
+
+    def _load_history(self):
+        if self.history is None:
+            df = pd.read_csv(self.data_path)
+            df['Date'] = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+            self.history = df.sort_values('Date', kind='stable').reset_index(drop=True)
+        return self.history
+
+    def backtest(self, bookmaker='B365', closing=False, min_edge=0.02, staking='flat',
+                 kelly_multiplier=0.25, bankroll=1000.0):
+        """
+        Replay the value-bet strategy over every match in the historical CSV.
+        One bet per fixture on the outcome with the largest edge at the chosen
+        bookmaker. Note the bundled model was trained on this data, so the
+        default backtest is in-sample.
+        """
+        source = self.CLOSING_BOOKMAKERS if closing else self.BOOKMAKERS
+        if bookmaker not in source:
+            raise ValueError(f"Unknown bookmaker: {bookmaker}")
+
+        df = self._load_history()
+        bookmakers = {bookmaker: source[bookmaker]}
+        odds = self.odds_matrix(df, bookmakers)[:, 0, :]
+
+        # Features always come from the opening B365 prices, as in training
+        feature_odds = self.odds_matrix(df, {'B365': self.BOOKMAKERS['B365']})[:, 0, :]
+        home_codes, away_codes = self.encode_teams(df['HomeTeam'].tolist(), df['AwayTeam'].tolist())
+        model_probs = self.model_probabilities(home_codes, away_codes, feature_odds)
+
+        with np.errstate(invalid='ignore'):
+            edges = model_probs * odds - 1.0
+        filled = np.where(np.isfinite(edges), edges, -np.inf)
+        pick = filled.argmax(axis=1)
+        rows = np.arange(len(df))
+        pick_edge = filled[rows, pick]
+        pick_odds = odds[rows, pick]
+
+        result_index = {o: i for i, o in enumerate(self.OUTCOMES)}
+        actual = df['FTR'].map(result_index).to_numpy(dtype=float)
+        placed = (pick_edge > min_edge) & np.isfinite(actual)
+        won = placed & (pick == actual)
+
+        # Return per unit staked: odds - 1 on a win, -1 on a loss
+        unit_return = np.where(won, pick_odds - 1.0, -1.0)[placed]
+
+        if staking == 'kelly':
+            fractions = self.kelly_fraction(model_probs[rows, pick], pick_odds)[placed] * kelly_multiplier
+            growth = np.cumprod(1.0 + fractions * unit_return)
+            equity = bankroll * np.concatenate(([1.0], growth))
+            stakes = equity[:-1] * fractions
+        elif staking == 'flat':
+            stakes = np.ones(placed.sum())
+            equity = bankroll + np.concatenate(([0.0], np.cumsum(unit_return)))
+        else:
+            raise ValueError(f"Unknown staking plan: {staking}")
+
+        profit = stakes * unit_return
+        running_peak = np.maximum.accumulate(equity)
+        n_bets = int(placed.sum())
+        total_staked = float(stakes.sum())
+
+        by_outcome = {}
+        for o, name in enumerate(self.OUTCOMES):
+            sel = pick[placed] == o
+            by_outcome[name] = {
+                'bets': int(sel.sum()),
+                'wins': int(won[placed][sel].sum()),
+                'profit': round(float(profit[sel].sum()), 2)
+            }
+
+        return {
+            'matches': int(len(df)),
+            'bookmaker': bookmaker,
+            'closing_odds': closing,
+            'staking': staking,
+            'bets': n_bets,
+            'wins': int(won.sum()),
+            'hit_rate': float(won.sum() / n_bets) if n_bets else 0.0,
+            'total_staked': round(total_staked, 2),
+            'profit': round(float(profit.sum()), 2),
+            'roi': float(profit.sum() / total_staked) if total_staked else 0.0,
+            'final_bankroll': round(float(equity[-1]), 2),
+            'max_drawdown': round(float((running_peak - equity).max()), 2),
+            'average_overround': float(np.nanmean(self.remove_overround(odds)[1])),
+            'by_outcome': by_outcome
+        }
+
+
+if __name__ == "__main__":
+    import joblib
+    engine = ValueBetEngine(
+        joblib.load("data/xgb_model.joblib"),
+        joblib.load("data/le_team.joblib"),
+        joblib.load("data/le_target.joblib")
+    )
+    print(engine.backtest())
+    print(engine.backtest(bookmaker='PS', closing=True, staking='kelly'))
@@ -0,0 +1,192 @@
+"""
+What-If Simulation
+Season odds conditional on the results so far: fixtures played by a cut-off
+date keep their real result, only the remaining ones are simulated.
+
+The remaining fixtures are drawn once per (season, cut-off, simulations,
+seed) and kept with each simulation's points, tie-break jitter and
+finishing positions. A changed result, whether a played match ending
+differently or a remaining one forced, only moves the two teams' points.
+Their positions are recounted, and every other team moves at most one
+place for each of them it is overtaken by or overtakes. So a what-if costs
+a few passes over (simulations x teams) instead of a new simulation.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import record_cache, stage_timer
+
+
+RESULTS = ('H', 'D', 'A')
+HOME_POINTS = np.array([3, 1, 0], dtype=np.int16)
+AWAY_POINTS = np.array([0, 1, 3], dtype=np.int16)
+
+
+class ConditionalSimulator:
+    """Season odds given the results up to as_of (every result in the data when None)"""
+
+    def __init__(self, simulator, as_of=None, n_simulations=10000, seed=0):
+        self.simulator = simulator
+        self.teams = simulator.teams
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        self.fixture_index = {(int(h), int(a)): i for i, (h, a) in enumerate(zip(simulator.home_idx, simulator.away_idx))}
+        self.as_of = None if as_of is None else pd.Timestamp(as_of)
+        self.n_simulations = n_simulations
+        n_teams = len(self.teams)
+
+        # Outcome per fixture (0=H, 1=D, 2=A), -1 while still to play
+        self.outcomes = self._played_results()
+        self.remaining = np.flatnonzero(self.outcomes < 0)
+        self.column = np.full(len(self.outcomes), -1)
+        self.column[self.remaining] = np.arange(len(self.remaining))
+
+        played = np.flatnonzero(self.outcomes >= 0)
+        self.current_points = np.zeros(n_teams, dtype=np.int16)
+        np.add.at(self.current_points, simulator.home_idx[played], HOME_POINTS[self.outcomes[played]])
+        np.add.at(self.current_points, simulator.away_idx[played], AWAY_POINTS[self.outcomes[played]])
+
+        rng = np.random.default_rng(seed)
+        with stage_timer('what_if', 'draw'):
+            cumulative = np.cumsum(simulator.fixture_probs[self.remaining], axis=1)
+            u = rng.random((n_simulations, len(self.remaining)))
+            # The cached outcome-draw matrix: (simulations, remaining fixtures)
+            self.draws = (u >= cumulative[:, 0]).astype(np.int8) + (u >= cumulative[:, 1])
+
+        with stage_timer('what_if', 'tables'):
+            home_onehot = np.eye(n_teams, dtype=np.float32)[simulator.home_idx[self.remaining]]
+            away_onehot = np.eye(n_teams, dtype=np.float32)[simulator.away_idx[self.remaining]]
+            simulated = HOME_POINTS[self.draws].astype(np.float32) @ home_onehot \
+                + AWAY_POINTS[self.draws].astype(np.float32) @ away_onehot
+            self.points = (self.current_points + simulated).astype(np.int16)
+            # Fixed per simulation, so teams level on points stay in the same order across what-ifs
+            self.jitter = (rng.random((n_simulations, n_teams)) * 0.5).astype(np.float32)
+            keys = self.points + self.jitter
+            order = np.argsort(-keys, axis=1)
+            self.positions = np.empty((n_simulations, n_teams), dtype=np.int16)
+            np.put_along_axis(self.positions, order, np.arange(n_teams, dtype=np.int16)[None, :], axis=1)
+
+        self.baseline = self._summarise(self.points, self.positions)
+
+    def _played_results(self):
+        df = self.simulator.df
+        outcomes = np.full(len(self.simulator.home_idx), -1, dtype=np.int8)
+        dates = pd.to_datetime(df['Date'], dayfirst=True, errors='coerce')
+        played = df['FTR'].isin(RESULTS)
+        if self.as_of is not None:
+            played &= dates <= self.as_of
+        for home, away, result in zip(df.loc[played, 'HomeTeam'], df.loc[played, 'AwayTeam'], df.loc[played, 'FTR']):
+            fixture = self.fixture_index.get((self.team_index.get(home, -1), self.team_index.get(away, -1)))
+            if fixture is not None:
+                outcomes[fixture] = RESULTS.index(result)
+        return outcomes
+
+    def _summarise(self, points, positions):
+        n, n_teams = positions.shape
+        team_ids = np.broadcast_to(np.arange(n_teams), positions.shape)
+        position_counts = np.bincount((team_ids * n_teams + positions).ravel(),
+                                      minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+        return self.simulator._summarise(points.sum(axis=0, dtype=np.int64), position_counts, n)
+
+    def fixture(self, home_team, away_team):
+        for team in (home_team, away_team):
+            if team not in self.team_index:
+                raise ValueError(f"Unknown team {team}")
+        if home_team == away_team:
+            raise ValueError("A team cannot play itself")
+        return self.fixture_index[(self.team_index[home_team], self.team_index[away_team])]
+
+    def what_if(self, overrides):
+        """
+        Standings with each (home_team, away_team, result) applied in turn,
+        plus each team's change against the unmodified odds
+        """
+        points = self.points.copy()
+        positions = self.positions.copy()
+        keys = points + self.jitter
+        current_points = self.current_points.copy()
+        forced = {}
+
+        with stage_timer('what_if', 'apply'):
+            for home_team, away_team, result in overrides:
+                if result not in RESULTS:
+                    raise ValueError(f"result must be one of {', '.join(RESULTS)}")
+                fixture = self.fixture(home_team, away_team)
+                new = RESULTS.index(result)
+                if fixture in forced:
+                    old = forced[fixture]
+                elif self.outcomes[fixture] >= 0:
+                    old = self.outcomes[fixture]
+                else:
+                    # Differs per simulation
+                    old = self.draws[:, self.column[fixture]]
+                forced[fixture] = new
+                changes = {
+                    self.team_index[home_team]: HOME_POINTS[new] - HOME_POINTS[old],
+                    self.team_index[away_team]: AWAY_POINTS[new] - AWAY_POINTS[old],
+                }
+                self._move(points, keys, positions, changes)
+                if self.outcomes[fixture] >= 0:
+                    # A played match ending differently also changes the table as it stands
+                    for team, delta in changes.items():
+                        current_points[team] += delta
+
+        with stage_timer('what_if', 'summarise'):
+            standings = self._summarise(points, positions)
+        baseline = {row['team']: row for row in self.baseline}
+        for row in standings:
+            before = baseline[row['team']]
+            row['current_points'] = int(current_points[self.team_index[row['team']]])
+            for field in ('expected_points', 'title_probability', 'top4_probability', 'relegation_probability'):
+                row[f'{field}_change'] = round(row[field] - before[field], 6)
+        return standings
+
+    @staticmethod
+    def _move(points, keys, positions, changes):
+        """Apply point changes {team: delta (scalar or per simulation)} and update only the positions that move"""
+        changed = list(changes)
+        others = np.setdiff1d(np.arange(points.shape[1]), changed)
+        old_keys = keys[:, changed].copy()
+        for team, delta in changes.items():
+            points[:, team] += delta
+            keys[:, team] += delta
+        new_keys = keys[:, changed]
+
+        # A team not involved moves down one place for each changed team that overtakes it, up one for each it overtakes
+        other_keys = keys[:, others]
+        shift = np.zeros(other_keys.shape, dtype=np.int16)
+        for i in range(len(changed)):
+            shift += new_keys[:, i:i + 1] > other_keys
+            shift -= old_keys[:, i:i + 1] > other_keys
+        positions[:, others] += shift
+        for i, team in enumerate(changed):
+            positions[:, team] = (keys > new_keys[:, i:i + 1]).sum(axis=1)
+
+
+class WhatIfCache:
+    """Conditional simulators by (simulator, cut-off, simulations, seed), least recently used dropped first"""
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, simulator, as_of=None, n_simulations=10000, seed=0):
+        key = (id(simulator), None if as_of is None else str(pd.Timestamp(as_of).date()), n_simulations, seed)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.simulator is simulator:
+                self._entries.move_to_end(key)
+                record_cache('what_if', True)
+                return entry
+        record_cache('what_if', False)
+        # Built outside the lock; two concurrent misses on one key both build, and the last one is kept
+        entry = ConditionalSimulator(simulator, as_of, n_simulations, seed)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# Imported as `src.…` and reading data/… relative to backend/, as when the API runs
+sys.path.insert(0, str(BACKEND))
+os.chdir(BACKEND)
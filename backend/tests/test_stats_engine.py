@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.stats_engine import StatsEngine, TEAM_COLUMNS
+
+
+def synthetic_matches(n=240, seed=3):
+    """Several matches a day, some undated and some stats missing"""
+    rng = np.random.default_rng(seed)
+    teams = [f"Team {i}" for i in range(8)]
+    rows = []
+    for _ in range(n):
+        home, away = rng.choice(teams, 2, replace=False)
+        day = pd.Timestamp('2020-08-01') + pd.Timedelta(days=int(rng.integers(0, 120)))
+        row = {
+            'Date': '' if rng.random() < 0.05 else day.strftime('%d/%m/%Y'),
+            'HomeTeam': home,
+            'AwayTeam': away,
+            'FTR': rng.choice(['H', 'D', 'A']),
+        }
+        for home_col, away_col in TEAM_COLUMNS.values():
+            for col in (home_col, away_col):
+                row[col] = np.nan if rng.random() < 0.03 else int(rng.integers(0, 12))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def pandas_window(df, dates, team, start=None, end=None, last=None, venue='all'):
+    """The same stats from a boolean filter over the match rows (dates: df['Date'] parsed)"""
+    home, away = df['HomeTeam'] == team, df['AwayTeam'] == team
+    mask = {'all': home | away, 'home': home, 'away': away}[venue]
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end)
+    rows = df[mask].assign(_date=dates[mask]).sort_values('_date', kind='stable', na_position='first')
+    if last is not None:
+        rows = rows.tail(last)
+    n = len(rows)
+    if n == 0:
+        return None
+
+    at_home = (rows['HomeTeam'] == team).to_numpy()
+
+    def total(home_col, away_col):
+        return np.nansum(np.where(at_home, rows[home_col], rows[away_col]))
+
+    wins = ((at_home & (rows['FTR'] == 'H')) | (~at_home & (rows['FTR'] == 'A'))).sum()
+    draws = (rows['FTR'] == 'D').sum()
+    yellows, reds = total(*TEAM_COLUMNS['yellows']), total(*TEAM_COLUMNS['reds'])
+    first, final = rows['_date'].iloc[0], rows['_date'].iloc[-1]
+    return {
+        'matches_played': n,
+        'win_rate': wins / n,
+        'draw_rate': draws / n,
+        'loss_rate': (n - wins - draws) / n,
+        'goals_scored_per_match': total(*TEAM_COLUMNS['goals_scored']) / n,
+        'goals_conceded_per_match': total(*TEAM_COLUMNS['goals_conceded']) / n,
+        'shots_per_match': total(*TEAM_COLUMNS['shots']) / n,
+        'shots_on_target_per_match': total(*TEAM_COLUMNS['shots_on_target']) / n,
+        'corners_per_match': total(*TEAM_COLUMNS['corners']) / n,
+        'cards_per_match': (yellows + reds) / n,
+        'yellow_cards_per_match': yellows / n,
+        'red_cards_per_match': reds / n,
+        'first_match': None if pd.isna(first) else str(first.date()),
+        'last_match': None if pd.isna(final) else str(final.date()),
+    }
+
+
+WINDOWS = [
+    (start, end, last)
+    for start in (None, '2020-08-01', '2020-09-15', '2020-11-20')
+    for end in (None, '2020-09-15', '2020-10-31', '2021-01-01')
+    if start is None or end is None or start <= end
+    for last in (None, 1, 5, 500)
+]
+
+
+@pytest.fixture(scope="module", params=['synthetic', 'match_data'])
+def engine(request):
+    if request.param == 'synthetic':
+        return StatsEngine(df=synthetic_matches())
+    return StatsEngine()
+
+
+def test_windows_match_pandas_filter(engine):
+    # A handful of teams keeps the pandas side quick; every team goes through the same index code
+    teams = sorted(set(engine.df['HomeTeam']) | set(engine.df['AwayTeam']))[:5]
+    dates = pd.to_datetime(engine.df['Date'], dayfirst=True, errors='coerce')
+    for team in teams:
+        for venue in ('all', 'home', 'away'):
+            for start, end, last in WINDOWS:
+                expected = pandas_window(engine.df, dates, team, start, end, last, venue)
+                actual = engine.get_team_stats(team, start, end, last, venue)
+                if expected is None:
+                    assert actual is None, (team, venue, start, end, last)
+                else:
+                    assert actual == pytest.approx(expected), (team, venue, start, end, last)
+
+
+def test_unknown_team_and_bad_windows(engine):
+    assert engine.get_team_stats('Nobody') is None
+    with pytest.raises(ValueError):
+        engine.get_team_stats('Arsenal', start='2021-01-01', end='2020-01-01')
+    with pytest.raises(ValueError):
+        engine.get_team_stats('Arsenal', last=0)
+    with pytest.raises(ValueError):
+        engine.get_team_stats('Arsenal', venue='neutral')
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.league_simulator import LeagueSimulator
+from src.what_if import AWAY_POINTS, HOME_POINTS, RESULTS, ConditionalSimulator
+
+
+@pytest.fixture(scope="module")
+def conditional():
+    simulator = LeagueSimulator()
+    dates = pd.to_datetime(simulator.df['Date'], dayfirst=True)
+    # Half the season played, half still to simulate
+    return ConditionalSimulator(simulator, as_of=dates.sort_values().iloc[len(dates) // 2],
+                                n_simulations=300, seed=7)
+
+
+def full_rerank(cs, overrides):
+    """Standings recomputed from every fixture's outcome in every simulation, with the overrides applied"""
+    simulator = cs.simulator
+    outcomes = np.tile(cs.outcomes, (cs.n_simulations, 1))
+    outcomes[:, cs.remaining] = cs.draws
+    played = cs.outcomes.copy()
+    for home, away, result in overrides:
+        fixture = cs.fixture(home, away)
+        outcomes[:, fixture] = RESULTS.index(result)
+        if played[fixture] >= 0:
+            played[fixture] = RESULTS.index(result)
+
+    n_teams = len(cs.teams)
+    points = np.zeros((cs.n_simulations, n_teams), dtype=np.int16)
+    for fixture, (home, away) in enumerate(zip(simulator.home_idx, simulator.away_idx)):
+        points[:, home] += HOME_POINTS[outcomes[:, fixture]]
+        points[:, away] += AWAY_POINTS[outcomes[:, fixture]]
+    keys = points + cs.jitter
+    # Position = teams ranked above, as in ConditionalSimulator
+    positions = (keys[:, None, :] > keys[:, :, None]).sum(axis=2).astype(np.int16)
+
+    current = np.zeros(n_teams, dtype=np.int16)
+    done = np.flatnonzero(played >= 0)
+    np.add.at(current, simulator.home_idx[done], HOME_POINTS[played[done]])
+    np.add.at(current, simulator.away_idx[done], AWAY_POINTS[played[done]])
+    return cs._summarise(points, positions), current
+
+
+def fixture_names(cs, fixture):
+    return cs.teams[cs.simulator.home_idx[fixture]], cs.teams[cs.simulator.away_idx[fixture]]
+
+
+def assert_matches_rerank(cs, overrides):
+    standings = cs.what_if(overrides)
+    expected, current = full_rerank(cs, overrides)
+    fields = ('team', 'expected_points', 'title_probability', 'top4_probability', 'relegation_probability',
+              'average_position', 'position')
+    assert [{k: row[k] for k in fields} for row in standings] == expected
+    for row in standings:
+        assert row['current_points'] == current[cs.team_index[row['team']]]
+
+
+def test_baseline_matches_rerank(conditional):
+    assert conditional.baseline == full_rerank(conditional, [])[0]
+
+
+def test_remaining_fixture_override(conditional):
+    home, away = fixture_names(conditional, conditional.remaining[0])
+    for result in RESULTS:
+        assert_matches_rerank(conditional, [(home, away, result)])
+
+
+def test_played_fixture_override(conditional):
+    fixture = np.flatnonzero(conditional.outcomes >= 0)[0]
+    home, away = fixture_names(conditional, fixture)
+    other = RESULTS[(conditional.outcomes[fixture] + 1) % 3]
+    assert_matches_rerank(conditional, [(home, away, other)])
+
+
+def test_repeated_and_combined_overrides(conditional):
+    remaining = fixture_names(conditional, conditional.remaining[3])
+    played = fixture_names(conditional, np.flatnonzero(conditional.outcomes >= 0)[5])
+    # The same fixture forced twice, and fixtures sharing a team
+    shared = next(fixture_names(conditional, f) for f in conditional.remaining
+                  if remaining[0] in fixture_names(conditional, f) and fixture_names(conditional, f) != remaining)
+    assert_matches_rerank(conditional, [
+        (*remaining, 'H'), (*played, 'A'), (*remaining, 'A'), (*shared, 'D'), (*played, 'D'), (*remaining, 'D'),
+    ])
+
+
+def test_what_if_leaves_cached_draws_untouched(conditional):
+    points, positions = conditional.points.copy(), conditional.positions.copy()
+    home, away = fixture_names(conditional, conditional.remaining[1])
+    conditional.what_if([(home, away, 'H')])
+    assert np.array_equal(conditional.points, points)
+    assert np.array_equal(conditional.positions, positions)